@@ -25,6 +25,11 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            # Keyset pagination of the dashboard user list
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_idx'),
+            models.Index(fields=['user_type', '-date_joined', '-id'], name='user_type_joined_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_full_name() or self.username}"
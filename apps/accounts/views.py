@@ -7,6 +7,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from apps.accounts.forms import StudentSignupForm, StudentProfileForm
 from apps.accounts.models import StudentProfile
+from apps.dashboard.activity import record_activity
 
 def signup_view(request):
     if request.method == 'POST':
@@ -44,6 +45,7 @@ def profile_view(request):
         form = StudentProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
             form.save()
+            record_activity(request.user, 'profile_update')
             messages.success(request, 'Profile updated successfully!')
             return redirect('accounts:profile')
     else:
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0001_initial'),
+        ('bursaries', '0004_bursary_similarity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='applicationstatus',
+            index=models.Index(fields=['created_at'], name='application_created_idx'),
+        ),
+    ]
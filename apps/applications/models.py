@@ -34,6 +34,10 @@ class ApplicationStatus(models.Model):
         verbose_name = 'Application'
         verbose_name_plural = 'Applications'
         ordering = ['-created_at']
+        indexes = [
+            # Range scans by the dashboard rollups
+            models.Index(fields=['created_at'], name='application_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.bursary.title}"
@@ -6,6 +6,7 @@ from django.contrib import messages
 from django.utils import timezone
 from apps.applications.models import ApplicationStatus, ApplicationDocument
 from apps.bursaries.models import Bursary
+from apps.dashboard.activity import record_activity
 
 @login_required
 def application_tracker_view(request):
@@ -43,6 +44,7 @@ def add_application(request, bursary_id):
     )
     
     if created:
+        record_activity(request.user, 'apply', bursary.title)
         messages.success(request, f'Added {bursary.title} to your tracker!')
     else:
         messages.info(request, 'This bursary is already in your tracker.')
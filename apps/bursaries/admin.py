@@ -2,17 +2,20 @@
 # Register your models here.
 
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
-from apps.bursaries.models import Bursary, Bookmark
+from apps.bursaries import facets, fragment_cache, recommendation_cache, vector_index
+from apps.bursaries.models import Bursary, Bookmark, BursaryEligibility
+from apps.chatbot import response_cache
 
 @admin.register(Bursary)
 class BursaryAdmin(admin.ModelAdmin):
     list_display = ['title', 'provider_name', 'category', 'amount_display', 
-                   'deadline', 'status_badge', 'views_count', 'applications_count']
+                   'deadline', 'status_badge', 'views_count', 'applications_count', 'bookmarks_count']
     list_filter = ['status', 'category', 'country', 'created_at']
     search_fields = ['title', 'provider_name', 'description']
     prepopulated_fields = {'slug': ('title',)}
-    readonly_fields = ['views_count', 'applications_count', 'created_at', 'updated_at']
+    readonly_fields = ['views_count', 'applications_count', 'bookmarks_count', 'created_at', 'updated_at']
     
     fieldsets = (
         ('Basic Information', {
@@ -34,7 +37,7 @@ class BursaryAdmin(admin.ModelAdmin):
             'fields': ('application_deadline', 'start_date', 'application_url', 'required_documents')
         }),
         ('Metadata', {
-            'fields': ('views_count', 'applications_count', 'created_by', 'created_at', 'updated_at'),
+            'fields': ('views_count', 'applications_count', 'bookmarks_count', 'created_by', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         })
     )
@@ -61,17 +64,46 @@ class BursaryAdmin(admin.ModelAdmin):
                          color, obj.get_status_display())
     status_badge.short_description = 'Status'
     
-    actions = ['approve_bursaries', 'close_bursaries']
+    actions = ['approve_bursaries', 'close_bursaries', 'rebuild_eligibility_index']
     
     def approve_bursaries(self, request, queryset):
+        # Taken first: the changelist's filters (e.g. status=pending) stop
+        # matching once the status changes
+        pks = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(status='active')
+        # Bulk updates skip save(), so make sure newly listed bursaries are indexed
+        BursaryEligibility.rebuild(Bursary.objects.filter(pk__in=pks))
+        self._invalidate_caches(pks)
         self.message_user(request, f'{updated} bursaries approved.')
     approve_bursaries.short_description = 'Approve selected bursaries'
     
     def close_bursaries(self, request, queryset):
+        pks = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(status='closed')
+        self._invalidate_caches(pks)
         self.message_user(request, f'{updated} bursaries closed.')
     close_bursaries.short_description = 'Close selected bursaries'
+    
+    def _invalidate_caches(self, pks):
+        # queryset.update() sends no signals
+        recommendation_cache.invalidate_all()
+        facets.invalidate()
+        fragment_cache.invalidate()
+        response_cache.invalidate_bursaries(pks)
+        response_cache.invalidate_catalog()
+        index = vector_index.get_index()
+        if index is not None and index.exists():
+            # Approved bursaries join the index, closed ones leave it
+            def update_index():
+                for bursary in Bursary.objects.filter(pk__in=pks):
+                    index.update(bursary)
+            transaction.on_commit(update_index)
+    
+    def rebuild_eligibility_index(self, request, queryset):
+        rebuilt = BursaryEligibility.rebuild(queryset)
+        facets.invalidate()
+        self.message_user(request, f'Eligibility index rebuilt for {rebuilt} bursaries.')
+    rebuild_eligibility_index.short_description = 'Rebuild eligibility index'
 
 @admin.register(Bookmark)
 class BookmarkAdmin(admin.ModelAdmin):
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BursariesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.bursaries'
+
+    def ready(self):
+        from apps.bursaries import signals  # noqa: F401
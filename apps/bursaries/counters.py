@@ -0,0 +1,79 @@
+# DENORMALIZED COUNTERS
+# Child-row counts stored on the parent (Bursary.applications_count,
+# Bursary.bookmarks_count, ChatConversation.message_count) so listings and
+# scoring read a column instead of aggregating. Signals keep them current
+# with atomic F() updates; bulk writes skip signals, so reconcile_counters
+# repairs any drift.
+from django.db.models import Count, F
+from django.db.models.signals import post_save, post_delete
+
+
+class DenormalizedCounter:
+    """Keeps `parent.field` equal to the number of `child` rows pointing at it through `fk`"""
+
+    def __init__(self, parent, field, child, fk):
+        self.parent = parent
+        self.field = field
+        self.child = child
+        self.fk = fk
+
+    def __str__(self):
+        return f'{self.parent._meta.label}.{self.field}'
+
+    def adjust(self, parent_id, amount):
+        """Atomically add amount (may be negative) to one parent's counter"""
+        self.parent.objects.filter(pk=parent_id).update(**{self.field: F(self.field) + amount})
+
+    def _created(self, sender, instance, created, raw=False, **kwargs):
+        if created and not raw:
+            self.adjust(getattr(instance, f'{self.fk}_id'), 1)
+
+    def _deleted(self, sender, instance, **kwargs):
+        self.adjust(getattr(instance, f'{self.fk}_id'), -1)
+
+    def connect(self):
+        uid = f'counter:{self}'
+        post_save.connect(self._created, sender=self.child, weak=False, dispatch_uid=uid)
+        post_delete.connect(self._deleted, sender=self.child, weak=False, dispatch_uid=uid)
+
+    def reconcile(self, chunk_size=1000):
+        """
+        Recount every parent and fix the ones that drifted
+        Returns: number of parents corrected
+        """
+        fixed = 0
+        parents = self.parent.objects.order_by('pk').values_list('pk', self.field)
+        chunk = []
+        for row in parents.iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                fixed += self._reconcile_chunk(chunk)
+                chunk = []
+        if chunk:
+            fixed += self._reconcile_chunk(chunk)
+        return fixed
+
+    def _reconcile_chunk(self, rows):
+        stored = dict(rows)
+        actual = dict(
+            self.child.objects.filter(**{f'{self.fk}__in': list(stored)}).order_by().values_list(self.fk).annotate(
+                total=Count('pk')
+            )
+        )
+        drifted = [
+            self.parent(pk=pk, **{self.field: actual.get(pk, 0)})
+            for pk, value in stored.items() if value != actual.get(pk, 0)
+        ]
+        self.parent.objects.bulk_update(drifted, [self.field], batch_size=500)
+        return len(drifted)
+
+
+COUNTERS = []
+
+
+def register(parent, field, child, fk):
+    """Declare and connect a counter; called from the owning app's signals module"""
+    counter = DenormalizedCounter(parent, field, child, fk)
+    counter.connect()
+    COUNTERS.append(counter)
+    return counter
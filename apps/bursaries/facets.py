@@ -0,0 +1,162 @@
+# FACETED SEARCH
+# Counts for the list filters (category, country, education level, amount
+# bucket) come from one UNION ALL of grouped counts instead of a COUNT per
+# value. Each facet is counted with every filter applied except its own, so
+# the other options in a menu show what picking them would return. Results
+# are cached per filter fingerprint under a version that any bursary change
+# bumps.
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+from apps.bursaries.models import Bursary, BursaryEligibility, normalize_eligibility
+from apps.bursaries.recommendation_cache import CacheStats
+from apps.bursaries.search import search_bursaries
+from apps.dashboard.profiling import record_cache_lookup
+
+KEY_PREFIX = 'facets'
+VERSION_KEY = f'{KEY_PREFIX}:v'
+
+FACETS = ('category', 'country', 'education_level', 'amount')
+
+# (key, label, lower bound inclusive, upper bound exclusive)
+AMOUNT_BUCKETS = (
+    ('under-1000', 'Under 1,000', None, 1000),
+    ('1000-5000', '1,000 - 5,000', 1000, 5000),
+    ('5000-20000', '5,000 - 20,000', 5000, 20000),
+    ('20000-plus', '20,000 and above', 20000, None),
+)
+
+stats = CacheStats()
+
+
+def _amount_q(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(amount__gte=low)
+    if high is not None:
+        condition &= Q(amount__lt=high)
+    return condition
+
+
+def parse_filters(params):
+    """
+    The facet filters present in a QueryDict, normalized
+    Unknown amount buckets are ignored.
+    Returns: {facet: value}
+    """
+    filters = {}
+    for name in ('category', 'country'):
+        value = (params.get(name) or '').strip()
+        if value:
+            filters[name] = value
+    level = normalize_eligibility(params.get('education_level'))
+    if level:
+        filters['education_level'] = level
+    if params.get('amount') in {bucket[0] for bucket in AMOUNT_BUCKETS}:
+        filters['amount'] = params['amount']
+    return filters
+
+
+def filter_q(name, value):
+    """Q for one parsed filter"""
+    if name == 'education_level':
+        return Q(eligibility__kind='level', eligibility__value=value)
+    if name == 'amount':
+        low, high = next(bucket[2:] for bucket in AMOUNT_BUCKETS if bucket[0] == value)
+        return _amount_q(low, high)
+    return Q(**{name: value})
+
+
+def apply_filters(queryset, filters, exclude=None):
+    """Narrow queryset by every filter except `exclude`"""
+    conditions = [filter_q(name, value) for name, value in filters.items() if name != exclude]
+    return queryset.filter(*conditions) if conditions else queryset
+
+
+def _grouped(queryset, facet, key):
+    return queryset.order_by().annotate(
+        facet=Value(facet, output_field=CharField()), key=key
+    ).values_list('facet', 'key').annotate(n=Count('pk'))
+
+
+def _count_query(base, filters):
+    """One statement returning (facet, key, count) rows for every facet"""
+    amount_bucket = Case(
+        *[When(_amount_q(low, high), then=Value(key)) for key, _, low, high in AMOUNT_BUCKETS],
+        output_field=CharField(),
+    )
+    levels = BursaryEligibility.objects.filter(
+        kind='level', bursary__in=apply_filters(base, filters, 'education_level').values('pk')
+    )
+    return _grouped(apply_filters(base, filters, 'category'), 'category', F('category')).union(
+        _grouped(apply_filters(base, filters, 'country'), 'country', F('country')),
+        _grouped(levels, 'education_level', F('value')),
+        _grouped(apply_filters(base, filters, 'amount'), 'amount', amount_bucket),
+        all=True,
+    )
+
+
+def compute_facets(query, filters):
+    """
+    Facet counts over active bursaries matching `query` and `filters`
+    Declared options (categories, amount buckets) are listed even at zero;
+    countries and levels are listed by count.
+    Returns: {facet: [(value, label, count), ...]}
+    """
+    base = Bursary.objects.filter(status='active')
+    if query:
+        base = Bursary.objects.filter(pk__in=search_bursaries(base, query).values('pk'))
+
+    counts = {facet: {} for facet in FACETS}
+    for facet, key, n in _count_query(base, filters):
+        if key is not None:
+            counts[facet][key] = n
+
+    def by_count(facet):
+        return sorted(counts[facet].items(), key=lambda item: (-item[1], item[0]))
+
+    return {
+        'category': [(key, label, counts['category'].get(key, 0)) for key, label in Bursary.CATEGORY_CHOICES],
+        'country': [(key, key, n) for key, n in by_count('country')],
+        'education_level': [(key, key.replace('_', ' ').title(), n) for key, n in by_count('education_level')],
+        'amount': [(key, label, counts['amount'].get(key, 0)) for key, label, _, _ in AMOUNT_BUCKETS],
+    }
+
+
+def _cache():
+    return caches[getattr(settings, 'FACET_CACHE_ALIAS', 'default')]
+
+
+def fingerprint(query, filters):
+    normalized = {'q': ' '.join((query or '').lower().split()), **filters}
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def invalidate():
+    """Drop every cached facet count (a bursary changed)"""
+    # Unique value rather than incr(), as in recommendation_cache
+    _cache().set(VERSION_KEY, time.time_ns(), None)
+    stats.record('invalidations')
+
+
+def get_facets(query, filters):
+    """
+    Cached compute_facets()
+    Costs at most one database query; none on a hit.
+    """
+    cache = _cache()
+    key = f'{KEY_PREFIX}:{cache.get(VERSION_KEY, 0)}:{fingerprint(query, filters)}'
+    facets = cache.get(key)
+    if facets is not None:
+        stats.record('hits')
+        record_cache_lookup(True)
+        return facets
+
+    stats.record('misses')
+    record_cache_lookup(False)
+    facets = compute_facets(query, filters)
+    cache.set(key, facets, getattr(settings, 'FACET_CACHE_TIMEOUT', 300))
+    return facets
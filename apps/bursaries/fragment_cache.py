@@ -0,0 +1,35 @@
+# TEMPLATE FRAGMENT CACHE
+# Rendered HTML for blocks that are the same for every visitor (trending on
+# the home page, similar bursaries on the detail page) is kept with
+# {% cache %} in the FRAGMENT_CACHE_ALIAS cache. Keys include a version that
+# any bursary save or delete bumps, and the date, since cards show deadline
+# badges. Views pass lazy querysets, so a cached block runs no queries.
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+VERSION_KEY = 'fragments:v:bursaries'
+
+
+def _cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'fragments')]
+
+
+def invalidate():
+    """Re-render every bursary fragment on next use"""
+    # Unique value rather than incr(), as in recommendation_cache
+    _cache().set(VERSION_KEY, time.time_ns(), None)
+
+
+def fragment_context():
+    """
+    Template variables for {% cache %} tags, e.g.
+    {% cache fragments.timeout 'name' fragments.version fragments.today using=fragments.alias %}
+    """
+    return {
+        'alias': getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'fragments'),
+        'timeout': getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 600),
+        'version': _cache().get(VERSION_KEY, 0),
+        'today': timezone.localdate().isoformat(),
+    }
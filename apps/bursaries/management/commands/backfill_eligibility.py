@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from apps.bursaries.models import Bursary, BursaryEligibility
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the BursaryEligibility index from the comma-separated eligibility fields'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of bursaries rebuilt per transaction')
+        parser.add_argument('--status', choices=[choice for choice, _ in Bursary.STATUS_CHOICES],
+                            help='Only rebuild bursaries with this status')
+
+    def handle(self, *args, **options):
+        bursaries = Bursary.objects.order_by('id')
+        if options['status']:
+            bursaries = bursaries.filter(status=options['status'])
+
+        processed = BursaryEligibility.rebuild(bursaries, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Eligibility index rebuilt for {processed} bursaries.'))
@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.bursaries.models import Bursary
+from apps.bursaries.search import SimpleSearchBackend, get_search_backend
+
+WORDS = [
+    'engineering', 'medicine', 'nursing', 'law', 'education', 'agriculture', 'computer',
+    'science', 'mathematics', 'business', 'accounting', 'architecture', 'music', 'arts',
+    'women', 'rural', 'orphans', 'disability', 'leadership', 'research', 'climate', 'energy',
+    'health', 'community', 'innovation', 'technology', 'finance', 'economics', 'teaching',
+]
+# Long tail of filler words so description terms are realistically selective
+VOCABULARY = WORDS + [f'term{i}' for i in range(5000)]
+PROVIDERS = ['Foundation', 'Trust', 'Ministry', 'Bank', 'University', 'County Government']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare full-text search latency with the legacy icontains search on '
+        'synthetic bursaries. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--queries', type=int, default=50, help='Queries timed per size')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        backend = get_search_backend()
+        legacy = SimpleSearchBackend()
+        queries = [' '.join(rng.sample(WORDS, rng.choice([1, 2]))) for _ in range(options['queries'])]
+
+        self.stdout.write(f'Backend: {type(backend).__name__}')
+        self.stdout.write(f"{'rows':>10} {'fts p50':>10} {'fts p95':>10} {'like p50':>10} {'like p95':>10}  (ms)")
+
+        with transaction.atomic():
+            created = Bursary.objects.count()
+            for size in sorted(options['sizes']):
+                created = self.generate(rng, created, size)
+                backend.rebuild()
+
+                base = Bursary.objects.filter(status='active')
+                fts = self.time_queries(lambda q: list(backend.search(base, q)[:12]), queries)
+                like = self.time_queries(lambda q: list(legacy.search(base, q)[:12]), queries)
+                self.stdout.write(
+                    f'{size:>10} {fts[0]:>10.2f} {fts[1]:>10.2f} {like[0]:>10.2f} {like[1]:>10.2f}'
+                )
+            transaction.set_rollback(True)
+
+        # The index was rebuilt against synthetic rows; restore it
+        backend.rebuild()
+
+    def generate(self, rng, start, size, batch_size=5000):
+        """Bulk insert synthetic bursaries until the table holds `size` rows"""
+        today = timezone.now().date()
+        for offset in range(start, size, batch_size):
+            Bursary.objects.bulk_create([
+                Bursary(
+                    title=f"{' '.join(rng.sample(WORDS, 3)).title()} Bursary {i}",
+                    slug=f'benchmark-search-{i}',
+                    description=' '.join(rng.choices(VOCABULARY, k=40)),
+                    category='merit',
+                    status='active',
+                    amount=Decimal(rng.randint(500, 50000)),
+                    eligible_education_levels='bachelor, master',
+                    eligible_fields=', '.join(rng.sample(WORDS, 2)),
+                    country='Kenya',
+                    provider_name=f'{rng.choice(WORDS).title()} {rng.choice(PROVIDERS)}',
+                    application_deadline=today + timedelta(days=rng.randint(1, 120)),
+                )
+                for i in range(offset, min(offset + batch_size, size))
+            ])
+        return max(start, size)
+
+    def time_queries(self, run, queries):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            run(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), statistics.quantiles(timings, n=20)[-1]
@@ -0,0 +1,107 @@
+import math
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.bursaries import vector_index
+from apps.bursaries.management.commands.benchmark_search import WORDS, Command as SearchBenchmark
+from apps.bursaries.models import Bursary
+from apps.bursaries.search import get_search_backend
+
+QUESTIONS = [
+    'Are there any {0} {1} bursaries for {2} students?',
+    'I study {2} and need funding, something like {1} {0}',
+    'scholarship {0} {1} {2}',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure vector index quality and latency on synthetic bursaries. '
+        'precision@k: share of results containing every content word of the '
+        'question; vs exact: recall of the clustered search against scoring '
+        'every row. Full-text search is shown for comparison. Runs inside a '
+        'transaction that is rolled back, with the index in a temporary directory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+        parser.add_argument('--queries', type=int, default=200, help='Questions asked per size')
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16])
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if vector_index.np is None:
+            raise CommandError('The vector index requires the numpy package.')
+        rng = random.Random(options['seed'])
+        k = options['k']
+        backend = get_search_backend()
+
+        with transaction.atomic(), tempfile.TemporaryDirectory() as path:
+            index = vector_index.VectorIndex(path)
+            created = Bursary.objects.count()
+            for size in sorted(options['sizes']):
+                created = SearchBenchmark().generate(rng, created, size)
+                backend.rebuild()
+                started = time.perf_counter()
+                # Clustered even below EXACT_SEARCH_ROWS, so there is something to compare
+                index.build(nlist=int(math.sqrt(size)))
+                self.stdout.write(
+                    f"\n{size} rows: built in {time.perf_counter() - started:.1f}s, {index.meta['nlist']} lists"
+                )
+                questions = self.questions(rng, options['queries'])
+                exact = [[pk for pk, _ in index.search(q, k, exact=True)] for q in questions]
+
+                self.stdout.write(f"{'method':>14} {'precision@k':>12} {'vs exact':>9} {'p50 ms':>8} {'p95 ms':>8}")
+                self.report('exact', questions, exact, lambda q: index.search(q, k, exact=True))
+                for nprobe in options['nprobe']:
+                    self.report(f'ivf nprobe={nprobe}', questions, exact, lambda q: index.search(q, k, nprobe=nprobe))
+                base = Bursary.objects.filter(status='active')
+                self.report(
+                    'full-text', questions, None,
+                    lambda q: [(b.pk, 0) for b in backend.search(base, q, match_any=True)[:k]],
+                )
+            transaction.set_rollback(True)
+
+        # The search index was rebuilt against synthetic rows; restore it
+        backend.rebuild()
+
+    def questions(self, rng, count):
+        """`count` questions, each about the title and field of a random bursary"""
+        ids = list(Bursary.objects.filter(slug__startswith='benchmark-search-').values_list('pk', flat=True))
+        questions = []
+        for bursary in Bursary.objects.in_bulk(rng.sample(ids, min(count, len(ids)))).values():
+            subject = rng.sample(bursary.title.lower().split()[:3], 2)
+            field = rng.choice(bursary.eligible_fields.split(',')).strip()
+            questions.append(rng.choice(QUESTIONS).format(*subject, field))
+        return questions
+
+    def relevant(self, question, pks):
+        """How many of the bursaries contain every content word of the question"""
+        wanted = set(vector_index.terms(question)) - {'bursary', 'scholarship', 'funding', 'student', 'study'}
+        found = Bursary.objects.in_bulk(pks)
+        return sum(
+            wanted <= set(vector_index.terms(f'{b.title} {b.eligible_fields} {b.description}'))
+            for b in found.values()
+        )
+
+    def report(self, name, questions, exact, run):
+        timings, relevant, returned, overlap = [], 0, 0, 0
+        for position, question in enumerate(questions):
+            started = time.perf_counter()
+            ranked = [pk for pk, _ in run(question)]
+            timings.append((time.perf_counter() - started) * 1000)
+            relevant += self.relevant(question, ranked)
+            returned += len(ranked)
+            if exact is not None and exact[position]:
+                overlap += len(set(ranked) & set(exact[position])) / len(exact[position])
+        agreement = f'{overlap / len(questions):>9.3f}' if exact is not None else f"{'-':>9}"
+        self.stdout.write(
+            f'{name:>14} {relevant / max(returned, 1):>12.3f} {agreement} '
+            f'{statistics.median(timings):>8.2f} {statistics.quantiles(timings, n=20)[-1]:>8.2f}'
+        )
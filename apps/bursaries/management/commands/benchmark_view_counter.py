@@ -0,0 +1,86 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+
+from apps.bursaries import views
+from apps.bursaries.models import Bursary
+from apps.bursaries.view_counter import get_view_counter
+
+
+def legacy_record_view(bursary):
+    """The original read-modify-write increment, for comparison"""
+    bursary.views_count += 1
+    bursary.save(update_fields=['views_count'])
+    return bursary.views_count
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test bursary_detail_view with concurrent threads, comparing the '
+        'buffered view counter with the legacy per-hit save'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per thread')
+
+    def handle(self, *args, **options):
+        bursary = Bursary.objects.create(
+            title='Benchmark View Counter', slug='benchmark-view-counter', description='-',
+            category='merit', status='active', amount=Decimal('1000'),
+            eligible_education_levels='bachelor', eligible_fields='any', country='Kenya',
+            provider_name='Benchmark', application_deadline=timezone.now().date() + timedelta(days=30),
+        )
+        try:
+            self.stdout.write(f"{'mode':>10} {'req/s':>10} {'errors':>8} {'lost views':>11}")
+            original = views.record_view
+            try:
+                views.record_view = legacy_record_view
+                self.report('legacy', bursary, options)
+            finally:
+                views.record_view = original
+            self.report('buffered', bursary, options)
+        finally:
+            bursary.delete()
+
+    def report(self, mode, bursary, options):
+        Bursary.objects.filter(pk=bursary.pk).update(views_count=0)
+        elapsed, errors = self.run_load(bursary.slug, options['threads'], options['requests'])
+        get_view_counter().flush()
+
+        served = options['threads'] * options['requests'] - errors
+        recorded = Bursary.objects.get(pk=bursary.pk).views_count
+        self.stdout.write(
+            f'{mode:>10} {served / elapsed:>10.1f} {errors:>8} {served - recorded:>11}'
+        )
+
+    def run_load(self, slug, thread_count, per_thread):
+        factory = RequestFactory()
+        errors = []
+
+        def worker():
+            failed = 0
+            for _ in range(per_thread):
+                request = factory.get(f'/bursaries/{slug}/')
+                request.user = AnonymousUser()
+                try:
+                    views.bursary_detail_view(request, slug=slug)
+                except Exception:
+                    failed += 1
+            errors.append(failed)
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, sum(errors)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from apps.bursaries import recommendation_cache
+from apps.bursaries.similarity import build_similarity
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the item-to-item co-application table used for recommendation '
+        'pattern scores. Incremental by default: only applications created '
+        'since the last run are read.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild from all applications (also applies deletions)')
+        parser.add_argument('--top-k', type=int,
+                            help='Neighbours kept per bursary (changing it forces a full rebuild)')
+
+    def handle(self, *args, **options):
+        result = build_similarity(full=options['full'], top_k=options['top_k'])
+        recommendation_cache.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {result['applications']} applications; stored {result['rows']} "
+            f"neighbour rows for {result['bursaries']} bursaries."
+        ))
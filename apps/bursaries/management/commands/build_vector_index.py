@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.bursaries import vector_index
+
+
+class Command(BaseCommand):
+    help = 'Build the chatbot vector index from all active bursaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lists', type=int, help='Number of clusters (default: about sqrt of the row count)')
+
+    def handle(self, *args, **options):
+        if vector_index.np is None:
+            raise CommandError('The vector index requires the numpy package.')
+        index = vector_index.get_index()
+        if index is None:
+            raise CommandError('VECTOR_INDEX_DIR is not set.')
+        started = time.perf_counter()
+        count = index.build(nlist=options['lists'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} bursaries in {settings.VECTOR_INDEX_DIR} ({time.perf_counter() - started:.1f}s).'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from apps.bursaries.view_counter import CacheViewCounter, get_view_counter
+
+
+class Command(BaseCommand):
+    help = 'Write buffered bursary views to the database (for the cache-backed view counter)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Check every bursary, not only those viewed since the last flush (cache counter only)',
+        )
+
+    def handle(self, *args, **options):
+        counter = get_view_counter()
+        if options['all'] and isinstance(counter, CacheViewCounter):
+            written = counter.flush_all()
+        else:
+            written = counter.flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {written} buffered views.'))
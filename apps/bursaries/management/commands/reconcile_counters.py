@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.bursaries.counters import COUNTERS
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount denormalized counters (bursary applications and bookmarks, '
+        'conversation messages) and fix any that drifted, e.g. after bulk '
+        'imports or deletes that bypass signals'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Parents recounted per query')
+
+    def handle(self, *args, **options):
+        for counter in COUNTERS:
+            fixed = counter.reconcile(chunk_size=options['chunk_size'])
+            self.stdout.write(f'{counter}: {fixed} corrected')
+        self.stdout.write(self.style.SUCCESS('Counters reconciled.'))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bursaries', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BursaryEligibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('level', 'Education Level'), ('field', 'Field of Study')], max_length=10)),
+                ('value', models.CharField(max_length=255)),
+                ('bursary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eligibility', to='bursaries.bursary')),
+            ],
+            options={
+                'verbose_name': 'Bursary Eligibility',
+                'verbose_name_plural': 'Bursary Eligibility',
+                'indexes': [models.Index(fields=['kind', 'value', 'bursary'], name='bursary_elig_lookup_idx')],
+                'unique_together': {('bursary', 'kind', 'value')},
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:11
+
+import apps.bursaries.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE bursaries_bursary_search USING fts5("
+            "title, description, provider_name, eligibility, "
+            "tokenize = 'porter unicode61')"
+        )
+        # Persist BM25 column weights so the rank column uses them
+        schema_editor.execute(
+            "INSERT INTO bursaries_bursary_search (bursaries_bursary_search, rank) "
+            "VALUES ('rank', 'bm25(10.0, 1.0, 5.0, 3.0)')"
+        )
+        schema_editor.execute(
+            "INSERT INTO bursaries_bursary_search (rowid, title, description, provider_name, eligibility) "
+            "SELECT id, title, description, provider_name, "
+            "COALESCE(eligible_education_levels, '') || ' ' || COALESCE(eligible_fields, '') "
+            "FROM bursaries_bursary"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE bursaries_bursary_search ("
+            "rowid bigint PRIMARY KEY REFERENCES bursaries_bursary (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX bursaries_bursary_search_gin ON bursaries_bursary_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO bursaries_bursary_search (rowid, document) "
+            "SELECT id, "
+            "setweight(to_tsvector('english', COALESCE(title, '')), 'A') || "
+            "setweight(to_tsvector('english', COALESCE(description, '')), 'C') || "
+            "setweight(to_tsvector('english', COALESCE(provider_name, '')), 'B') || "
+            "setweight(to_tsvector('english', COALESCE(eligible_education_levels, '') || ' ' || "
+            "COALESCE(eligible_fields, '')), 'B') "
+            "FROM bursaries_bursary"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS bursaries_bursary_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bursaries', '0002_bursary_eligibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BursarySearchDocument',
+            fields=[
+                ('bursary', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='bursaries.bursary')),
+                ('document', apps.bursaries.models.SearchDocumentField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'bursaries_bursary_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bursaries', '0003_bursary_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BursarySimilarityState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_application_id', models.BigIntegerField(default=0)),
+                ('top_k', models.PositiveIntegerField(default=50)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Bursary Similarity State',
+                'verbose_name_plural': 'Bursary Similarity State',
+            },
+        ),
+        migrations.CreateModel(
+            name='BursarySimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('co_applicants', models.PositiveIntegerField()),
+                ('bursary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='bursaries.bursary')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='bursaries.bursary')),
+            ],
+            options={
+                'verbose_name': 'Bursary Similarity',
+                'verbose_name_plural': 'Bursary Similarities',
+                'unique_together': {('bursary', 'neighbour')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """applications_count was never maintained before; fill both counters"""
+    Bursary = apps.get_model('bursaries', 'Bursary')
+    Bookmark = apps.get_model('bursaries', 'Bookmark')
+    ApplicationStatus = apps.get_model('applications', 'ApplicationStatus')
+    for field, child in (('applications_count', ApplicationStatus), ('bookmarks_count', Bookmark)):
+        counts = child.objects.filter(bursary=OuterRef('pk')).order_by().values('bursary').annotate(
+            total=Count('pk')
+        ).values('total')
+        Bursary.objects.update(**{field: Coalesce(Subquery(counts), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bursaries', '0004_bursary_similarity'),
+        ('applications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bursary',
+            name='bookmarks_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
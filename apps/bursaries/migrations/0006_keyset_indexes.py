@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bursaries', '0005_bursary_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bursary',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='bursary_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bursary',
+            index=models.Index(fields=['-created_at', '-id'], name='bursary_created_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bursaries', '0006_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bursary',
+            index=models.Index(fields=['status', 'application_deadline', 'id'], name='bursary_status_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bursary',
+            index=models.Index(fields=['status', '-amount', '-id'], name='bursary_status_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bursary',
+            index=models.Index(fields=['status', '-views_count', '-id'], name='bursary_status_views_idx'),
+        ),
+    ]
@@ -1,10 +1,23 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.text import slugify
 from django.utils import timezone
 from datetime import timedelta
 from apps.accounts.models import User
 
 
+def normalize_eligibility(value):
+    """Normalize one education level or field name for index lookups"""
+    # Capped to fit BursaryEligibility.value
+    return (value or '').strip().lower()[:255]
+
+
+def split_eligibility(value):
+    """Split a comma-separated eligibility field into normalized tokens"""
+    if not value:
+        return []
+    return [normalize_eligibility(item) for item in value.split(',') if item.strip()]
+
+
 class Bursary(models.Model):
     """Model for bursary opportunities"""
     STATUS_CHOICES = (
@@ -53,7 +66,9 @@ class Bursary(models.Model):
     
     # Metadata
     views_count = models.IntegerField(default=0)
+    # Maintained by apps.bursaries.counters
     applications_count = models.IntegerField(default=0)
+    bookmarks_count = models.IntegerField(default=0)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='bursaries_created')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -62,6 +77,16 @@ class Bursary(models.Model):
         verbose_name = 'Bursary'
         verbose_name_plural = 'Bursaries'
         ordering = ['-created_at']
+        indexes = [
+            # One per list sort option (apps.bursaries.sorting), also used
+            # for keyset pagination
+            models.Index(fields=['status', '-created_at', '-id'], name='bursary_status_created_idx'),
+            models.Index(fields=['status', 'application_deadline', 'id'], name='bursary_status_deadline_idx'),
+            models.Index(fields=['status', '-amount', '-id'], name='bursary_status_amount_idx'),
+            models.Index(fields=['status', '-views_count', '-id'], name='bursary_status_views_idx'),
+            # Dashboard listing of every status
+            models.Index(fields=['-created_at', '-id'], name='bursary_created_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -70,6 +95,40 @@ class Bursary(models.Model):
         if not self.slug:
             self.slug = slugify(self.title)
         super().save(*args, **kwargs)
+        
+        # Keep the eligibility index in step with the comma-separated fields
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'eligible_education_levels', 'eligible_fields'} & set(update_fields):
+            self.sync_eligibility_index()
+    
+    def get_eligible_levels(self):
+        """Normalized list of eligible education levels"""
+        return split_eligibility(self.eligible_education_levels)
+    
+    def get_eligible_fields(self):
+        """Normalized list of eligible fields of study"""
+        return split_eligibility(self.eligible_fields)
+    
+    def sync_eligibility_index(self):
+        """Bring this bursary's BursaryEligibility rows in line with its fields"""
+        wanted = {('level', value) for value in self.get_eligible_levels()}
+        wanted |= {('field', value) for value in self.get_eligible_fields()}
+        
+        existing = set(self.eligibility.values_list('kind', 'value'))
+        
+        stale = existing - wanted
+        if stale:
+            stale_q = models.Q()
+            for kind, value in stale:
+                stale_q |= models.Q(kind=kind, value=value)
+            self.eligibility.filter(stale_q).delete()
+        
+        missing = wanted - existing
+        if missing:
+            BursaryEligibility.objects.bulk_create([
+                BursaryEligibility(bursary=self, kind=kind, value=value)
+                for kind, value in missing
+            ])
     
     @property
     def days_until_deadline(self):
@@ -96,3 +155,139 @@ class Bookmark(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.bursary.title}"
+
+
+class BursaryEligibility(models.Model):
+    """
+    Normalized eligibility index, one row per education level or field
+    listed on a bursary. Derived from the comma-separated fields on Bursary
+    so filtering and profile matching can use indexed equality lookups.
+    """
+    KIND_CHOICES = (
+        ('level', 'Education Level'),
+        ('field', 'Field of Study'),
+    )
+    
+    bursary = models.ForeignKey(Bursary, on_delete=models.CASCADE, related_name='eligibility')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    value = models.CharField(max_length=255)
+    
+    class Meta:
+        unique_together = ('bursary', 'kind', 'value')
+        indexes = [
+            models.Index(fields=['kind', 'value', 'bursary'], name='bursary_elig_lookup_idx'),
+        ]
+        verbose_name = 'Bursary Eligibility'
+        verbose_name_plural = 'Bursary Eligibility'
+    
+    def __str__(self):
+        return f"{self.bursary.title} - {self.kind}: {self.value}"
+    
+    @classmethod
+    def rebuild(cls, bursaries, batch_size=500):
+        """
+        Rebuild index rows for a queryset of bursaries in batches
+        Returns: number of bursaries processed
+        """
+        processed = 0
+        ids = list(bursaries.values_list('id', flat=True))
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            rows = []
+            for bursary_id, levels, fields in Bursary.objects.filter(id__in=chunk).values_list(
+                'id', 'eligible_education_levels', 'eligible_fields'
+            ):
+                rows.extend(cls(bursary_id=bursary_id, kind='level', value=value)
+                            for value in set(split_eligibility(levels)))
+                rows.extend(cls(bursary_id=bursary_id, kind='field', value=value)
+                            for value in set(split_eligibility(fields)))
+            with transaction.atomic():
+                cls.objects.filter(bursary_id__in=chunk).delete()
+                cls.objects.bulk_create(rows, batch_size=batch_size)
+            processed += len(chunk)
+        return processed
+
+
+class BursarySimilarity(models.Model):
+    """
+    Item-to-item co-application neighbours, built offline by the
+    build_bursary_similarity command. Holds the top-K neighbours of each
+    bursary ranked by how many students applied to both.
+    """
+    bursary = models.ForeignKey(Bursary, on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey(Bursary, on_delete=models.CASCADE, related_name='+')
+    co_applicants = models.PositiveIntegerField()
+    
+    class Meta:
+        unique_together = ('bursary', 'neighbour')
+        verbose_name = 'Bursary Similarity'
+        verbose_name_plural = 'Bursary Similarities'
+    
+    def __str__(self):
+        return f"{self.bursary_id} ~ {self.neighbour_id} ({self.co_applicants})"
+
+
+class BursarySimilarityState(models.Model):
+    """Watermark for incremental similarity builds (single row)"""
+    last_application_id = models.BigIntegerField(default=0)
+    top_k = models.PositiveIntegerField(default=50)
+    built_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Bursary Similarity State'
+        verbose_name_plural = 'Bursary Similarity State'
+    
+    def __str__(self):
+        return f"Similarity built up to application {self.last_application_id}"
+    
+    @classmethod
+    def load(cls):
+        state, _ = cls.objects.get_or_create(pk=1)
+        return state
+
+
+class SearchDocumentField(models.TextField):
+    """Full-text document column; supports the ``match`` lookup"""
+
+
+@SearchDocumentField.register_lookup
+class FullTextMatch(models.Lookup):
+    """
+    ``document__match=query`` against the search index table.
+    The query string must already be in the backend's syntax, see
+    apps.bursaries.search for how user input is converted.
+    """
+    lookup_name = 'match'
+    
+    def as_sqlite(self, compiler, connection):
+        # FTS5 exposes a hidden column named after the table for whole-row matching
+        table = connection.ops.quote_name(self.lhs.target.model._meta.db_table)
+        alias = compiler.quote_name_unless_alias(self.lhs.alias)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{alias}.{table} MATCH {rhs}', rhs_params
+    
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} @@ to_tsquery('english', {rhs})", lhs_params + rhs_params
+    
+    def as_sql(self, compiler, connection):
+        raise NotImplementedError(f'Full-text search is not supported on {connection.vendor}')
+
+
+class BursarySearchDocument(models.Model):
+    """
+    Read-only view of the full-text index table (created in migrations).
+    SQLite: an FTS5 virtual table keyed by rowid; PostgreSQL: a tsvector
+    table with a GIN index. Rows are maintained by apps.bursaries.search.
+    """
+    bursary = models.OneToOneField(
+        Bursary, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='search_document'
+    )
+    document = SearchDocumentField()
+    rank = models.FloatField()
+    
+    class Meta:
+        managed = False
+        db_table = 'bursaries_bursary_search'
@@ -0,0 +1,130 @@
+# KEYSET PAGINATION
+# Pages are fetched with "WHERE (sort key) after (last row seen)" instead of
+# OFFSET, and without a COUNT(*), so page 1000 costs the same as page 1 as
+# long as an index covers the ordering. Cursors are signed tokens holding the
+# boundary row's sort values.
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+CURSOR_SALT = 'keyset-pagination'
+
+
+class KeysetPage:
+    """One page of results with cursors for its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate `queryset` by `ordering`, e.g. ('-created_at', '-id')
+    The last ordering field must be unique so every row has a distinct
+    position. Names may refer to annotations (e.g. search_rank).
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = [self._split(name) for name in ordering]
+        self.per_page = per_page
+
+    @staticmethod
+    def _split(name):
+        return (name[1:], True) if name.startswith('-') else (name, False)
+
+    def _order_by(self, reverse=False):
+        return [
+            f"{'-' if descending != reverse else ''}{field}"
+            for field, descending in self.ordering
+        ]
+
+    def _values(self, obj):
+        return [getattr(obj, field) for field, _ in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = [
+            None if value is None else value.isoformat() if hasattr(value, 'isoformat') else str(value)
+            for value in self._values(obj)
+        ]
+        return signing.dumps({'v': values, 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """Returns (values, direction), or (None, 'next') for a missing or invalid cursor"""
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            raw, direction = data['v'], data['d']
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None, 'next'
+        if len(raw) != len(self.ordering) or direction not in ('next', 'prev'):
+            return None, 'next'
+
+        values = []
+        for (field, _), value in zip(self.ordering, raw):
+            try:
+                model_field = self.queryset.model._meta.get_field(field)
+            except FieldDoesNotExist:
+                # Annotation such as search_rank (a float)
+                values.append(float(value) if isinstance(value, str) else value)
+                continue
+            try:
+                values.append(model_field.to_python(value))
+            except Exception:
+                return None, 'next'
+        return values, direction
+
+    def _after(self, values, reverse=False):
+        """Rows strictly after `values` in the (possibly reversed) ordering"""
+        condition = Q()
+        for position, (field, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != reverse else 'gt'
+            term = Q(**{f'{field}__{lookup}': values[position]})
+            for (earlier, _), value in zip(self.ordering[:position], values):
+                term &= Q(**{earlier: value})
+            condition |= term
+        # Redundant bound on the leading key so the index range scan starts there
+        field, descending = self.ordering[0]
+        lookup = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{field}__{lookup}': values[0]}) & condition
+
+    def get_page(self, cursor=None):
+        values, direction = self.decode_cursor(cursor) if cursor else (None, 'next')
+        reverse = direction == 'prev'
+        queryset = self.queryset.order_by(*self._order_by(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+        if not rows:
+            return KeysetPage([])
+
+        if reverse:
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, values is not None
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if has_previous else None,
+        )
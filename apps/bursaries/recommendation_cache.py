@@ -0,0 +1,119 @@
+# RECOMMENDATION CACHE
+# Per-user cache of BursaryRecommendationEngine results. Entries are keyed on
+# a per-user version and a global bursary version; signals bump the versions
+# instead of deleting keys, so invalidation works with any cache backend.
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from apps.bursaries.recommendations import BursaryRecommendationEngine
+from apps.dashboard.profiling import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'recs'
+
+# Recommendations shown on the home page
+HOME_LIMIT = 6
+GLOBAL_VERSION_KEY = f'{KEY_PREFIX}:v:global'
+
+# Used when the configured cache is unreachable
+_fallback_cache = LocMemCache('recommendations-fallback', {
+    'TIMEOUT': 300,
+    'OPTIONS': {'MAX_ENTRIES': 1000},
+})
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self.fallbacks = 0
+
+    def record(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'fallbacks': self.fallbacks,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+stats = CacheStats()
+
+
+def _cache():
+    alias = getattr(settings, 'RECOMMENDATION_CACHE_ALIAS', 'default')
+    return caches[alias]
+
+
+def _call(method, *args, **kwargs):
+    """Run a cache operation, falling back to local memory on backend errors"""
+    try:
+        return getattr(_cache(), method)(*args, **kwargs)
+    except Exception:
+        logger.warning('Recommendation cache unavailable, using local memory', exc_info=True)
+        stats.record('fallbacks')
+        return getattr(_fallback_cache, method)(*args, **kwargs)
+
+
+def _user_version_key(user_id):
+    return f'{KEY_PREFIX}:v:user:{user_id}'
+
+
+def _bump(key):
+    # A fresh unique value rather than incr(): if the version key was evicted
+    # a counter would restart and could match stale entries again
+    _call('set', key, time.time_ns(), None)
+    stats.record('invalidations')
+
+
+def invalidate_user(user_id):
+    """Drop cached recommendations for one user"""
+    _bump(_user_version_key(user_id))
+
+
+def invalidate_all():
+    """Drop cached recommendations for everyone (the bursary set changed)"""
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def get_recommendations(user, limit=10):
+    """
+    Cached BursaryRecommendationEngine.get_recommendations()
+    A warm lookup costs one cache round trip and no database queries.
+    Returns: list of bursaries
+    """
+    user_key = _user_version_key(user.pk)
+    versions = _call('get_many', [user_key, GLOBAL_VERSION_KEY])
+    key = f'{KEY_PREFIX}:{user.pk}:{versions.get(user_key, 0)}:{versions.get(GLOBAL_VERSION_KEY, 0)}:{limit}'
+
+    cached = _call('get', key)
+    if cached is not None:
+        stats.record('hits')
+        record_cache_lookup(True)
+        return cached
+
+    stats.record('misses')
+    record_cache_lookup(False)
+    recommendations = list(BursaryRecommendationEngine(user).get_recommendations(limit=limit))
+    timeout = getattr(settings, 'RECOMMENDATION_CACHE_TIMEOUT', 900)
+    _call('set', key, recommendations, timeout)
+    return recommendations
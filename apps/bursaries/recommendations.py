@@ -1,7 +1,11 @@
-from django.db.models import Q, Count, F
+from django.conf import settings
+from django.db.models import Q, Count, F, Sum
 from django.utils import timezone
 from datetime import timedelta
-from apps.bursaries.models import Bursary, Bookmark
+from decimal import Decimal
+from apps.bursaries.models import (
+    Bursary, Bookmark, BursaryEligibility, BursarySimilarity, normalize_eligibility
+)
 from apps.applications.models import ApplicationStatus
 from apps.accounts.models import StudentProfile
 
@@ -23,17 +27,37 @@ class BursaryRecommendationEngine:
             # Could be AttributeError or StudentProfile.DoesNotExist
             self.profile = None
     
-    def get_recommendations(self, limit=10):
+    def get_recommendations(self, limit=10, batch=True):
         """
         Main method to get personalized bursary recommendations
+        batch=False scores each bursary with its own queries (legacy path)
         Returns: QuerySet of recommended bursaries with scores
         """
         if not self.profile:
             # If no profile, return trending bursaries
             return self._get_trending_bursaries(limit)
         
-        # Get active bursaries
-        active_bursaries = Bursary.objects.filter(
+        active_bursaries = self._get_candidate_bursaries()
+        
+        if batch:
+            # Score all candidates at once with a constant number of queries
+            scored_bursaries = self._score_candidates_batch(active_bursaries)
+        else:
+            # Score each bursary
+            scored_bursaries = []
+            for bursary in active_bursaries:
+                score = self._calculate_bursary_score(bursary)
+                scored_bursaries.append((bursary, score))
+        
+        # Sort by score descending
+        scored_bursaries.sort(key=lambda x: x[1], reverse=True)
+        
+        # Return top N
+        return [bursary for bursary, score in scored_bursaries[:limit]]
+    
+    def _get_candidate_bursaries(self):
+        """Active, open bursaries the user has not applied to or bookmarked"""
+        return Bursary.objects.filter(
             status='active',
             application_deadline__gte=timezone.now().date()
         ).exclude(
@@ -42,26 +66,144 @@ class BursaryRecommendationEngine:
         ).exclude(
             # Exclude bookmarked (show separately)
             bookmarked_by__user=self.user
-        )
+        ).order_by('-created_at', '-id')  # Stable tie-break for equal scores
+    
+    def _score_candidates_batch(self, candidates):
+        """
+        Score every candidate in one pass over column arrays.
+        Features are fetched up front: the candidates (popularity comes
+        from their denormalized counters), the eligibility matches and the pattern counts (one query
+        from the offline similarity table, or up to three live queries), so
+        the cost no longer grows with the number of bursaries.
+        Returns: list of (bursary, score) tuples in candidate order
+        """
+        bursaries = list(candidates)
+        if not bursaries:
+            return []
         
-        # Score each bursary
-        scored_bursaries = []
-        for bursary in active_bursaries:
-            score = self._calculate_bursary_score(bursary)
-            scored_bursaries.append((bursary, score))
+        today = timezone.now().date()
+        level_matches, field_matches = self._eligibility_matches(candidates)
+        if getattr(settings, 'RECOMMENDATION_PATTERN_SOURCE', 'offline') == 'offline':
+            pattern_counts = self._neighbour_counts()
+        else:
+            pattern_counts = self._co_applicant_counts(candidates)
         
-        # Sort by score descending
-        scored_bursaries.sort(key=lambda x: x[1], reverse=True)
+        # Column arrays, one entry per candidate
+        profile_col = [
+            self._score_profile_match(
+                b.id in level_matches, b.id in field_matches,
+                b.min_gpa, b.country, b.category
+            )
+            for b in bursaries
+        ]
+        trending_col = [
+            self._score_trending(b.views_count, b.bookmarks_count, b.applications_count)
+            for b in bursaries
+        ]
+        urgency_col = [
+            self._score_deadline_urgency((b.application_deadline - today).days)
+            for b in bursaries
+        ]
+        if pattern_counts is None:
+            pattern_col = [50] * len(bursaries)
+        else:
+            pattern_col = [
+                self._score_application_pattern(pattern_counts.get(b.id, 0))
+                for b in bursaries
+            ]
         
-        # Return top N
-        return [bursary for bursary, score in scored_bursaries[:limit]]
+        scores = [
+            self._combine_scores(profile, trending, urgency, pattern)
+            for profile, trending, urgency, pattern
+            in zip(profile_col, trending_col, urgency_col, pattern_col)
+        ]
+        return list(zip(bursaries, scores))
+    
+    def _eligibility_matches(self, candidates):
+        """
+        Look up which candidates list the student's education level and
+        field of study, using the BursaryEligibility index (one query).
+        Returns: (set of bursary ids matching level, set matching field)
+        """
+        level = normalize_eligibility(self.profile.education_level)
+        field = normalize_eligibility(self.profile.field_of_study)
+        
+        lookup = Q()
+        if level:
+            lookup |= Q(kind='level', value=level)
+        if field:
+            lookup |= Q(kind='field', value=field)
+        if not lookup:
+            return set(), set()
+        
+        rows = BursaryEligibility.objects.filter(
+            lookup,
+            bursary__in=candidates.values('id')
+        ).values_list('bursary_id', 'kind')
+        
+        level_matches, field_matches = set(), set()
+        for bursary_id, kind in rows:
+            (level_matches if kind == 'level' else field_matches).add(bursary_id)
+        return level_matches, field_matches
+    
+    def _neighbour_counts(self):
+        """
+        Pattern counts from the offline co-application table (one query):
+        for each bursary, how often it was co-applied with the user's own
+        applications. See apps.bursaries.similarity.
+        Returns: dict of bursary id -> count, or None when the neutral
+        pattern score applies (new user or no similar users)
+        """
+        rows = BursarySimilarity.objects.filter(
+            bursary__in=ApplicationStatus.objects.filter(user=self.user).values('bursary')
+        ).values('neighbour').annotate(total=Sum('co_applicants'))
+        
+        counts = {row['neighbour']: row['total'] for row in rows}
+        return counts or None
+    
+    def _co_applicant_counts(self, candidates):
+        """
+        Count, per bursary, the applications made by users who share at
+        least one application with the current user.
+        Returns: dict of bursary id -> count, or None when the neutral
+        pattern score applies (new user or no similar users)
+        """
+        user_apps = list(ApplicationStatus.objects.filter(user=self.user).values_list('bursary', flat=True))
+        if not user_apps:
+            return None
+        
+        similar_users = ApplicationStatus.objects.filter(
+            bursary__in=user_apps
+        ).exclude(
+            user=self.user
+        ).values('user')
+        
+        if not similar_users.exists():
+            return None
+        
+        counts = ApplicationStatus.objects.filter(
+            user__in=similar_users,
+            bursary__in=candidates.values('id')
+        ).values('bursary').annotate(total=Count('id'))
+        
+        return {row['bursary']: row['total'] for row in counts}
     
     def _calculate_bursary_score(self, bursary):
         """Calculate composite score for a bursary (0-100)"""
-        profile_score = self._profile_match_score(bursary) * 0.40
-        trending_score = self._trending_score(bursary) * 0.20
-        urgency_score = self._deadline_urgency_score(bursary) * 0.20
-        pattern_score = self._application_pattern_score(bursary) * 0.20
+        return self._combine_scores(
+            self._profile_match_score(bursary),
+            self._trending_score(bursary),
+            self._deadline_urgency_score(bursary),
+            self._application_pattern_score(bursary),
+        )
+    
+    @staticmethod
+    def _combine_scores(profile, trending, urgency, pattern):
+        """Weighted 40/20/20/20 blend of the component scores"""
+        profile_score = profile * 0.40
+        trending_score = trending * 0.20
+        urgency_score = urgency * 0.20
+        pattern_score = pattern * 0.20
         
         total_score = profile_score + trending_score + urgency_score + pattern_score
         return round(total_score, 2)
@@ -70,37 +212,47 @@ class BursaryRecommendationEngine:
         """
         Score based on how well bursary matches student profile (0-100)
         """
+        level = normalize_eligibility(self.profile.education_level)
+        field = normalize_eligibility(self.profile.field_of_study)
+        return self._score_profile_match(
+            bool(level) and level in bursary.get_eligible_levels(),
+            bool(field) and field in bursary.get_eligible_fields(),
+            bursary.min_gpa,
+            bursary.country,
+            bursary.category,
+        )
+    
+    def _score_profile_match(self, level_match, field_match, min_gpa, country, category):
+        """Profile match score (0-100) from raw bursary column values"""
         score = 0
         max_score = 100
         
         # Education level match (30 points)
-        eligible_levels = [level.strip() for level in bursary.eligible_education_levels.split(',')]
-        if self.profile.education_level in eligible_levels:
+        if level_match:
             score += 30
         
         # Field of study match (30 points)
-        eligible_fields = [field.strip() for field in bursary.eligible_fields.split(',')]
-        if self.profile.field_of_study in eligible_fields:
+        if field_match:
             score += 30
         
         # GPA requirement (20 points)
-        if bursary.min_gpa:
-            if self.profile.gpa and self.profile.gpa >= bursary.min_gpa:
+        if min_gpa:
+            if self.profile.gpa and self.profile.gpa >= min_gpa:
                 score += 20
             # Partial points if close
-            elif self.profile.gpa and self.profile.gpa >= (bursary.min_gpa - 0.3):
+            elif self.profile.gpa and self.profile.gpa >= (min_gpa - Decimal('0.3')):
                 score += 10
         else:
             score += 20  # No GPA requirement = full points
         
         # Location match (10 points)
-        if bursary.country == self.profile.country:
+        if country == self.profile.country:
             score += 10
         
         # Financial need match (10 points)
-        if bursary.category == 'need' and self.profile.financial_need:
+        if category == 'need' and self.profile.financial_need:
             score += 10
-        elif bursary.category != 'need':
+        elif category != 'need':
             score += 5  # Neutral for non-need based
         
         return min(score, max_score)
@@ -110,15 +262,23 @@ class BursaryRecommendationEngine:
         Score based on popularity/trending (0-100)
         Factors: views, bookmarks, applications
         """
+        return self._score_trending(
+            bursary.views_count,
+            bursary.bookmarks_count,
+            bursary.applications_count,
+        )
+    
+    @staticmethod
+    def _score_trending(views_count, bookmark_count, applications_count):
+        """Trending score (0-100) from raw popularity counters"""
         # Normalize views (assume max 1000 views is 100%)
-        views_score = min((bursary.views_count / 1000) * 40, 40)
+        views_score = min((views_count / 1000) * 40, 40)
         
         # Count bookmarks (assume max 50 bookmarks is 100%)
-        bookmark_count = bursary.bookmarked_by.count()
         bookmark_score = min((bookmark_count / 50) * 30, 30)
         
         # Applications count (assume max 100 applications is 100%)
-        app_score = min((bursary.applications_count / 100) * 30, 30)
+        app_score = min((applications_count / 100) * 30, 30)
         
         return views_score + bookmark_score + app_score
     
@@ -127,8 +287,11 @@ class BursaryRecommendationEngine:
         Score based on how soon deadline is (0-100)
         More urgent = higher score (encourages action)
         """
-        days_left = bursary.days_until_deadline
-        
+        return self._score_deadline_urgency(bursary.days_until_deadline)
+    
+    @staticmethod
+    def _score_deadline_urgency(days_left):
+        """Urgency score (0-100) from the number of days left"""
         if days_left <= 0:
             return 0
         elif days_left <= 7:
@@ -169,6 +332,11 @@ class BursaryRecommendationEngine:
             bursary=bursary
         ).count()
         
+        return self._score_application_pattern(similar_applications)
+    
+    @staticmethod
+    def _score_application_pattern(similar_applications):
+        """Pattern score (0-100) from the co-applicant count"""
         # Normalize (assume 10 similar applications = 100%)
         score = min((similar_applications / 10) * 100, 100)
         
@@ -199,7 +367,7 @@ class BursaryRecommendationEngine:
             id=bursary.id
         ).filter(
             Q(category=bursary.category) |
-            Q(eligible_fields__icontains=bursary.eligible_fields.split(',')[0]) |
+            Q(eligibility__kind='field', eligibility__value__in=bursary.get_eligible_fields()[:1]) |
             Q(country=bursary.country)
         ).distinct()[:limit]
         
@@ -0,0 +1,192 @@
+# FULL-TEXT SEARCH
+# Pluggable search backends for bursaries. The backend is picked from the
+# database vendor (SQLite FTS5 or PostgreSQL tsvector) and can be overridden
+# with the BURSARY_SEARCH_BACKEND setting (dotted path to a backend class).
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Func, Q, Value
+from django.utils.module_loading import import_string
+from apps.bursaries.models import Bursary
+
+SEARCH_TABLE = 'bursaries_bursary_search'
+
+# Columns fed into the index, in FTS5 column order
+INDEXED_FIELDS = ('title', 'description', 'provider_name', 'eligibility')
+
+# BM25 column weights: title, description, provider, eligibility
+BM25_WEIGHTS = (10.0, 1.0, 5.0, 3.0)
+
+
+def tokenize_query(query):
+    """Split free text into plain word tokens, dropping search syntax"""
+    return re.findall(r'\w+', (query or '').lower())
+
+
+def document_values(bursary):
+    """Column values for one bursary, in INDEXED_FIELDS order"""
+    eligibility = f"{bursary.eligible_education_levels or ''} {bursary.eligible_fields or ''}"
+    return [bursary.title or '', bursary.description or '', bursary.provider_name or '', eligibility]
+
+
+class BaseSearchBackend:
+    """
+    Interface for bursary search backends
+    search() returns the given queryset narrowed to matches and annotated
+    with ``search_rank`` (lower is more relevant) ordered by relevance.
+    """
+
+    def search(self, queryset, query, match_any=False):
+        raise NotImplementedError
+
+    def index_bursary(self, bursary):
+        """Add or refresh a single bursary in the index"""
+
+    def remove_bursary(self, bursary_id):
+        """Drop a single bursary from the index"""
+
+    def rebuild(self):
+        """Re-index every bursary from scratch"""
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Substring search fallback with no ranking (any database)"""
+
+    def search(self, queryset, query, match_any=False):
+        terms = tokenize_query(query) if match_any else [query]
+        lookup = Q()
+        for term in terms:
+            lookup |= (
+                Q(title__icontains=term) |
+                Q(description__icontains=term) |
+                Q(provider_name__icontains=term)
+            )
+        if not terms:
+            return queryset.none()
+        return queryset.filter(lookup).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """SQLite FTS5 virtual table ranked with bm25()"""
+
+    def build_query(self, query, match_any=False):
+        terms = tokenize_query(query)
+        if not terms:
+            return ''
+        # Quote every token so user input can never be read as FTS5 syntax
+        joiner = ' OR ' if match_any else ' '
+        return joiner.join(f'"{term}"' for term in terms)
+
+    def search(self, queryset, query, match_any=False):
+        fts_query = self.build_query(query, match_any)
+        if not fts_query:
+            return queryset.none()
+        return queryset.filter(
+            search_document__document__match=fts_query
+        ).annotate(
+            search_rank=F('search_document__rank')
+        ).order_by('search_rank')
+
+    def index_bursary(self, bursary):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [bursary.pk])
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, {", ".join(INDEXED_FIELDS)}) VALUES (%s, %s, %s, %s, %s)',
+                [bursary.pk] + document_values(bursary)
+            )
+
+    def remove_bursary(self, bursary_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [bursary_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(INDEXED_FIELDS)}) "
+                f"SELECT id, title, description, provider_name, "
+                f"COALESCE(eligible_education_levels, '') || ' ' || COALESCE(eligible_fields, '') "
+                f"FROM {Bursary._meta.db_table}"
+            )
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """PostgreSQL tsvector table with a GIN index, ranked with ts_rank_cd()"""
+
+    # Weighted document built in SQL from the four indexed values
+    DOCUMENT_SQL = (
+        "setweight(to_tsvector('english', %s), 'A') || "
+        "setweight(to_tsvector('english', %s), 'C') || "
+        "setweight(to_tsvector('english', %s), 'B') || "
+        "setweight(to_tsvector('english', %s), 'B')"
+    )
+
+    def build_query(self, query, match_any=False):
+        terms = tokenize_query(query)
+        joiner = ' | ' if match_any else ' & '
+        return joiner.join(terms)
+
+    def search(self, queryset, query, match_any=False):
+        ts_query = self.build_query(query, match_any)
+        if not ts_query:
+            return queryset.none()
+        rank = Func(
+            F('search_document__document'),
+            Func(Value('english'), Value(ts_query), function='to_tsquery'),
+            function='ts_rank_cd',
+            output_field=FloatField(),
+        )
+        return queryset.filter(
+            search_document__document__match=ts_query
+        ).annotate(
+            search_rank=-rank
+        ).order_by('search_rank')
+
+    def index_bursary(self, bursary):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, document) VALUES (%s, {self.DOCUMENT_SQL}) '
+                f'ON CONFLICT (rowid) DO UPDATE SET document = EXCLUDED.document',
+                [bursary.pk] + document_values(bursary)
+            )
+
+    def remove_bursary(self, bursary_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [bursary_id])
+
+    def rebuild(self):
+        document_sql = self.DOCUMENT_SQL % (
+            "COALESCE(title, '')", "COALESCE(description, '')", "COALESCE(provider_name, '')",
+            "COALESCE(eligible_education_levels, '') || ' ' || COALESCE(eligible_fields, '')",
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {SEARCH_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, document) '
+                f'SELECT id, {document_sql} FROM {Bursary._meta.db_table}'
+            )
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTS5SearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    """Return the configured search backend for the default database"""
+    backend_path = getattr(settings, 'BURSARY_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return VENDOR_BACKENDS.get(connection.vendor, SimpleSearchBackend)()
+
+
+def search_bursaries(queryset, query, match_any=False):
+    """
+    Full-text search over a Bursary queryset
+    match_any=True matches bursaries containing any of the words (chatbot
+    questions); otherwise every word must be present (search box).
+    Returns: queryset ordered by relevance, annotated with search_rank
+    """
+    return get_search_backend().search(queryset, query, match_any=match_any)
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.accounts.models import StudentProfile
+from apps.applications.models import ApplicationStatus
+from apps.bursaries import counters, facets, fragment_cache, recommendation_cache, vector_index
+from apps.bursaries.models import Bursary, Bookmark
+from apps.bursaries.search import get_search_backend
+from apps.bursaries.tasks import refresh_recommendations
+from apps.jobs import queue
+
+# Saves touching only these don't invalidate facets or fragments; trending
+# order catches up when the fragment expires (FRAGMENT_CACHE_TIMEOUT)
+COUNTER_FIELDS = {'views_count', 'applications_count', 'bookmarks_count'}
+
+# Fields that feed the full-text index
+SEARCH_FIELDS = {'title', 'description', 'provider_name', 'eligible_education_levels', 'eligible_fields'}
+
+# Fields that feed the vector index; status decides whether a bursary is in it
+VECTOR_FIELDS = SEARCH_FIELDS | {'country', 'status'}
+
+
+@receiver(post_save, sender=Bursary)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """Re-index a bursary when any searchable field may have changed"""
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    get_search_backend().index_bursary(instance)
+
+
+@receiver(post_delete, sender=Bursary)
+def remove_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove_bursary(instance.pk)
+
+
+@receiver(post_save, sender=Bursary)
+def update_vector_index(sender, instance, update_fields=None, **kwargs):
+    """Re-embed a bursary once the save commits, if there is an index to update"""
+    if update_fields is not None and not VECTOR_FIELDS & set(update_fields):
+        return
+    index = vector_index.get_index()
+    if index is not None and index.exists():
+        transaction.on_commit(lambda: index.update(instance))
+
+
+@receiver(post_delete, sender=Bursary)
+def remove_from_vector_index(sender, instance, **kwargs):
+    index = vector_index.get_index()
+    if index is not None and index.exists():
+        pk = instance.pk
+        transaction.on_commit(lambda: index.remove(pk))
+
+
+@receiver(post_save, sender=Bursary)
+@receiver(post_delete, sender=Bursary)
+def invalidate_all_recommendations(sender, instance, **kwargs):
+    """The candidate set changed for everyone"""
+    recommendation_cache.invalidate_all()
+
+
+@receiver(post_save, sender=Bursary)
+@receiver(post_delete, sender=Bursary)
+def invalidate_listing_caches(sender, instance, update_fields=None, **kwargs):
+    """Facet counts and fragments may have changed unless only the view/apply/bookmark counters moved"""
+    if update_fields is not None and set(update_fields) <= COUNTER_FIELDS:
+        return
+    facets.invalidate()
+    fragment_cache.invalidate()
+
+
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_save, sender=ApplicationStatus)
+@receiver(post_delete, sender=ApplicationStatus)
+@receiver(post_save, sender=Bookmark)
+@receiver(post_delete, sender=Bookmark)
+def invalidate_user_recommendations(sender, instance, **kwargs):
+    """The student's own profile, applications or bookmarks changed"""
+    recommendation_cache.invalidate_user(instance.user_id)
+    if queue.background():
+        # Warm the cache again before the student's next visit; one pending refresh per student
+        user_id = instance.user_id
+        transaction.on_commit(lambda: refresh_recommendations.enqueue(user_id, unique_key=f'recs:{user_id}'))
+
+
+# Denormalized counters on Bursary
+counters.register(Bursary, 'applications_count', ApplicationStatus, 'bursary')
+counters.register(Bursary, 'bookmarks_count', Bookmark, 'bursary')
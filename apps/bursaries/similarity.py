@@ -0,0 +1,96 @@
+# OFFLINE CO-APPLICATION SIMILARITY
+# Builds the item-to-item table read by BursaryRecommendationEngine for the
+# "similar students applied" pattern score. Run via build_bursary_similarity.
+from collections import Counter, defaultdict
+from itertools import groupby
+from django.db import transaction
+from django.utils import timezone
+from apps.applications.models import ApplicationStatus
+from apps.bursaries.models import BursarySimilarity, BursarySimilarityState
+
+# Students with more applications than this only contribute their most
+# recent ones, keeping the pair count per student bounded
+MAX_APPLICATIONS_PER_USER = 200
+
+
+def _user_rows(queryset):
+    """Yield (user_id, [bursary_id, ...]) from the sparse user x bursary matrix"""
+    rows = queryset.order_by('user_id', '-id').values_list('user_id', 'bursary_id')
+    for user_id, group in groupby(rows.iterator(chunk_size=5000), key=lambda row: row[0]):
+        bursaries = [bursary_id for _, bursary_id in group]
+        yield user_id, bursaries[:MAX_APPLICATIONS_PER_USER]
+
+
+def _add_pairs(counts, new_ids, old_ids=()):
+    """Count co-applications among new_ids and between new_ids and old_ids"""
+    for position, bursary_id in enumerate(new_ids):
+        for other_id in new_ids[position + 1:]:
+            counts[bursary_id][other_id] += 1
+            counts[other_id][bursary_id] += 1
+        for other_id in old_ids:
+            counts[bursary_id][other_id] += 1
+            counts[other_id][bursary_id] += 1
+
+
+def _write_neighbours(counts, top_k, replace=True):
+    """Store the top K neighbours for every bursary in counts"""
+    rows = []
+    for bursary_id, neighbours in counts.items():
+        for neighbour_id, total in Counter(neighbours).most_common(top_k):
+            rows.append(BursarySimilarity(
+                bursary_id=bursary_id, neighbour_id=neighbour_id, co_applicants=total
+            ))
+    if replace:
+        bursary_ids = list(counts)
+        for start in range(0, len(bursary_ids), 500):
+            BursarySimilarity.objects.filter(bursary_id__in=bursary_ids[start:start + 500]).delete()
+    BursarySimilarity.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def build_similarity(full=False, top_k=None):
+    """
+    Build or update the co-application neighbour table
+    Incremental runs only read ApplicationStatus rows created since the last
+    run and merge them into the stored counts. Deleted applications and
+    pairs that fell outside the top K are only corrected by a full rebuild.
+    Returns: dict with the number of applications read and rows written
+    """
+    with transaction.atomic():
+        state = BursarySimilarityState.objects.select_for_update().get_or_create(pk=1)[0]
+        top_k = top_k or state.top_k
+        latest_id = ApplicationStatus.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        counts = defaultdict(Counter)
+        rebuild = full or state.built_at is None or top_k != state.top_k
+
+        if rebuild:
+            applications = ApplicationStatus.objects.filter(id__lte=latest_id)
+            for user_id, bursary_ids in _user_rows(applications):
+                _add_pairs(counts, bursary_ids)
+            BursarySimilarity.objects.all().delete()
+            read = applications.count()
+        else:
+            new_rows = ApplicationStatus.objects.filter(
+                id__gt=state.last_application_id, id__lte=latest_id
+            )
+            read = 0
+            for user_id, new_ids in _user_rows(new_rows):
+                old_ids = list(ApplicationStatus.objects.filter(
+                    user_id=user_id, id__lte=state.last_application_id
+                ).values_list('bursary_id', flat=True)[:MAX_APPLICATIONS_PER_USER])
+                _add_pairs(counts, new_ids, old_ids)
+                read += len(new_ids)
+
+            # Merge with what was stored for the affected bursaries
+            stored = BursarySimilarity.objects.filter(bursary_id__in=list(counts))
+            for bursary_id, neighbour_id, total in stored.values_list('bursary_id', 'neighbour_id', 'co_applicants'):
+                counts[bursary_id][neighbour_id] += total
+
+        written = _write_neighbours(counts, top_k, replace=not rebuild)
+
+        state.last_application_id = latest_id
+        state.top_k = top_k
+        state.built_at = timezone.now()
+        state.save()
+
+    return {'applications': read, 'rows': written, 'bursaries': len(counts)}
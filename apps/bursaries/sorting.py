@@ -0,0 +1,40 @@
+# LIST SORT OPTIONS
+# The only orderings bursary_list_view accepts. Each one has a matching
+# composite index on Bursary (status first, then the sort key and id) so an
+# active-bursary listing is read in index order instead of being sorted.
+from collections import namedtuple
+
+SortOption = namedtuple('SortOption', ['label', 'ordering'])
+
+SORT_OPTIONS = {
+    'newest': SortOption('Newest First', ('-created_at', '-id')),
+    'deadline': SortOption('Deadline (Soonest)', ('application_deadline', 'id')),
+    'amount': SortOption('Amount (Highest)', ('-amount', '-id')),
+    'popular': SortOption('Most Popular', ('-views_count', '-id')),
+}
+
+# Search results only; ordered by the full-text rank, not an index
+RELEVANCE = SortOption('Relevance', ('search_rank', 'id'))
+
+# Values the sort menu used to send, so old links keep working
+LEGACY_SORTS = {
+    '-created_at': 'newest',
+    'application_deadline': 'deadline',
+    '-amount': 'amount',
+    '-views_count': 'popular',
+}
+
+DEFAULT_SORT = 'newest'
+
+
+def resolve_sort(value, query=None):
+    """
+    Map a ?sort= value to (key, ordering); unknown values get the default
+    Searches default to relevance.
+    """
+    value = LEGACY_SORTS.get(value, value)
+    if value in SORT_OPTIONS:
+        return value, SORT_OPTIONS[value].ordering
+    if query:
+        return 'relevance', RELEVANCE.ordering
+    return DEFAULT_SORT, SORT_OPTIONS[DEFAULT_SORT].ordering
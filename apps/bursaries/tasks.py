@@ -0,0 +1,20 @@
+from apps.accounts.models import User
+from apps.bursaries import recommendation_cache
+from apps.bursaries.view_counter import get_view_counter
+from apps.jobs.queue import task
+
+
+@task('bursaries.refresh_recommendations', priority=-1)
+def refresh_recommendations(user_id):
+    """Recompute a student's home page recommendations into the cache after a change"""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return {'recommendations': 0}
+    recommendations = recommendation_cache.get_recommendations(user, limit=recommendation_cache.HOME_LIMIT)
+    return {'recommendations': len(recommendations)}
+
+
+@task('bursaries.flush_view_counts', priority=5, every=60)
+def flush_view_counts():
+    """What `manage.py flush_view_counts` does; only the cache-backed counter's buffer is shared with workers"""
+    return {'views': get_view_counter().flush()}
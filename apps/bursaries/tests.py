@@ -1,3 +1,892 @@
-from django.test import TestCase
+import random
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User, StudentProfile
+from apps.applications.models import ApplicationStatus
+from apps.bursaries.models import Bursary, Bookmark, BursaryEligibility, BursarySimilarity
+from apps.bursaries.pagination import KeysetPaginator
+from apps.bursaries.recommendations import BursaryRecommendationEngine
+from apps.bursaries import facets, recommendation_cache, vector_index, view_counter
+from apps.bursaries.search import get_search_backend, search_bursaries
+from apps.bursaries.similarity import build_similarity
+from apps.bursaries.sorting import SORT_OPTIONS, resolve_sort
+from apps.bursaries.view_counter import CacheViewCounter, MemoryViewCounter, record_view
+from apps.chatbot import response_cache
+from apps.chatbot.ai_service import ChatbotAIService
+from apps.chatbot.models import ChatConversation, ChatMessage
+
+
+LEVELS = ['high_school', 'diploma', 'bachelor', 'master', 'phd']
+FIELDS = ['engineering', 'medicine', 'law', 'computer science', 'education']
+COUNTRIES = ['Kenya', 'Uganda', 'Ghana']
+CATEGORIES = ['merit', 'need', 'demographic', 'subject', 'other']
+
+
+def build_seeded_dataset(seed=42, users=12, bursaries=40):
+    """Populate a small, reproducible set of students, bursaries and activity"""
+    rng = random.Random(seed)
+    today = timezone.now().date()
+
+    students = []
+    for i in range(users):
+        user = User.objects.create_user(username=f'student{i}', password='x')
+        StudentProfile.objects.create(
+            user=user,
+            education_level=rng.choice(LEVELS),
+            field_of_study=rng.choice(FIELDS),
+            institution='University',
+            gpa=Decimal(rng.choice(['2.50', '3.00', '3.40', '3.80'])),
+            country=rng.choice(COUNTRIES),
+            city='City',
+            financial_need=rng.choice(['high', 'medium', 'low']),
+        )
+        students.append(user)
+
+    items = []
+    for i in range(bursaries):
+        items.append(Bursary.objects.create(
+            title=f'Bursary {i}',
+            description='Funding for students',
+            category=rng.choice(CATEGORIES),
+            status=rng.choice(['active', 'active', 'active', 'closed']),
+            amount=Decimal(rng.randint(500, 20000)),
+            eligible_education_levels=', '.join(rng.sample(LEVELS, 2)),
+            eligible_fields=', '.join(rng.sample(FIELDS, 2)),
+            min_gpa=rng.choice([None, Decimal('3.00'), Decimal('3.50')]),
+            country=rng.choice(COUNTRIES),
+            provider_name='Provider',
+            application_deadline=today + timedelta(days=rng.randint(-5, 90)),
+            views_count=rng.randint(0, 1500),
+            applications_count=rng.randint(0, 120),
+        ))
+
+    for user in students:
+        for bursary in rng.sample(items, 6):
+            ApplicationStatus.objects.create(user=user, bursary=bursary, cover_letter='-')
+        for bursary in rng.sample(items, 4):
+            Bookmark.objects.get_or_create(user=user, bursary=bursary)
+
+    return students, items
+
+
+@override_settings(RECOMMENDATION_PATTERN_SOURCE='live')
+class BatchScoringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.students, cls.bursaries = build_seeded_dataset()
+
+    def test_batch_ranking_matches_per_bursary_scoring(self):
+        for user in self.students:
+            engine = BursaryRecommendationEngine(user)
+            expected = engine.get_recommendations(limit=50, batch=False)
+            actual = engine.get_recommendations(limit=50, batch=True)
+            self.assertEqual([b.id for b in actual], [b.id for b in expected])
+
+    def test_batch_scores_match_per_bursary_scores(self):
+        engine = BursaryRecommendationEngine(self.students[0])
+        candidates = engine._get_candidate_bursaries()
+        expected = {b.id: engine._calculate_bursary_score(b) for b in candidates}
+        actual = {b.id: score for b, score in engine._score_candidates_batch(candidates)}
+        self.assertEqual(actual, expected)
+
+    def test_batch_query_count_is_constant(self):
+        user = User.objects.get(pk=self.students[0].pk)
+        engine = BursaryRecommendationEngine(user)
+        with self.assertNumQueries(5):
+            engine.get_recommendations(limit=6)
+
+    def test_new_user_gets_neutral_pattern_score(self):
+        user = User.objects.create_user(username='fresh', password='x')
+        StudentProfile.objects.create(
+            user=user, education_level='bachelor', field_of_study='law',
+            institution='University', country='Kenya', city='City',
+        )
+        engine = BursaryRecommendationEngine(user)
+        self.assertIsNone(engine._co_applicant_counts(engine._get_candidate_bursaries()))
+        self.assertEqual(
+            [b.id for b in engine.get_recommendations(limit=10)],
+            [b.id for b in engine.get_recommendations(limit=10, batch=False)],
+        )
+
+
+class EligibilityIndexTests(TestCase):
+    def make_bursary(self, **kwargs):
+        defaults = dict(
+            title='Engineering Award', description='-', category='merit', status='active',
+            amount=Decimal('1000'), eligible_education_levels='Bachelor, master',
+            eligible_fields='Engineering,  Computer Science', country='Kenya',
+            provider_name='Provider', application_deadline=timezone.now().date() + timedelta(days=30),
+        )
+        defaults.update(kwargs)
+        return Bursary.objects.create(**defaults)
+
+    def index_of(self, bursary):
+        return set(BursaryEligibility.objects.filter(bursary=bursary).values_list('kind', 'value'))
+
+    def test_save_builds_normalized_rows(self):
+        bursary = self.make_bursary()
+        self.assertEqual(self.index_of(bursary), {
+            ('level', 'bachelor'), ('level', 'master'),
+            ('field', 'engineering'), ('field', 'computer science'),
+        })
+
+    def test_save_replaces_stale_rows(self):
+        bursary = self.make_bursary()
+        bursary.eligible_education_levels = 'phd'
+        bursary.save()
+        self.assertEqual(
+            {value for kind, value in self.index_of(bursary) if kind == 'level'}, {'phd'}
+        )
+
+    def test_counter_only_save_skips_sync(self):
+        bursary = self.make_bursary()
+        bursary.views_count = 5
+        with self.assertNumQueries(1):
+            bursary.save(update_fields=['views_count'])
+
+    def test_backfill_command_rebuilds_bulk_inserted_rows(self):
+        bursary = self.make_bursary()
+        BursaryEligibility.objects.all().delete()
+        Bursary.objects.filter(pk=bursary.pk).update(eligible_fields='Law')
+        call_command('backfill_eligibility', batch_size=1, stdout=open('/dev/null', 'w'))
+        self.assertIn(('field', 'law'), self.index_of(bursary))
+        self.assertNotIn(('field', 'engineering'), self.index_of(bursary))
+
+    def test_level_lookup_is_exact_match(self):
+        match = self.make_bursary()
+        self.make_bursary(title='Diploma Award', eligible_education_levels='diploma')
+        levels = Bursary.objects.filter(
+            eligibility__kind='level', eligibility__value='master'
+        )
+        self.assertEqual(list(levels), [match])
+
+    def test_approving_a_filtered_changelist_indexes_the_bursaries(self):
+        caches['chatbot'].clear()
+        bursary = self.make_bursary(status='pending')
+        BursaryEligibility.objects.all().delete()  # As if bulk inserted
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+        self.client.post(reverse('admin:bursaries_bursary_changelist') + '?status__exact=pending', {
+            'action': 'approve_bursaries', '_selected_action': [bursary.pk],
+        })
+        self.assertEqual(Bursary.objects.get(pk=bursary.pk).status, 'active')
+        self.assertIn(('field', 'engineering'), self.index_of(bursary))
+        self.assertIsNotNone(response_cache._cache().get(response_cache._bursary_version_key(bursary.pk)))
+
+
+class FullTextSearchTests(TestCase):
+    def make_bursary(self, title, description='General funding', **kwargs):
+        defaults = dict(
+            category='merit', status='active', amount=Decimal('1000'),
+            eligible_education_levels='bachelor', eligible_fields='any', country='Kenya',
+            provider_name='Provider', application_deadline=timezone.now().date() + timedelta(days=30),
+        )
+        defaults.update(kwargs)
+        return Bursary.objects.create(title=title, description=description, **defaults)
+
+    def test_title_matches_rank_above_description_matches(self):
+        in_description = self.make_bursary('Community Award', 'Open to engineering students')
+        in_title = self.make_bursary('Engineering Excellence Award')
+        results = list(search_bursaries(Bursary.objects.all(), 'engineering'))
+        self.assertEqual(results, [in_title, in_description])
+
+    def test_all_words_required_unless_match_any(self):
+        both = self.make_bursary('Women in Engineering')
+        one = self.make_bursary('Engineering Award')
+        self.assertEqual(list(search_bursaries(Bursary.objects.all(), 'women engineering')), [both])
+        self.assertEqual(
+            set(search_bursaries(Bursary.objects.all(), 'women engineering', match_any=True)),
+            {both, one},
+        )
+
+    def test_index_follows_saves_and_deletes(self):
+        bursary = self.make_bursary('Medicine Award')
+        bursary.title = 'Nursing Award'
+        bursary.save()
+        self.assertFalse(search_bursaries(Bursary.objects.all(), 'medicine').exists())
+        self.assertTrue(search_bursaries(Bursary.objects.all(), 'nursing').exists())
+        bursary.delete()
+        self.assertFalse(search_bursaries(Bursary.objects.all(), 'nursing').exists())
+
+    def test_eligibility_and_provider_are_indexed(self):
+        bursary = self.make_bursary('Award', eligible_fields='agriculture', provider_name='Acme Trust')
+        self.assertEqual(list(search_bursaries(Bursary.objects.all(), 'agriculture')), [bursary])
+        self.assertEqual(list(search_bursaries(Bursary.objects.all(), 'acme')), [bursary])
+
+    def test_search_syntax_in_user_input_is_ignored(self):
+        bursary = self.make_bursary('Law Bursary')
+        results = search_bursaries(Bursary.objects.all(), 'law" OR title:* (NEAR')
+        self.assertEqual(list(results), [])
+        results = search_bursaries(Bursary.objects.all(), '"law" :: *', match_any=True)
+        self.assertEqual(list(results), [bursary])
+        self.assertFalse(search_bursaries(Bursary.objects.all(), '?!').exists())
+
+    def test_chatbot_retriever_matches_natural_questions(self):
+        bursary = self.make_bursary('Engineering Scholarship')
+        self.make_bursary('Closed Engineering Grant', status='closed')
+        service = ChatbotAIService()
+        self.assertEqual(
+            list(service.get_relevant_bursaries('what engineering scholarships are open?')),
+            [bursary],
+        )
+
+
+@skipUnless(vector_index.np is not None, 'needs numpy')
+class VectorIndexTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(VECTOR_INDEX_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.index = vector_index.get_index()
+
+    def make_bursary(self, title, description='General funding', **kwargs):
+        defaults = dict(
+            category='merit', status='active', amount=Decimal('1000'),
+            eligible_education_levels='bachelor', eligible_fields='any', country='Kenya',
+            provider_name='Provider', application_deadline=timezone.now().date() + timedelta(days=30),
+        )
+        defaults.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Bursary.objects.create(title=title, description=description, **defaults)
+
+    def ids(self, question):
+        return [pk for pk, _ in vector_index.search(question)]
+
+    def test_natural_question_finds_active_bursaries(self):
+        nursing = self.make_bursary('Nursing Scholarship', eligible_fields='medicine, nursing')
+        self.make_bursary('Law Award', eligible_fields='law')
+        self.make_bursary('Closed Nursing Grant', status='closed')
+        self.assertEqual(self.index.build(), 2)
+        self.assertEqual(self.ids('Are there any scholarships for nurses studying medicine?'), [nursing.pk])
+
+    def test_saves_and_deletes_update_the_index(self):
+        self.index.build()
+        bursary = self.make_bursary('Agriculture Bursary')
+        self.assertEqual(self.ids('agriculture'), [bursary.pk])
+
+        bursary.title = 'Forestry Bursary'
+        with self.captureOnCommitCallbacks(execute=True):
+            bursary.save()
+        self.assertEqual(self.ids('agriculture'), [])
+        self.assertEqual(self.ids('forestry'), [bursary.pk])
+
+        bursary.status = 'closed'
+        with self.captureOnCommitCallbacks(execute=True):
+            bursary.save()
+        self.assertEqual(self.ids('forestry'), [])
+
+        reopened = self.make_bursary('Forestry Grant')
+        with self.captureOnCommitCallbacks(execute=True):
+            reopened.delete()
+        self.assertEqual(self.ids('forestry'), [])
+
+    def test_admin_approve_and_close_update_the_index(self):
+        self.index.build()
+        bursary = self.make_bursary('Zymurgy Bursary', 'Brewing and fermentation science', status='pending')
+        self.assertEqual(self.ids('zymurgy fermentation'), [])
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+        changelist = reverse('admin:bursaries_bursary_changelist')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(changelist + '?status__exact=pending', {
+                'action': 'approve_bursaries', '_selected_action': [bursary.pk],
+            })
+        self.assertEqual(self.ids('zymurgy fermentation'), [bursary.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(changelist, {'action': 'close_bursaries', '_selected_action': [bursary.pk]})
+        self.assertEqual(self.ids('zymurgy fermentation'), [])
+
+    def test_counter_saves_skip_the_index(self):
+        self.index.build()
+        bursary = self.make_bursary('Music Award')
+        with mock.patch.object(vector_index.VectorIndex, 'update') as update:
+            with self.captureOnCommitCallbacks(execute=True):
+                bursary.views_count = 5
+                bursary.save(update_fields=['views_count'])
+        update.assert_not_called()
+
+    def test_index_grows_past_its_capacity(self):
+        self.index.build()
+        capacity = self.index.meta['capacity']
+        for i in range(capacity + 1):
+            self.make_bursary(f'Award {i}', eligible_fields=f'field{i}')
+        self.assertGreater(self.index.meta['capacity'], capacity)
+        self.assertEqual(self.ids(f'field{capacity}'), [Bursary.objects.get(title=f'Award {capacity}').pk])
+        # Another process opening the index sees the same rows
+        fresh = vector_index.VectorIndex(self.index.path)
+        self.assertEqual(fresh.search('field0', k=1), self.index.search('field0', k=1))
+
+    def test_clustered_search_probing_every_list_is_exact(self):
+        for i, field in enumerate(FIELDS * 4):
+            self.make_bursary(f'{field.title()} Award {i}', eligible_fields=field)
+        self.index.build(nlist=4)
+        self.assertEqual(self.index.meta['nlist'], 4)
+        question = 'computer science or engineering'
+        self.assertEqual(
+            self.index.search(question, k=5, nprobe=4),
+            self.index.search(question, k=5, exact=True),
+        )
+
+    def test_chatbot_retrieves_from_the_index(self):
+        bursary = self.make_bursary('Teacher Training Scholarship', eligible_fields='education')
+        self.index.build()
+        with mock.patch('apps.chatbot.ai_service.search_bursaries') as full_text:
+            found = ChatbotAIService().get_relevant_bursaries('any bursaries for future teachers?')
+        self.assertEqual(found, [bursary])
+        full_text.assert_not_called()
+
+    @override_settings(VECTOR_INDEX_DIR='')
+    def test_chatbot_falls_back_to_full_text_search(self):
+        bursary = self.make_bursary('Teaching Scholarship')
+        found = ChatbotAIService().get_relevant_bursaries('teaching scholarship')
+        self.assertEqual(list(found), [bursary])
+
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.bursary = Bursary.objects.create(
+            title='Counted Award', description='-', category='merit', status='active',
+            amount=Decimal('1000'), eligible_education_levels='bachelor', eligible_fields='any',
+            country='Kenya', provider_name='Provider',
+            application_deadline=timezone.now().date() + timedelta(days=30),
+        )
+
+    def views_in_db(self):
+        return Bursary.objects.get(pk=self.bursary.pk).views_count
+
+    def test_memory_counter_buffers_until_threshold(self):
+        counter = MemoryViewCounter(flush_interval=3600, max_pending=5)
+        for _ in range(4):
+            counter.increment(self.bursary.pk)
+        self.assertEqual(self.views_in_db(), 0)
+        self.assertEqual(counter.pending(self.bursary.pk), 4)
+        counter.increment(self.bursary.pk)
+        self.assertEqual(self.views_in_db(), 5)
+        self.assertEqual(counter.pending(self.bursary.pk), 0)
+
+    def test_flush_issues_one_update_per_distinct_increment(self):
+        other = Bursary.objects.create(
+            title='Other Award', description='-', category='merit', status='active',
+            amount=Decimal('1000'), eligible_education_levels='bachelor', eligible_fields='any',
+            country='Kenya', provider_name='Provider',
+            application_deadline=timezone.now().date() + timedelta(days=30),
+        )
+        counter = MemoryViewCounter(flush_interval=3600, max_pending=1000)
+        counter.increment(self.bursary.pk, 3)
+        counter.increment(other.pk, 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(counter.flush(), 6)
+        self.assertEqual(Bursary.objects.get(pk=other.pk).views_count, 3)
+
+    def test_failed_flush_keeps_views_buffered(self):
+        counter = MemoryViewCounter(flush_interval=3600, max_pending=1000)
+        counter.increment(self.bursary.pk, 2)
+        with mock.patch('apps.bursaries.view_counter.apply_view_increments', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                counter.flush()
+        self.assertEqual(counter.pending(self.bursary.pk), 2)
+        counter.flush()
+        self.assertEqual(self.views_in_db(), 2)
+
+    def test_exit_hook_flushes_memory_buffer(self):
+        counter = MemoryViewCounter(flush_interval=3600, max_pending=1000)
+        counter.increment(self.bursary.pk, 7)
+        with mock.patch('apps.bursaries.view_counter._view_counter', counter):
+            view_counter.flush_on_exit()
+        self.assertEqual(self.views_in_db(), 7)
+
+    def test_cache_counter_flushed_by_command(self):
+        counter = CacheViewCounter()
+        counter.increment(self.bursary.pk)
+        counter.increment(self.bursary.pk)
+        with mock.patch('apps.bursaries.view_counter._view_counter', counter):
+            call_command('flush_view_counts', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.views_in_db(), 2)
+        self.assertEqual(counter.pending(self.bursary.pk), 0)
+
+    def test_cache_counter_flushes_only_viewed_bursaries(self):
+        counter = CacheViewCounter()
+        with self.assertNumQueries(0):
+            self.assertEqual(counter.flush(), 0)
+
+        counter.increment(self.bursary.pk, 2)
+        counter.increment(self.bursary.pk)
+        # The UPDATE only; no scan of the bursary table
+        with self.assertNumQueries(1):
+            self.assertEqual(counter.flush(), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(counter.flush(), 0)
+
+        # Viewed again after the flush: marked again
+        counter.increment(self.bursary.pk)
+        self.assertEqual(counter.flush(), 1)
+        self.assertEqual(self.views_in_db(), 4)
+
+    def test_flush_all_finds_unmarked_views(self):
+        counter = CacheViewCounter()
+        counter.increment(self.bursary.pk, 2)
+        caches['default'].delete(counter._slot_key(1))  # Evicted
+        self.assertEqual(counter.flush(), 0)
+        with mock.patch('apps.bursaries.view_counter._view_counter', counter):
+            call_command('flush_view_counts', '--all', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.views_in_db(), 2)
+
+    def test_record_view_shows_buffered_count(self):
+        counter = MemoryViewCounter(flush_interval=3600, max_pending=1000)
+        with mock.patch('apps.bursaries.view_counter._view_counter', counter):
+            record_view(self.bursary)
+            bursary = Bursary.objects.get(pk=self.bursary.pk)
+            self.assertEqual(record_view(bursary), 2)
+        self.assertEqual(self.views_in_db(), 0)
+
+
+class RecommendationCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.students, cls.bursaries = build_seeded_dataset(users=3, bursaries=15)
+
+    def setUp(self):
+        caches['recommendations'].clear()
+        recommendation_cache.stats.reset()
+        self.user = User.objects.get(pk=self.students[0].pk)
+
+    def test_warm_lookup_runs_no_queries(self):
+        cold = recommendation_cache.get_recommendations(self.user, limit=6)
+        with self.assertNumQueries(0):
+            warm = recommendation_cache.get_recommendations(self.user, limit=6)
+        self.assertEqual([b.id for b in warm], [b.id for b in cold])
+        self.assertEqual(recommendation_cache.stats.as_dict()['hit_ratio'], 0.5)
+
+    def assert_invalidated_by(self, change):
+        recommendation_cache.get_recommendations(self.user, limit=6)
+        change()
+        recommendation_cache.get_recommendations(self.user, limit=6)
+        self.assertEqual(recommendation_cache.stats.as_dict()['misses'], 2)
+
+    def test_profile_change_invalidates(self):
+        def change():
+            profile = StudentProfile.objects.get(user=self.user)
+            profile.field_of_study = 'law'
+            profile.save()
+        self.assert_invalidated_by(change)
+
+    def test_bookmark_invalidates(self):
+        bursary = Bursary.objects.exclude(bookmarked_by__user=self.user).first()
+        self.assert_invalidated_by(lambda: Bookmark.objects.create(user=self.user, bursary=bursary))
+
+    def test_application_delete_invalidates(self):
+        self.assert_invalidated_by(lambda: ApplicationStatus.objects.filter(user=self.user).first().delete())
+
+    def test_bursary_change_invalidates_everyone(self):
+        self.assert_invalidated_by(lambda: self.bursaries[0].save())
+
+    def test_other_users_changes_do_not_invalidate(self):
+        recommendation_cache.get_recommendations(self.user, limit=6)
+        Bookmark.objects.filter(user=self.students[1]).first().delete()
+        recommendation_cache.get_recommendations(self.user, limit=6)
+        self.assertEqual(recommendation_cache.stats.as_dict()['hits'], 1)
+
+    def test_falls_back_to_local_memory_when_cache_fails(self):
+        broken = mock.Mock(**{'get_many.side_effect': ConnectionError, 'get.side_effect': ConnectionError,
+                              'set.side_effect': ConnectionError})
+        with mock.patch('apps.bursaries.recommendation_cache._cache', return_value=broken), \
+                self.assertLogs('apps.bursaries.recommendation_cache', 'WARNING'):
+            first = recommendation_cache.get_recommendations(self.user, limit=6)
+            second = recommendation_cache.get_recommendations(self.user, limit=6)
+        self.assertEqual(first, second)
+        self.assertGreater(recommendation_cache.stats.as_dict()['fallbacks'], 0)
+
+
+class BursarySimilarityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.students, cls.bursaries = build_seeded_dataset(users=8, bursaries=20)
+
+    def stored(self):
+        return {
+            (row.bursary_id, row.neighbour_id): row.co_applicants
+            for row in BursarySimilarity.objects.all()
+        }
+
+    def brute_force(self):
+        applied = {}
+        for user_id, bursary_id in ApplicationStatus.objects.values_list('user_id', 'bursary_id'):
+            applied.setdefault(user_id, set()).add(bursary_id)
+        pairs = {}
+        for bursary_ids in applied.values():
+            for a in bursary_ids:
+                for b in bursary_ids - {a}:
+                    pairs[(a, b)] = pairs.get((a, b), 0) + 1
+        return pairs
+
+    def test_full_build_matches_co_application_counts(self):
+        build_similarity(full=True, top_k=100)
+        self.assertEqual(self.stored(), self.brute_force())
+
+    def test_incremental_update_matches_full_rebuild(self):
+        build_similarity(full=True, top_k=100)
+        user = self.students[0]
+        for bursary in Bursary.objects.exclude(applications__user=user)[:3]:
+            ApplicationStatus.objects.create(user=user, bursary=bursary, cover_letter='-')
+        newcomer = User.objects.create_user(username='newcomer', password='x')
+        for bursary in self.bursaries[:2]:
+            ApplicationStatus.objects.create(user=newcomer, bursary=bursary, cover_letter='-')
+
+        result = build_similarity()
+        self.assertEqual(result['applications'], 5)
+        self.assertEqual(self.stored(), self.brute_force())
+
+    def test_top_k_limits_neighbours_per_bursary(self):
+        build_similarity(full=True, top_k=2)
+        per_bursary = {}
+        for bursary_id, _ in self.stored():
+            per_bursary[bursary_id] = per_bursary.get(bursary_id, 0) + 1
+        self.assertLessEqual(max(per_bursary.values()), 2)
+
+    def test_offline_pattern_counts_take_one_query(self):
+        build_similarity(full=True, top_k=100)
+        user = User.objects.get(pk=self.students[0].pk)
+        engine = BursaryRecommendationEngine(user)
+        with self.assertNumQueries(1):
+            counts = engine._neighbour_counts()
+
+        mine = set(ApplicationStatus.objects.filter(user=user).values_list('bursary_id', flat=True))
+        expected = {}
+        for (bursary_id, neighbour_id), total in self.brute_force().items():
+            if bursary_id in mine:
+                expected[neighbour_id] = expected.get(neighbour_id, 0) + total
+        self.assertEqual(counts, expected)
+
+    def test_offline_scoring_query_count_is_constant(self):
+        build_similarity(full=True)
+        engine = BursaryRecommendationEngine(User.objects.get(pk=self.students[0].pk))
+        with self.assertNumQueries(3):
+            engine.get_recommendations(limit=6)
+
+    def test_build_command_reports_progress(self):
+        out = StringIO()
+        call_command('build_bursary_similarity', '--full', stdout=out)
+        self.assertIn('neighbour rows', out.getvalue())
+
+
+class DenormalizedCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='x')
+        self.bursary = Bursary.objects.create(
+            title='Counted Award', description='-', category='merit', status='active',
+            amount=Decimal('1000'), eligible_education_levels='bachelor', eligible_fields='any',
+            country='Kenya', provider_name='Provider',
+            application_deadline=timezone.now().date() + timedelta(days=30),
+        )
+        self.client.force_login(self.user)
+
+    def counts(self):
+        self.bursary.refresh_from_db()
+        return self.bursary.applications_count, self.bursary.bookmarks_count
+
+    def test_views_maintain_bursary_counters(self):
+        self.client.get(reverse('applications:add', args=[self.bursary.pk]))
+        self.client.get(reverse('bursaries:toggle_bookmark', args=[self.bursary.slug]))
+        self.assertEqual(self.counts(), (1, 1))
+
+        # Repeat requests don't double count; a second toggle removes the bookmark
+        self.client.get(reverse('applications:add', args=[self.bursary.pk]))
+        self.client.get(reverse('bursaries:toggle_bookmark', args=[self.bursary.slug]))
+        self.assertEqual(self.counts(), (1, 0))
+
+        ApplicationStatus.objects.filter(user=self.user).delete()
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_message_count(self):
+        conversation = ChatConversation.objects.create(user=self.user, session_id='s1')
+        for sender in ('user', 'bot', 'user'):
+            ChatMessage.objects.create(conversation=conversation, sender=sender, message='-')
+        conversation.messages.first().delete()
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.message_count, 2)
+
+    def test_reconcile_repairs_drift(self):
+        # bulk_create and update() bypass the signals
+        Bookmark.objects.bulk_create([Bookmark(user=self.user, bursary=self.bursary)])
+        Bursary.objects.filter(pk=self.bursary.pk).update(applications_count=7)
+        conversation = ChatConversation.objects.create(user=self.user, session_id='s1')
+        ChatMessage.objects.bulk_create([ChatMessage(conversation=conversation, sender='user', message='-')])
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('bursaries.Bursary.applications_count: 1 corrected', out.getvalue())
+        self.assertEqual(self.counts(), (0, 1))
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.message_count, 1)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        deadline = timezone.now().date() + timedelta(days=30)
+        Bursary.objects.bulk_create([
+            Bursary(
+                title=f'Keyset Award {index}', slug=f'keyset-award-{index}', description='Engineering support',
+                category='merit', status='active', amount=Decimal(1000 + (index % 4) * 250),
+                eligible_education_levels='bachelor', eligible_fields='engineering', country='Kenya',
+                provider_name='Provider', application_deadline=deadline,
+            )
+            for index in range(30)
+        ])
+        # Ties on the sort key must not lose or repeat rows between pages
+        created = timezone.now()
+        Bursary.objects.filter(title__endswith='0').update(created_at=created)
+        get_search_backend().rebuild()  # bulk_create skips the indexing signal
+
+    def walk(self, paginator):
+        seen, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            seen.extend(bursary.pk for bursary in page)
+            if not page.has_next():
+                return seen, page
+            cursor = page.next_cursor
+
+    def test_pages_cover_ordering_once(self):
+        for ordering in [('-created_at', '-id'), ('-amount', '-id'), ('application_deadline', 'id')]:
+            queryset = Bursary.objects.filter(status='active')
+            paginator = KeysetPaginator(queryset, ordering, 7)
+            seen, _ = self.walk(paginator)
+            self.assertEqual(seen, list(queryset.order_by(*ordering).values_list('pk', flat=True)))
+
+    def test_previous_cursor_returns_prior_page(self):
+        paginator = KeysetPaginator(Bursary.objects.all(), ('-created_at', '-id'), 7)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        self.assertFalse(first.has_previous())
+        self.assertEqual(list(paginator.get_page(second.previous_cursor)), list(first))
+
+    def test_deep_page_is_one_query(self):
+        paginator = KeysetPaginator(Bursary.objects.all(), ('-created_at', '-id'), 5)
+        page = paginator.get_page()
+        for _ in range(4):
+            page = paginator.get_page(page.next_cursor)
+        with self.assertNumQueries(1):
+            paginator.get_page(page.next_cursor)
+
+    def test_invalid_cursor_starts_over(self):
+        paginator = KeysetPaginator(Bursary.objects.all(), ('-created_at', '-id'), 5)
+        cursor = paginator.get_page().next_cursor
+        self.assertEqual(list(paginator.get_page(cursor[:-2] + 'xx')), list(paginator.get_page()))
+
+    def test_search_results_page_by_rank(self):
+        queryset = search_bursaries(Bursary.objects.filter(status='active'), 'engineering')
+        seen, _ = self.walk(KeysetPaginator(queryset, ('search_rank', 'id'), 8))
+        self.assertEqual(sorted(seen), sorted(Bursary.objects.values_list('pk', flat=True)))
+
+    def test_list_api_scrolls_through_results(self):
+        url = reverse('bursaries:list_api')
+        seen, cursor = [], None
+        while True:
+            params = {'sort': '-amount'}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(url, params).json()
+            seen.extend(item['id'] for item in data['results'])
+            self.assertEqual(data['html'].count('bursary-card'), len(data['results']))
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(
+            seen,
+            list(Bursary.objects.order_by('-amount', '-id').values_list('pk', flat=True))
+        )
+
+
+class SortRegistryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        deadline = timezone.now().date() + timedelta(days=30)
+        Bursary.objects.bulk_create([
+            Bursary(
+                title=f'Sorted Award {index}', slug=f'sorted-award-{index}', description='-',
+                category='merit', status='active' if index % 3 else 'closed',
+                amount=Decimal(500 + index * 100), views_count=index * 7 % 11,
+                eligible_education_levels='bachelor', eligible_fields='any', country='Kenya',
+                provider_name='Provider', application_deadline=deadline + timedelta(days=index % 5),
+            )
+            for index in range(20)
+        ])
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def test_each_sort_reads_its_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('query plan assertions are written for SQLite')
+        indexes = {
+            'newest': 'bursary_status_created_idx',
+            'deadline': 'bursary_status_deadline_idx',
+            'amount': 'bursary_status_amount_idx',
+            'popular': 'bursary_status_views_idx',
+        }
+        self.assertEqual(set(indexes), set(SORT_OPTIONS))
+        for key, index in indexes.items():
+            ordering = SORT_OPTIONS[key].ordering
+            paginator = KeysetPaginator(Bursary.objects.filter(status='active'), ordering, 5)
+            first = paginator.queryset.order_by(*paginator._order_by())[:6]
+            boundary = first[4]
+            values = paginator._values(boundary)
+            later = paginator.queryset.filter(paginator._after(values)).order_by(*paginator._order_by())[:6]
+            for queryset in (first, later):
+                with self.subTest(sort=key):
+                    plan = self.plan(queryset)
+                    self.assertIn(index, plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_list_orders_by_registry(self):
+        response = self.client.get(reverse('bursaries:list'), {'sort': 'amount'})
+        amounts = [bursary.amount for bursary in response.context['page_obj']]
+        self.assertEqual(amounts, sorted(amounts, reverse=True))
+        self.assertEqual(response.context['selected_sort'], 'amount')
+
+    def test_unknown_sort_falls_back(self):
+        for value in ['password', 'user__password', '-', '']:
+            response = self.client.get(reverse('bursaries:list'), {'sort': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['selected_sort'], 'newest')
+        self.assertEqual(resolve_sort('bogus', query='engineering')[0], 'relevance')
+
+    def test_legacy_values_still_accepted(self):
+        self.assertEqual(resolve_sort('-views_count'), ('popular', ('-views_count', '-id')))
+        self.assertEqual(resolve_sort('application_deadline')[0], 'deadline')
+
+
+class FacetTests(TestCase):
+    def make_bursary(self, title, **kwargs):
+        defaults = dict(
+            description='-', category='merit', status='active', amount=Decimal('1000'),
+            eligible_education_levels='bachelor', eligible_fields='any', country='Kenya',
+            provider_name='Provider', application_deadline=timezone.now().date() + timedelta(days=30),
+        )
+        defaults.update(kwargs)
+        return Bursary.objects.create(title=title, **defaults)
+
+    def setUp(self):
+        caches['default'].clear()
+        facets.stats.reset()
+        self.make_bursary('Engineering Merit Award', amount=Decimal('800'), eligible_education_levels='bachelor')
+        self.make_bursary('Engineering Need Award', category='need', amount=Decimal('3000'),
+                     eligible_education_levels='bachelor, masters')
+        self.make_bursary('Ghana Merit Award', country='Ghana', amount=Decimal('25000'), eligible_education_levels='phd')
+        self.make_bursary('Closed Merit Award', status='closed')
+
+    def counts(self, result, facet):
+        return {value: count for value, _, count in result[facet] if count}
+
+    def test_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            result = facets.compute_facets(None, {})
+        self.assertEqual(self.counts(result, 'category'), {'merit': 2, 'need': 1})
+        self.assertEqual(self.counts(result, 'country'), {'Kenya': 2, 'Ghana': 1})
+        self.assertEqual(self.counts(result, 'education_level'), {'bachelor': 2, 'masters': 1, 'phd': 1})
+        self.assertEqual(self.counts(result, 'amount'), {'under-1000': 1, '1000-5000': 1, '20000-plus': 1})
+        # Declared options are listed even when empty
+        self.assertEqual(len(result['category']), len(Bursary.CATEGORY_CHOICES))
+
+    def test_each_facet_ignores_its_own_filter(self):
+        result = facets.compute_facets('engineering', {'category': 'merit'})
+        self.assertEqual(self.counts(result, 'category'), {'merit': 1, 'need': 1})
+        self.assertEqual(self.counts(result, 'country'), {'Kenya': 1})
+        self.assertEqual(self.counts(result, 'amount'), {'under-1000': 1})
+
+    def test_cached_per_fingerprint_until_bursaries_change(self):
+        facets.get_facets(None, {'country': 'Kenya'})
+        with self.assertNumQueries(0):
+            facets.get_facets(None, {'country': 'Kenya'})
+        self.assertEqual((facets.stats.hits, facets.stats.misses), (1, 1))
+
+        self.make_bursary('Another Kenya Award')
+        result = facets.get_facets(None, {'country': 'Kenya'})
+        self.assertEqual(self.counts(result, 'category'), {'merit': 2, 'need': 1})
+
+    def test_list_view_filters_and_renders_counts(self):
+        url = reverse('bursaries:list')
+        self.client.get(url, {'amount': '20000-plus'})
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'amount': '20000-plus', 'cursor': ''})
+        self.assertEqual([b.title for b in response.context['page_obj']], ['Ghana Merit Award'])
+        self.assertContains(response, 'Need-Based (0)')
+        self.assertContains(response, 'Under 1,000 (1)')
+        self.assertEqual(response.context['selected_filters'], {'amount': '20000-plus'})
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        caches['fragments'].clear()
+        self.student = User.objects.create_user(username='student', password='x')
+        self.bursaries = [
+            Bursary.objects.create(
+                title=f'Fragment Award {index}', description='-', category='merit', status='active',
+                amount=Decimal('1000'), eligible_education_levels='bachelor', eligible_fields='law',
+                country='Kenya', provider_name='Provider', views_count=index,
+                application_deadline=timezone.now().date() + timedelta(days=30),
+            )
+            for index in range(3)
+        ]
+        # Detail page views stay in a private buffer
+        counter = mock.patch('apps.bursaries.view_counter._view_counter', MemoryViewCounter(flush_interval=3600))
+        counter.start()
+        self.addCleanup(counter.stop)
+
+    def test_trending_block_cached_for_anonymous_visitors(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Fragment Award 2')
+        self.assertNotContains(response, 'bi-bookmark"')
+
+    def test_signed_in_visitors_get_their_own_variant(self):
+        self.client.get(reverse('home'))
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, reverse('bursaries:toggle_bookmark', args=[self.bursaries[0].slug]))
+
+    def test_bursary_save_bumps_version(self):
+        self.client.get(reverse('home'))
+        self.bursaries[2].title = 'Renamed Award'
+        self.bursaries[2].save()
+        self.assertContains(self.client.get(reverse('home')), 'Renamed Award')
+
+        # Counter-only updates keep the cached fragment
+        self.bursaries[0].views_count = 50
+        self.bursaries[0].save(update_fields=['views_count'])
+        with self.assertNumQueries(0):
+            self.client.get(reverse('home'))
+
+    def test_similar_block_cached_but_bookmark_state_is_per_user(self):
+        Bookmark.objects.create(user=self.student, bursary=self.bursaries[0])
+        url = reverse('bursaries:detail', args=[self.bursaries[0].slug])
+        self.client.force_login(self.student)
+        self.assertContains(self.client.get(url), 'Bookmarked')
+        self.assertContains(self.client.get(url), 'Fragment Award 1')
+
+        other = User.objects.create_user(username='other', password='x')
+        self.client.force_login(other)
+        # A stale fragment would render the mock's (empty) results instead
+        with mock.patch.object(BursaryRecommendationEngine, 'get_similar_bursaries'):
+            response = self.client.get(url)
+        self.assertNotContains(response, 'Bookmarked')
+        self.assertContains(response, 'Fragment Award 1')
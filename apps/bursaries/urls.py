@@ -5,6 +5,7 @@ app_name = 'bursaries'
 
 urlpatterns = [
     path('', views.bursary_list_view, name='list'),
+    path('api/list/', views.bursary_list_api, name='list_api'),
     path('<slug:slug>/', views.bursary_detail_view, name='detail'),
     path('<slug:slug>/bookmark/', views.toggle_bookmark, name='toggle_bookmark'),
     path('my/bookmarks/', views.bookmarks_view, name='bookmarks'),
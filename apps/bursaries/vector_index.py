@@ -0,0 +1,427 @@
+# VECTOR INDEX
+# Dense vectors for chatbot retrieval over active bursaries. Title,
+# eligibility, provider and description words are hashed into HASH_DIM
+# buckets, weighted by TF-IDF, and reduced to DIM dimensions with a fixed
+# random sign projection. Unlike SVD, the projection never needs
+# refitting, so single bursaries can be added or changed in place. Vectors
+# live in memory-mapped .npy files under VECTOR_INDEX_DIR. Search is an
+# inverted file: vectors are grouped around k-means centroids and only the
+# VECTOR_INDEX_NPROBE closest groups are scored. NumPy is optional; without
+# it (or before build_vector_index has run) retrieval uses full-text search.
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from apps.bursaries.models import Bursary
+from apps.bursaries.search import tokenize_query
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only needed for vector retrieval
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; writers in one process still serialize
+    fcntl = None
+
+HASH_DIM = 2 ** 14
+DIM = 512
+SEED = 1729
+
+# Below this many rows scoring every vector takes a few milliseconds and
+# the clusters wouldn't pay for the recall they cost
+EXACT_SEARCH_ROWS = 20000
+
+# Descriptions are long and wordy; left at full weight they outvote the title
+FIELD_WEIGHTS = {'title': 2.0, 'eligibility': 2.0, 'provider': 1.0, 'description': 0.5}
+
+STOP_WORDS = frozenset('''
+    a about am an and any are as at be been but by can could do does for from get give have how i if in
+    is it its me my need of on or our please should so some tell than that the their them there these
+    they this to us want was we what when where which who will with would you your
+'''.split())
+
+class IndexStats:
+    """Thread-safe search counts and time for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.searches = 0
+            self.updates = 0
+            self.seconds = 0.0
+
+    def record_search(self, duration):
+        with self._lock:
+            self.searches += 1
+            self.seconds += duration
+
+    def record_update(self):
+        with self._lock:
+            self.updates += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'searches': self.searches,
+                'updates': self.updates,
+                'mean_search_ms': round(self.seconds * 1000 / self.searches, 3) if self.searches else 0.0,
+            }
+
+
+stats = IndexStats()
+
+
+def terms(text):
+    """Content words, crudely singularized"""
+    words = []
+    for word in tokenize_query(text):
+        if word in STOP_WORDS or len(word) < 2 or word.isdigit():
+            continue
+        if len(word) > 4 and word.endswith('ies'):
+            word = word[:-3] + 'y'
+        elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _bucket(term):
+    # crc32 rather than hash(): the same term must land in the same bucket in every process
+    return zlib.crc32(term.encode('utf-8')) % HASH_DIM
+
+
+def document_features(bursary):
+    """{bucket: weighted count} for a bursary's searchable text"""
+    fields = {
+        'title': bursary.title,
+        'eligibility': f'{bursary.eligible_education_levels} {bursary.eligible_fields} {bursary.country}',
+        'provider': bursary.provider_name,
+        'description': bursary.description,
+    }
+    counts = Counter()
+    for name, text in fields.items():
+        for term in terms(text or ''):
+            counts[_bucket(term)] += FIELD_WEIGHTS[name]
+    return counts
+
+
+def query_features(text):
+    return Counter(_bucket(term) for term in terms(text))
+
+
+_projection = None
+
+
+def projection():
+    """HASH_DIM x DIM matrix of random signs, the same in every process"""
+    global _projection
+    if _projection is None:
+        rng = np.random.default_rng(SEED)
+        _projection = (rng.integers(0, 2, size=(HASH_DIM, DIM), dtype=np.int8) * 2 - 1)
+    return _projection
+
+
+def embed(features, idf, unseen=0.0):
+    """
+    Unit DIM vector for {bucket: count}; zeros when nothing has weight
+    idf is 0 for buckets no indexed bursary uses. They get the weight
+    `unseen` instead: a new bursary's rare words count, while a question's
+    words that match nothing are dropped rather than projected into noise.
+    """
+    vector = np.zeros(DIM, dtype=np.float32)
+    if not features:
+        return vector
+    buckets = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+    counts = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+    weights = idf[buckets]
+    if unseen:
+        weights = np.where(weights > 0, weights, unseen)
+    weights = (1.0 + np.log(counts)) * weights
+    vector = weights @ projection()[buckets].astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _kmeans(vectors, count, rng, iterations=8, sample_size=20000):
+    """Spherical k-means centroids (count x DIM) from a sample of the rows"""
+    sample = vectors if len(vectors) <= sample_size else vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), count, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # An empty cluster keeps its previous centroid
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return centroids.astype(np.float32)
+
+
+def _assign(vectors, centroids, chunk=10000):
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        lists[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return lists
+
+
+class VectorIndex:
+    """
+    The index files in one directory
+    meta.json names the current generation; each full build or growth of
+    capacity writes a new generation of .npy files and then replaces
+    meta.json, so readers never see a half-written index. Readers reload
+    when meta.json changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._loaded_stamp = None
+        self.meta = None
+
+    def _file(self, name, generation):
+        return os.path.join(self.path, f'{name}-{generation}.npy')
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def exists(self):
+        return os.path.exists(self._meta_path)
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self._meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self, writable=False):
+        """(Re)open the files if meta.json changed; False when there is no index"""
+        for attempt in range(3):
+            stamp = self._stamp()
+            if stamp is None:
+                return False
+            if stamp == self._loaded_stamp and (not writable or self._writable):
+                return True
+            try:
+                return self._open(stamp, writable)
+            except FileNotFoundError:
+                # A rebuild in another process replaced this generation meanwhile
+                if attempt == 2:
+                    raise
+
+    def _open(self, stamp, writable):
+        with open(self._meta_path) as handle:
+            meta = json.load(handle)
+        generation, mode = meta['generation'], 'r+' if writable else 'r'
+        self.vectors = np.load(self._file('vectors', generation), mmap_mode=mode)
+        self.ids = np.load(self._file('ids', generation), mmap_mode=mode)
+        self.lists = np.load(self._file('lists', generation), mmap_mode=mode)
+        self.centroids = np.load(self._file('centroids', generation))
+        self.idf = np.load(self._file('idf', generation), mmap_mode=mode)
+        self.rows = {int(pk): row for row, pk in enumerate(self.ids[:meta['count']]) if pk >= 0}
+        self.meta, self._loaded_stamp, self._writable = meta, stamp, writable
+        return True
+
+    def _write_meta(self, meta):
+        temporary = f'{self._meta_path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump(meta, handle)
+        os.replace(temporary, self._meta_path)
+
+    def _save_generation(self, meta, vectors, ids, lists, centroids, idf):
+        """Write a new generation's files, switch meta.json to it, drop the old one"""
+        os.makedirs(self.path, exist_ok=True)
+        previous = self.meta['generation'] if self.exists() and self._load() else None
+        generation = time.time_ns()
+        for name, array in [('vectors', vectors), ('ids', ids), ('lists', lists),
+                            ('centroids', centroids), ('idf', idf)]:
+            np.save(self._file(name, generation), array)
+        self._write_meta({**meta, 'generation': generation})
+        self._loaded_stamp = None
+        self._load()
+        if previous is not None:
+            for name in ('vectors', 'ids', 'lists', 'centroids', 'idf'):
+                try:
+                    os.remove(self._file(name, previous))
+                except OSError:
+                    pass  # Already gone, or still mapped on Windows
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive between threads and processes writing this index"""
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, open(os.path.join(self.path, 'lock'), 'a') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def build(self, queryset=None, nlist=None):
+        """
+        Index every active bursary from scratch
+        Returns: number of bursaries indexed
+        """
+        if queryset is None:
+            queryset = Bursary.objects.filter(status='active')
+        ids, features = [], []
+        for bursary in queryset.order_by('pk').iterator(chunk_size=2000):
+            ids.append(bursary.pk)
+            features.append(document_features(bursary))
+
+        count = len(ids)
+        document_frequency = np.zeros(HASH_DIM, dtype=np.float32)
+        for counts in features:
+            document_frequency[list(counts)] += 1
+        idf = np.where(document_frequency > 0, np.log((1 + count) / (1 + document_frequency)) + 1, 0)
+        idf = idf.astype(np.float32)
+
+        capacity = max(64, math.ceil(count * 1.25))
+        vectors = np.zeros((capacity, DIM), dtype=np.float32)
+        for row, counts in enumerate(features):
+            vectors[row] = embed(counts, idf)
+        if nlist is None:
+            nlist = 1 if count < EXACT_SEARCH_ROWS else min(1024, int(math.sqrt(count)))
+        rng = np.random.default_rng(SEED)
+        centroids = _kmeans(vectors[:count], nlist, rng) if count >= nlist > 1 else np.zeros((1, DIM), np.float32)
+        lists = np.zeros(capacity, dtype=np.int32)
+        lists[:count] = _assign(vectors[:count], centroids)
+        id_array = np.full(capacity, -1, dtype=np.int64)
+        id_array[:count] = ids
+
+        with self._writing():
+            self._save_generation({'count': count, 'capacity': capacity, 'nlist': len(centroids),
+                                   'unseen_idf': math.log(1 + count) + 1},
+                                  vectors, id_array, lists, centroids, idf)
+        return count
+
+    def _grow(self):
+        """Copy into a generation with twice the capacity"""
+        count, capacity = self.meta['count'], self.meta['capacity'] * 2
+        vectors = np.zeros((capacity, DIM), dtype=np.float32)
+        vectors[:count] = self.vectors[:count]
+        ids = np.full(capacity, -1, dtype=np.int64)
+        ids[:count] = self.ids[:count]
+        lists = np.zeros(capacity, dtype=np.int32)
+        lists[:count] = self.lists[:count]
+        self._save_generation({**self.meta, 'capacity': capacity}, vectors, ids, lists, self.centroids, self.idf)
+        self._load(writable=True)
+
+    def update(self, bursary):
+        """Add, refresh or (when it isn't active) remove one bursary; no-op without an index"""
+        if bursary.status != 'active':
+            return self.remove(bursary.pk)
+        with self._writing():
+            if not self._load(writable=True):
+                return False
+            features = document_features(bursary)
+            unseen = self.meta['unseen_idf']
+            vector = embed(features, self.idf, unseen)
+            new = [bucket for bucket in features if not self.idf[bucket]]
+            if new:
+                self.idf[new] = unseen
+            row = self.rows.get(bursary.pk)
+            if row is None:
+                if self.meta['count'] >= self.meta['capacity']:
+                    self._grow()
+                row = self.meta['count']
+                self.meta['count'] += 1
+                self.rows[bursary.pk] = row
+            self.vectors[row] = vector
+            self.ids[row] = bursary.pk
+            self.lists[row] = int(np.argmax(self.centroids @ vector))
+            self._flush()
+        stats.record_update()
+        return True
+
+    def remove(self, bursary_id):
+        """Leave a tombstone in the bursary's row"""
+        with self._writing():
+            if not self._load(writable=True):
+                return False
+            row = self.rows.pop(bursary_id, None)
+            if row is None:
+                return False
+            self.ids[row] = -1
+            self.vectors[row] = 0
+            self._flush()
+        return True
+
+    def _flush(self):
+        for array in (self.vectors, self.ids, self.lists, self.idf):
+            array.flush()
+        # A new meta.json tells other processes to reopen
+        self._write_meta(self.meta)
+        self._loaded_stamp = self._stamp()
+
+    def search(self, text, k=5, nprobe=None, exact=False):
+        """
+        Most similar active bursaries to free text
+        Returns: [(bursary_id, cosine score)], best first
+        """
+        started = time.perf_counter()
+        with self._lock:
+            if not self._load():
+                return []
+            query = embed(query_features(text), self.idf)
+            if not query.any():
+                return []
+            count = self.meta['count']
+            ids = self.ids[:count]
+            if exact or self.meta['nlist'] <= 1:
+                # One pass over the mapped matrix; tombstones score -inf
+                rows = np.arange(count)
+                scores = np.where(ids >= 0, self.vectors[:count] @ query, -np.inf)
+            else:
+                nprobe = nprobe or getattr(settings, 'VECTOR_INDEX_NPROBE', 16)
+                probe = np.argpartition(-(self.centroids @ query), min(nprobe, len(self.centroids)) - 1)[:nprobe]
+                rows = np.flatnonzero(np.isin(self.lists[:count], probe) & (ids >= 0))
+                scores = self.vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top])]
+        stats.record_search(time.perf_counter() - started)
+        return [(int(ids[rows[index]]), float(scores[index])) for index in top if scores[index] > -np.inf]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The configured VectorIndex, or None when NumPy or VECTOR_INDEX_DIR is missing"""
+    global _index
+    path = getattr(settings, 'VECTOR_INDEX_DIR', '')
+    if np is None or not path:
+        return None
+    with _index_lock:
+        if _index is None or _index.path != str(path):
+            _index = VectorIndex(str(path))
+        return _index
+
+
+def search(text, k=5):
+    """
+    Bursary ids for a chatbot question, best first
+    Returns: [(bursary_id, score)], empty when there is no index
+    """
+    index = get_index()
+    if index is None:
+        return []
+    minimum = getattr(settings, 'VECTOR_INDEX_MIN_SCORE', 0.1)
+    return [(pk, score) for pk, score in index.search(text, k) if score >= minimum]
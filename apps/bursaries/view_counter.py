@@ -0,0 +1,252 @@
+# WRITE-BEHIND VIEW COUNTER
+# Detail page hits are buffered and written back to Bursary.views_count in
+# batches with F() expressions, instead of one read-modify-write per hit.
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from apps.bursaries.models import Bursary
+
+logger = logging.getLogger(__name__)
+
+
+def apply_view_increments(increments):
+    """
+    Add buffered views to the database, one UPDATE per distinct increment
+    Returns: number of views written
+    """
+    by_amount = defaultdict(list)
+    for bursary_id, amount in increments.items():
+        if amount > 0:
+            by_amount[amount].append(bursary_id)
+
+    for amount, bursary_ids in by_amount.items():
+        Bursary.objects.filter(id__in=bursary_ids).update(views_count=F('views_count') + amount)
+
+    return sum(amount * len(ids) for amount, ids in by_amount.items())
+
+
+class MemoryViewCounter:
+    """
+    Per-process buffer. Flushed when it grows past `max_pending` views or
+    `flush_interval` seconds have passed since the last flush, and at exit.
+    """
+
+    def __init__(self, flush_interval=10.0, max_pending=500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = Counter()
+        self._pending_total = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def increment(self, bursary_id, amount=1):
+        """
+        Record views for a bursary
+        Returns: views recorded for it that are not yet in the database
+        """
+        with self._lock:
+            self._pending[bursary_id] += amount
+            self._pending_total += amount
+            pending = self._pending[bursary_id]
+            due = (
+                self._pending_total >= self.max_pending or
+                time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+        return pending
+
+    def pending(self, bursary_id):
+        with self._lock:
+            return self._pending.get(bursary_id, 0)
+
+    def flush(self):
+        """Write all buffered views; returns the number written"""
+        # Only one thread writes at a time, others keep buffering
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                increments, self._pending = self._pending, Counter()
+                self._pending_total = 0
+                self._last_flush = time.monotonic()
+            if not increments:
+                return 0
+            try:
+                return apply_view_increments(increments)
+            except Exception:
+                # Put the views back so the next flush retries them
+                with self._lock:
+                    self._pending.update(increments)
+                    self._pending_total += sum(increments.values())
+                raise
+        finally:
+            self._flush_lock.release()
+
+
+class CacheViewCounter:
+    """
+    Buffer shared by every process through the cache backend (use a shared
+    cache such as Redis). Nothing is written by the web processes; run the
+    flush_view_counts command periodically to apply the buffered views.
+
+    The first view of a bursary since the last flush marks it and records
+    its id in a numbered slot, so a flush reads only the bursaries that were
+    viewed. A mark whose slot was lost (evicted, or written while a flush was
+    reading) expires after `mark_timeout` and the bursary is recorded again;
+    its views wait in the buffer until then. flush_all() reads every bursary.
+    """
+    key_prefix = 'bursary_views'
+    # Slots are read within a flush interval; the timeout only clears strays
+    slot_timeout = 24 * 3600
+
+    def __init__(self, timeout=None, mark_timeout=600, **kwargs):
+        # No expiry by default: expired keys would be lost views
+        self.timeout = timeout
+        self.mark_timeout = mark_timeout
+
+    def _key(self, bursary_id):
+        return f'{self.key_prefix}:{bursary_id}'
+
+    def _mark_key(self, bursary_id):
+        return f'{self.key_prefix}:marked:{bursary_id}'
+
+    def _slot_key(self, number):
+        return f'{self.key_prefix}:slot:{number}'
+
+    @property
+    def _sequence_key(self):
+        return f'{self.key_prefix}:sequence'
+
+    @property
+    def _flushed_key(self):
+        return f'{self.key_prefix}:flushed'
+
+    def increment(self, bursary_id, amount=1):
+        key = self._key(bursary_id)
+        # add() is a no-op when the key exists, so concurrent first hits are safe
+        cache.add(key, 0, timeout=self.timeout)
+        try:
+            pending = cache.incr(key, amount)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(key, amount, timeout=self.timeout)
+            pending = amount
+        # After the increment, so a flush that clears the mark sees the view
+        if cache.add(self._mark_key(bursary_id), 1, timeout=self.mark_timeout):
+            cache.set(self._slot_key(self._next_slot()), bursary_id, timeout=self.slot_timeout)
+        return pending
+
+    def _next_slot(self):
+        cache.add(self._sequence_key, 0, timeout=None)
+        try:
+            return cache.incr(self._sequence_key)
+        except ValueError:
+            # Evicted; flush() notices the sequence went back
+            cache.add(self._sequence_key, 0, timeout=None)
+            return cache.incr(self._sequence_key)
+
+    def pending(self, bursary_id):
+        return cache.get(self._key(bursary_id), 0)
+
+    def flush(self, chunk_size=1000):
+        """Apply buffered views for the bursaries viewed since the last flush; returns the number written"""
+        flushed = cache.get(self._flushed_key, 0)
+        sequence = cache.get(self._sequence_key, 0)
+        if sequence < flushed:
+            flushed = 0  # The sequence was evicted and started over
+        if sequence == flushed:
+            return 0
+        slot_keys = [self._slot_key(number) for number in range(flushed + 1, sequence + 1)]
+        bursary_ids = set()
+        for start in range(0, len(slot_keys), chunk_size):
+            bursary_ids.update(cache.get_many(slot_keys[start:start + chunk_size]).values())
+        cache.set(self._flushed_key, sequence, timeout=None)
+        cache.delete_many(slot_keys)
+        # Views from here on mark their bursary again for the next flush
+        cache.delete_many([self._mark_key(bursary_id) for bursary_id in bursary_ids])
+
+        bursary_ids = sorted(bursary_ids)
+        return sum(
+            self._flush_chunk(bursary_ids[start:start + chunk_size])
+            for start in range(0, len(bursary_ids), chunk_size)
+        )
+
+    def flush_all(self, chunk_size=1000):
+        """Apply buffered views for every bursary, marked or not; returns the number written"""
+        written = 0
+        bursary_ids = Bursary.objects.order_by('id').values_list('id', flat=True)
+        chunk = []
+        for bursary_id in bursary_ids.iterator(chunk_size=chunk_size):
+            chunk.append(bursary_id)
+            if len(chunk) >= chunk_size:
+                written += self._flush_chunk(chunk)
+                chunk = []
+        if chunk:
+            written += self._flush_chunk(chunk)
+        return written
+
+    def _flush_chunk(self, bursary_ids):
+        keys = {self._key(bursary_id): bursary_id for bursary_id in bursary_ids}
+        found = cache.get_many(list(keys))
+        increments = {keys[key]: value for key, value in found.items() if value}
+        if not increments:
+            return 0
+        written = apply_view_increments(increments)
+        # Subtract what was written rather than deleting, keeping hits that
+        # arrived in the meantime
+        for bursary_id, amount in increments.items():
+            try:
+                cache.decr(self._key(bursary_id), amount)
+            except ValueError:
+                pass  # Evicted after the read; nothing left to subtract from
+        return written
+
+
+VIEW_COUNTER_BACKENDS = {
+    'memory': MemoryViewCounter,
+    'cache': CacheViewCounter,
+}
+
+_view_counter = None
+_view_counter_lock = threading.Lock()
+
+
+def get_view_counter():
+    """Return the process-wide view counter configured in settings"""
+    global _view_counter
+    if _view_counter is None:
+        with _view_counter_lock:
+            if _view_counter is None:
+                backend = VIEW_COUNTER_BACKENDS[getattr(settings, 'VIEW_COUNTER_BACKEND', 'memory')]
+                _view_counter = backend(
+                    flush_interval=getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 10.0),
+                    max_pending=getattr(settings, 'VIEW_COUNTER_MAX_PENDING', 500),
+                )
+    return _view_counter
+
+
+def record_view(bursary):
+    """
+    Count one view of a bursary, updating the instance for display
+    The increment reaches the database on the next flush.
+    """
+    pending = get_view_counter().increment(bursary.pk)
+    bursary.views_count += pending
+    return bursary.views_count
+
+
+@atexit.register
+def flush_on_exit():
+    """Don't lose buffered views when a worker shuts down cleanly"""
+    if isinstance(_view_counter, MemoryViewCounter):
+        try:
+            _view_counter.flush()
+        except Exception:
+            logger.exception('Could not flush buffered bursary views at exit')
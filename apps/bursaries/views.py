@@ -1,11 +1,21 @@
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.db.models import Q
 from django.contrib import messages
 from apps.bursaries.models import Bursary, Bookmark
+from apps.bursaries import recommendation_cache
+from apps.bursaries.pagination import KeysetPaginator
 from apps.bursaries.recommendations import BursaryRecommendationEngine
+from apps.bursaries.facets import apply_filters, get_facets, parse_filters
+from apps.bursaries.fragment_cache import fragment_context
+from apps.bursaries.search import search_bursaries
+from apps.bursaries.sorting import SORT_OPTIONS, resolve_sort
+from apps.bursaries.view_counter import record_view
+from apps.dashboard.activity import record_activity
 
 def home_view(request):
     """Homepage with search and trending bursaries"""
@@ -16,77 +26,115 @@ def home_view(request):
     # Get recommendations for logged-in users
     recommendations = []
     if request.user.is_authenticated:
-        engine = BursaryRecommendationEngine(request.user)
-        recommendations = engine.get_recommendations(limit=6)
+        recommendations = recommendation_cache.get_recommendations(request.user, limit=recommendation_cache.HOME_LIMIT)
     
     context = {
         'trending_bursaries': trending_bursaries,
         'recommendations': recommendations,
+        'fragments': fragment_context(),
     }
     return render(request, 'pages/home.html', context)
 
-def bursary_list_view(request):
-    """Bursary listing with filters and search"""
+LIST_PAGE_SIZE = 12
+
+def _filtered_bursaries(request):
+    """
+    Active bursaries matching the list filters in request.GET
+    Returns: (queryset, keyset ordering, search query, parsed filters, sort key)
+    """
     bursaries = Bursary.objects.filter(status='active')
     
     # Search
     query = request.GET.get('q')
     if query:
-        bursaries = bursaries.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(provider_name__icontains=query)
-        )
-    
-    # Filters
-    category = request.GET.get('category')
-    if category:
-        bursaries = bursaries.filter(category=category)
-    
-    country = request.GET.get('country')
-    if country:
-        bursaries = bursaries.filter(country=country)
-    
-    education_level = request.GET.get('education_level')
-    if education_level:
-        bursaries = bursaries.filter(eligible_education_levels__icontains=education_level)
-    
-    # Sorting
-    sort = request.GET.get('sort', '-created_at')
-    bursaries = bursaries.order_by(sort)
-    
-    # Pagination
-    paginator = Paginator(bursaries, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        bursaries = search_bursaries(bursaries, query)
+    
+    # Filters (category, country, education level, amount bucket)
+    filters = parse_filters(request.GET)
+    bursaries = apply_filters(bursaries, filters)
+    
+    # Sorting: whitelisted options only (search results default to relevance)
+    sort, ordering = resolve_sort(request.GET.get('sort'), query)
+    
+    return bursaries, ordering, query, filters, sort
+
+def _list_page(request, bursaries, ordering):
+    """Keyset page for the `cursor` parameter (no COUNT, no OFFSET)"""
+    paginator = KeysetPaginator(bursaries, ordering, LIST_PAGE_SIZE)
+    return paginator.get_page(request.GET.get('cursor'))
+
+def bursary_list_view(request):
+    """Bursary listing with filters and search"""
+    bursaries, ordering, query, filters, sort = _filtered_bursaries(request)
+    page_obj = _list_page(request, bursaries, ordering)
+    
+    # Current filters, for building page links
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    params.pop('page', None)
     
     context = {
         'page_obj': page_obj,
         'query': query,
-        'selected_category': category,
+        'selected_category': filters.get('category'),
+        'filter_params': params.urlencode(),
+        'sort_options': SORT_OPTIONS,
+        'selected_sort': sort,
+        'facets': get_facets(query, filters),
+        'selected_filters': filters,
     }
     return render(request, 'bursaries/list.html', context)
 
+def bursary_list_api(request):
+    """
+    JSON variant of bursary_list_view for infinite scroll
+    Takes the same filters; `html` holds the rendered cards.
+    """
+    bursaries, ordering, query, filters, sort = _filtered_bursaries(request)
+    page = _list_page(request, bursaries, ordering)
+    
+    results = [
+        {
+            'id': bursary.id,
+            'title': bursary.title,
+            'url': reverse('bursaries:detail', args=[bursary.slug]),
+            'provider_name': bursary.provider_name,
+            'category': bursary.category,
+            'amount': str(bursary.amount),
+            'currency': bursary.currency,
+            'application_deadline': bursary.application_deadline.isoformat(),
+        }
+        for bursary in page
+    ]
+    html = render_to_string('bursaries/includes/bursary_cards.html', {'bursaries': page}, request=request)
+    
+    return JsonResponse({
+        'results': results,
+        'html': html,
+        'next_cursor': page.next_cursor,
+    })
+
 def bursary_detail_view(request, slug):
     """Detailed bursary view"""
     bursary = get_object_or_404(Bursary, slug=slug)
     
-    # Increment view count
-    bursary.views_count += 1
-    bursary.save(update_fields=['views_count'])
+    # Increment view count (buffered, written back in batches)
+    record_view(bursary)
+    record_activity(request.user, 'view_bursary', bursary.title)
     
     # Check if bookmarked
     is_bookmarked = False
     if request.user.is_authenticated:
         is_bookmarked = Bookmark.objects.filter(user=request.user, bursary=bursary).exists()
     
-    # Get similar bursaries
+    # Similar bursaries (lazy; only queried when the cached fragment is stale)
     similar = BursaryRecommendationEngine.get_similar_bursaries(bursary, limit=4)
     
     context = {
         'bursary': bursary,
         'is_bookmarked': is_bookmarked,
         'similar_bursaries': similar,
+        'fragments': fragment_context(),
     }
     return render(request, 'bursaries/detail.html', context)
 
@@ -100,6 +148,7 @@ def toggle_bookmark(request, slug):
         bookmark.delete()
         messages.success(request, 'Bookmark removed.')
     else:
+        record_activity(request.user, 'bookmark', bursary.title)
         messages.success(request, 'Bursary bookmarked!')
     
     return redirect('bursaries:detail', slug=slug)
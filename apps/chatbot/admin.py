@@ -7,11 +7,7 @@ class ChatConversationAdmin(admin.ModelAdmin):
     list_display = ['user', 'session_id', 'message_count', 'started_at', 'last_message_at']
     list_filter = ['started_at', 'last_message_at']
     search_fields = ['user__username', 'session_id']
-    readonly_fields = ['started_at', 'last_message_at']
-    
-    def message_count(self, obj):
-        return obj.messages.count()
-    message_count.short_description = 'Messages'
+    readonly_fields = ['started_at', 'last_message_at', 'message_count']
 
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
@@ -1,17 +1,33 @@
 # AI INTEGRATION SERVICE
 # This module handles interactions with AI services for the chatbot functionality.
 import json
+import logging
 import uuid
+from urllib.parse import urlencode
 from django.conf import settings
+from apps.bursaries import vector_index
 from apps.bursaries.models import Bursary
+from apps.bursaries.search import search_bursaries
 from apps.accounts.models import StudentProfile
+from apps.chatbot import coalescing, context, response_cache, upstream
 import requests
 
+logger = logging.getLogger(__name__)
+
+
+class ChatbotUnavailable(Exception):
+    """No reply could be had from the AI service; str() is safe to show the user"""
+
+
 class ChatbotAIService:
     """
     Service to handle AI chatbot interactions
     Supports Google Generative AI (Gemini) - Free tier
     """
+    GEMINI_MODEL = 'gemini-2.5-flash'
+    NOT_CONFIGURED_MESSAGE = "Chat service is not configured. Please set GOOGLE_API_KEY in settings or environment."
+    UPSTREAM_ERROR_MESSAGE = "Sorry, I encountered an error contacting Google API. Please try again in a moment."
+    BAD_REPLY_MESSAGE = "Sorry, I couldn't get an answer to that. Please try rephrasing your question."
     
     def __init__(self, user=None):
         self.user = user
@@ -54,22 +70,29 @@ class ChatbotAIService:
             """
             base_prompt += user_context
         
-        return base_prompt
+        # The indentation above would otherwise be sent (and billed) every turn
+        return '\n'.join(line.strip() for line in base_prompt.strip().splitlines())
     
     def get_relevant_bursaries(self, query):
         """
         Search for relevant bursaries based on user query
         Returns: List of bursary objects
         """
-        from django.db.models import Q
+        # Nearest neighbours in the vector index, when one has been built.
+        # Extra candidates cover rows the index still has for bursaries that
+        # closed since.
+        ranked = [pk for pk, score in vector_index.search(query, k=15)]
+        if ranked:
+            found = Bursary.objects.filter(status='active').in_bulk(ranked)
+            bursaries = [found[pk] for pk in ranked if pk in found][:5]
+            if bursaries:
+                return bursaries
         
-        # Simple keyword search
-        bursaries = Bursary.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__icontains=query) |
-            Q(provider_name__icontains=query),
-            status='active'
+        # Full-text search; any matching word counts, best matches first
+        bursaries = search_bursaries(
+            Bursary.objects.filter(status='active'),
+            query,
+            match_any=True
         )[:5]
         
         return bursaries
@@ -93,23 +116,24 @@ class ChatbotAIService:
             """
         return info
     
-    def call_google_api(self, messages, conversation_history=None):
+    def get_api_url(self, method, api_key, **params):
+        """Gemini endpoint URL for `method` (generateContent, streamGenerateContent)"""
+        base_url = getattr(settings, 'GOOGLE_API_BASE_URL', 'https://generativelanguage.googleapis.com/v1')
+        query = urlencode({'key': api_key, **params})
+        return f"{base_url}/models/{self.GEMINI_MODEL}:{method}?{query}"
+    
+    def build_payload(self, messages, conversation_history=None, summary=''):
         """
-        Call Google Generative AI (Gemini) API - Free tier available
-        Documentation: https://ai.google.dev
-        Uses gemini-2.5-flash (latest stable free model)
+        Gemini request body: system prompt, history, then the new message
+        `summary` (from apps.chatbot.context) covers turns older than the
+        history and is sent with the system prompt.
         """
-        api_key = self.api_key or getattr(settings, 'GOOGLE_API_KEY', '')
-
-        if not api_key:
-            return "Chat service is not configured. Please set GOOGLE_API_KEY in settings or environment."
-
-        # Use v1 endpoint with gemini-2.5-flash model
-        url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key={api_key}"
-
+        system_prompt = self.generate_system_prompt()
+        if summary:
+            system_prompt += f"\n\nSummary of the earlier conversation:\n{summary}"
         # Build message list
         api_messages = [
-            {"role": "user", "parts": [{"text": self.generate_system_prompt()}]},
+            {"role": "user", "parts": [{"text": system_prompt}]},
         ]
 
         # Add conversation history
@@ -127,7 +151,7 @@ class ChatbotAIService:
             "parts": [{"text": messages}]
         })
 
-        payload = {
+        return {
             "contents": api_messages,
             "generationConfig": {
                 "maxOutputTokens": 1000,
@@ -136,50 +160,139 @@ class ChatbotAIService:
                 "topK": 10
             }
         }
+    
+    def request_google_api(self, messages, conversation_history=None, summary=''):
+        """
+        Call Google Generative AI (Gemini) API - Free tier available
+        Documentation: https://ai.google.dev
+        Uses gemini-2.5-flash (latest stable free model)
+        Raises requests exceptions, upstream.UpstreamError, or ValueError for
+        an unexpected reply.
+        """
+        # Use v1 endpoint with gemini-2.5-flash model
+        url = self.get_api_url('generateContent', self.api_key or getattr(settings, 'GOOGLE_API_KEY', ''))
+        payload = self.build_payload(messages, conversation_history, summary)
 
-        headers = {
-            "Content-Type": "application/json",
-        }
-
-        try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=30)
-            resp.raise_for_status()
-            data = resp.json()
+        # Pooled session, with retries and the circuit breaker
+        resp = upstream.post(url, context.encode_payload(payload))
+        data = resp.json()
 
-            # Extract response from Google Generative AI format
-            if "candidates" in data and len(data["candidates"]) > 0:
-                candidate = data["candidates"][0]
-                if "content" in candidate and "parts" in candidate["content"]:
-                    if len(candidate["content"]["parts"]) > 0:
-                        return candidate["content"]["parts"][0]["text"]
+        # Extract response from Google Generative AI format
+        if "candidates" in data and len(data["candidates"]) > 0:
+            candidate = data["candidates"][0]
+            if "content" in candidate and "parts" in candidate["content"]:
+                if len(candidate["content"]["parts"]) > 0:
+                    return candidate["content"]["parts"][0]["text"]
 
-            # Fallback: return error message with details
-            return f"Unexpected response format: {json.dumps(data)}"
+        raise ValueError(f"Unexpected response format: {json.dumps(data)}")
+    
+    def call_google_api(self, messages, conversation_history=None, generate=None, summary=''):
+        """
+        request_google_api() with failures turned into ChatbotUnavailable
+        `generate` replaces the plain request (used to go through the cache).
+        Error details go to the log only: request URLs carry the API key.
+        """
+        if not (self.api_key or getattr(settings, 'GOOGLE_API_KEY', '')):
+            return self.NOT_CONFIGURED_MESSAGE
 
+        try:
+            if generate is not None:
+                return generate()
+            return self.request_google_api(messages, conversation_history, summary)
+        except upstream.UpstreamError as e:
+            raise ChatbotUnavailable(str(e)) from e
         except requests.exceptions.RequestException as e:
-            return f"Sorry, I encountered an error contacting Google API: {str(e)}"
-        except Exception as e:
-            return f"Sorry, an unexpected error occurred: {str(e)}"
+            logger.warning('Gemini request failed: %s', type(e).__name__)
+            raise ChatbotUnavailable(self.UPSTREAM_ERROR_MESSAGE) from e
+        except ValueError as e:
+            logger.warning('Unexpected Gemini reply: %s', e)
+            raise ChatbotUnavailable(self.BAD_REPLY_MESSAGE) from e
     
-    def get_response(self, user_message, conversation_history=None):
+    def get_response(self, user_message, conversation_history=None, summary=''):
         """
         Main method to get AI response
         Automatically searches for relevant bursaries if needed
+        First messages of a conversation go through the response cache, and
+        identical ones in flight at the same time share one upstream call;
+        later ones depend on the history and are always sent upstream.
+        """
+        bursaries = self.get_context_bursaries(user_message)
+        enhanced_message = self.build_message(user_message, bursaries)
+        bursary_ids = None if bursaries is None else [bursary.pk for bursary in bursaries]
+        
+        def request():
+            return self.request_google_api(enhanced_message, conversation_history, summary)
+        
+        def cached():
+            # Cache misses are coalesced inside get_or_generate()
+            return response_cache.get_or_generate(
+                user_message, bursary_ids, self.generate_system_prompt(), request
+            )
+        
+        def coalesced():
+            key = response_cache.request_key(user_message, bursary_ids, self.generate_system_prompt())
+            return coalescing.coalesce(key, request)
+        
+        generate = None
+        first_turn = not summary and not any(msg.sender == 'bot' for msg in conversation_history or [])
+        if first_turn:
+            generate = cached if getattr(settings, 'CHATBOT_RESPONSE_CACHE', True) else coalesced
+        
+        # Call Google Gemini API
+        return self.call_google_api(
+            enhanced_message, conversation_history, generate=generate, summary=summary
+        )
+    
+    def get_context_bursaries(self, user_message):
+        """
+        Bursaries to add as [Database Context]
+        Returns: list of bursaries, or None when the message isn't about funding
         """
         # Check if message is asking about bursaries
         bursary_keywords = ['bursary', 'scholarship', 'grant', 'funding', 'financial aid']
-        needs_bursary_search = any(keyword in user_message.lower() for keyword in bursary_keywords)
+        if not any(keyword in user_message.lower() for keyword in bursary_keywords):
+            return None
         
-        enhanced_message = user_message
+        # Search for relevant bursaries
+        return list(self.get_relevant_bursaries(user_message))
+    
+    def build_message(self, user_message, bursaries=None):
+        """Add [Database Context] with matching bursaries when the question needs it"""
+        if bursaries is None:
+            bursaries = self.get_context_bursaries(user_message)
+        if bursaries is None:
+            return user_message
         
-        if needs_bursary_search:
-            # Search for relevant bursaries
-            bursaries = self.get_relevant_bursaries(user_message)
-            bursary_context = self.format_bursary_info(bursaries)
-            
-            # Add bursary context to message
-            enhanced_message = f"{user_message}\n\n[Database Context]\n{bursary_context}"
+        # Add bursary context to message
+        bursary_context = self.format_bursary_info(bursaries)
+        return f"{user_message}\n\n[Database Context]\n{bursary_context}"
+    
+    async def stream_google_api(self, payload):
+        """
+        Stream a Gemini reply as it is generated (streamGenerateContent, SSE)
+        `payload` comes from build_payload(), which queries the database and
+        so must run before entering async code.
+        Yields: text fragments
+        Raises ChatbotUnavailable when the upstream fails.
+        """
+        api_key = self.api_key or getattr(settings, 'GOOGLE_API_KEY', '')
+        if not api_key:
+            yield self.NOT_CONFIGURED_MESSAGE
+            return
         
-        # Call Google Gemini API
-        return self.call_google_api(enhanced_message, conversation_history) 
+        url = self.get_api_url('streamGenerateContent', api_key, alt='sse')
+        try:
+            async for line in upstream.stream_lines(url, context.encode_payload(payload)):
+                if not line.startswith('data:'):
+                    continue
+                data = json.loads(line[len('data:'):])
+                for candidate in data.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+        except upstream.UpstreamError as e:
+            raise ChatbotUnavailable(str(e)) from e
+        except (*upstream.ASYNC_HTTP_ERRORS, ValueError) as e:
+            logger.warning('Gemini stream failed: %s', type(e).__name__)
+            raise ChatbotUnavailable(self.UPSTREAM_ERROR_MESSAGE) from e
 
@@ -0,0 +1,168 @@
+# REQUEST COALESCING
+# Identical first questions that arrive together (same normalized message,
+# context bursaries and profile, i.e. the same response cache key) share one
+# upstream call: the first caller makes it and the others wait for its
+# result, or its error. Within a process this uses an Event per key. With
+# CHATBOT_COALESCE_CROSS_PROCESS the leader also holds a lock in the chatbot
+# cache (cache.add), and callers in other processes poll for the result it
+# publishes there; this needs a cache shared between processes, e.g. Redis.
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+
+LOCK_PREFIX = 'chat:sf:lock'
+RESULT_PREFIX = 'chat:sf:result'
+
+# Seconds between checks for another process's result
+POLL_INTERVAL = 0.05
+
+
+class CoalescingStats:
+    """
+    Thread-safe counts for this process: leaders made the upstream call,
+    followers shared one made by a caller in this or another process
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.leaders = 0
+            self.followers = 0
+            self.remote_followers = 0
+            self.timeouts = 0
+
+    def record(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            shared = self.followers + self.remote_followers
+            requests = self.leaders + shared
+            return {
+                'leaders': self.leaders,
+                'followers': self.followers,
+                'remote_followers': self.remote_followers,
+                'timeouts': self.timeouts,
+                'shared_ratio': round(shared / requests, 4) if requests else 0.0,
+            }
+
+
+stats = CoalescingStats()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """At most one call per key in flight in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout):
+        """
+        fn() once for everyone asking for `key` while it runs
+        A follower that waits longer than `timeout` calls fn() itself.
+        Returns: (result, shared)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(timeout):
+                stats.record('followers')
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            stats.record('timeouts')
+            return fn(), False
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+_flights = SingleFlight()
+
+
+def _cache():
+    return caches[getattr(settings, 'CHATBOT_CACHE_ALIAS', 'default')]
+
+
+def _across_processes(key, fn, timeout):
+    """
+    fn() under a cache lock, or another process's result for the same key
+    Errors are not shared between processes: a waiter whose leader failed
+    tries to become the leader itself.
+    """
+    cache = _cache()
+    lock_key, result_key = f'{LOCK_PREFIX}:{key}', f'{RESULT_PREFIX}:{key}'
+    deadline = time.monotonic() + timeout
+    token = uuid.uuid4().hex
+    while True:
+        if cache.add(lock_key, token, timeout):
+            stats.record('leaders')
+            try:
+                result = fn()
+                cache.set(result_key, result, timeout)
+                return result
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+        while cache.get(lock_key) is not None and time.monotonic() < deadline:
+            result = cache.get(result_key)
+            if result is not None:
+                stats.record('remote_followers')
+                return result
+            time.sleep(POLL_INTERVAL)
+        result = cache.get(result_key)
+        if result is not None:
+            stats.record('remote_followers')
+            return result
+        if time.monotonic() >= deadline:
+            stats.record('timeouts')
+            stats.record('leaders')
+            return fn()
+
+
+def coalesce(key, fn):
+    """
+    fn() shared with identical concurrent requests
+    `key` must identify everything the result depends on. The result
+    published across processes lives for CHATBOT_COALESCE_TIMEOUT seconds,
+    long enough for waiters to pick it up.
+    Returns: fn()'s result
+    """
+    if not getattr(settings, 'CHATBOT_COALESCE', True):
+        return fn()
+    timeout = getattr(settings, 'CHATBOT_COALESCE_TIMEOUT', 60)
+
+    def lead():
+        if getattr(settings, 'CHATBOT_COALESCE_CROSS_PROCESS', False):
+            return _across_processes(key, fn, timeout)
+        stats.record('leaders')
+        return fn()
+
+    result, _ = _flights.do(key, lead, timeout)
+    return result
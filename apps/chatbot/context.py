@@ -0,0 +1,147 @@
+# CONVERSATION CONTEXT BUDGET
+# Each Gemini request carries the system prompt, a rolling window of recent
+# messages and a summary of everything older, instead of the last N messages
+# in full. The window is filled newest first until CHATBOT_CONTEXT_TOKENS
+# (an estimate, about four characters per token) is spent. Messages that
+# fall out of it are folded into ChatConversation.summary once, as short
+# extractive lines, and summary_through records how far the summary reaches,
+# so each turn only reads and compacts the messages since the last one.
+import json
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+from django.conf import settings
+from apps.chatbot.models import ChatConversation
+
+# Rough characters per token for English text; Gemini's tokenizer averages ~4
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+_SPEAKERS = {'user': 'Student', 'bot': 'Assistant'}
+
+
+def estimate_tokens(text):
+    """Approximate token count, without a tokenizer"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+class ContextStats:
+    """Thread-safe totals for upstream request payloads in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.max_bytes = 0
+            self.estimated_tokens = 0
+            self.summarized_messages = 0
+
+    def record_request(self, payload_bytes, tokens):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += payload_bytes
+            self.max_bytes = max(self.max_bytes, payload_bytes)
+            self.estimated_tokens += tokens
+
+    def record_summarized(self, count):
+        with self._lock:
+            self.summarized_messages += count
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'bytes_sent': self.bytes_sent,
+                'bytes_per_request': round(self.bytes_sent / self.requests, 1) if self.requests else 0.0,
+                'max_bytes': self.max_bytes,
+                'estimated_tokens': self.estimated_tokens,
+                'summarized_messages': self.summarized_messages,
+            }
+
+
+stats = ContextStats()
+
+
+def encode_payload(payload):
+    """
+    Request body bytes for a Gemini payload, counted in the stats
+    Serialized once here so the count is exactly what goes on the wire.
+    """
+    body = json.dumps(payload).encode('utf-8')
+    stats.record_request(len(body), math.ceil(len(body) / CHARS_PER_TOKEN))
+    return body
+
+
+@dataclass
+class Window:
+    """What to send for a conversation: older turns summarized, recent ones in full"""
+    summary: str = ''
+    messages: list = field(default_factory=list)
+
+
+def summarize_message(message, max_chars=160):
+    """One summary line: the speaker and the first sentence, shortened"""
+    text = ' '.join(message.message.split())
+    text = _SENTENCE_END.split(text, 1)[0]
+    if len(text) > max_chars:
+        text = text[:max_chars - 3].rstrip() + '...'
+    return f"{_SPEAKERS.get(message.sender, message.sender)}: {text}"
+
+
+def extend_summary(summary, messages, budget):
+    """
+    summary with a line per message appended, trimmed to `budget` tokens
+    The oldest lines are dropped first.
+    """
+    lines = [line for line in summary.split('\n') if line]
+    lines.extend(summarize_message(message) for message in messages)
+    while lines and estimate_tokens('\n'.join(lines)) > budget:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+
+def build_window(conversation, exclude=None, budget=None):
+    """
+    Rolling window for the next request, compacting whatever falls out of it
+    `exclude` is the message being answered, which is sent separately;
+    messages after it (sent while it waited for a worker) are left out too.
+    Reads the messages after summary_through; saves the conversation's
+    summary when any of them are folded in.
+    Returns: Window
+    """
+    if budget is None:
+        budget = getattr(settings, 'CHATBOT_CONTEXT_TOKENS', 1500)
+    summary_budget = getattr(settings, 'CHATBOT_SUMMARY_TOKENS', 300)
+
+    pending = conversation.messages.order_by('-id')
+    if conversation.summary_through:
+        pending = pending.filter(id__gt=conversation.summary_through)
+    if exclude is not None:
+        pending = pending.filter(id__lt=exclude.pk)
+
+    window, spent = [], estimate_tokens(conversation.summary)
+    pending = list(pending)
+    for index, message in enumerate(pending):
+        cost = estimate_tokens(message.message)
+        if spent + cost > budget:
+            evicted = pending[index:][::-1]
+            break
+        window.append(message)
+        spent += cost
+    else:
+        evicted = []
+
+    if evicted:
+        conversation.summary = extend_summary(conversation.summary, evicted, summary_budget)
+        conversation.summary_through = evicted[-1].pk
+        # update() rather than save(): leaves last_message_at to the counters
+        ChatConversation.objects.filter(pk=conversation.pk).update(
+            summary=conversation.summary, summary_through=conversation.summary_through,
+        )
+        stats.record_summarized(len(evicted))
+    return Window(summary=conversation.summary, messages=window[::-1])
@@ -0,0 +1,106 @@
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from apps.chatbot import coalescing, upstream
+from apps.chatbot.ai_service import ChatbotAIService
+
+QUESTIONS = [
+    'When is the deadline?', 'What documents do I need?', 'How do I write a cover letter?',
+    'Can I apply to more than one?', 'How are applicants selected?',
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers generateContent after `latency` seconds, counting requests"""
+    latency = 1.0
+    count = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.lock:
+            type(self).count += 1
+        time.sleep(self.latency)
+        body = json.dumps({'candidates': [{'content': {'parts': [{'text': 'Stub reply'}]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    # Room for a whole burst of connections
+    request_queue_size = 256
+
+
+class Command(BaseCommand):
+    help = (
+        'Send bursts of identical first questions from concurrent threads to a '
+        'local Gemini stub, with request coalescing off and on, and compare '
+        'upstream calls and reply latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--distinct', type=int, default=2, help='Different questions in the burst')
+        parser.add_argument('--latency', type=float, default=1.0, help='Stub reply time in seconds')
+
+    def handle(self, *args, **options):
+        StubHandler.latency = options['latency']
+        server = StubServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_address[1]}/v1'
+        try:
+            self.stdout.write(f"{'mode':>10} {'upstream':>9} {'p50 ms':>9} {'p95 ms':>9}")
+            for mode, enabled in [('off', False), ('on', True)]:
+                with override_settings(
+                    GOOGLE_API_KEY='benchmark', GOOGLE_API_BASE_URL=base_url, CHATBOT_COALESCE=enabled,
+                    CHATBOT_MAX_CONCURRENCY=options['threads'],
+                ):
+                    self.report(mode, options)
+        finally:
+            server.shutdown()
+            server.server_close()
+            upstream.reset()
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def report(self, mode, options):
+        caches['chatbot'].clear()
+        upstream.reset()
+        coalescing.stats.reset()
+        StubHandler.count = 0
+        questions = QUESTIONS[:max(1, min(options['distinct'], len(QUESTIONS)))]
+        start = threading.Barrier(options['threads'])
+        timings = []
+        lock = threading.Lock()
+
+        def ask(index):
+            # No user: the questions need no database access
+            service = ChatbotAIService()
+            start.wait()
+            started = time.perf_counter()
+            service.get_response(questions[index % len(questions)])
+            with lock:
+                timings.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        timings.sort()
+        self.stdout.write(
+            f'{mode:>10} {StubHandler.count:>9} {statistics.median(timings) * 1000:>9.1f} '
+            f'{timings[max(0, int(len(timings) * 0.95) - 1)] * 1000:>9.1f}'
+        )
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_message_count(apps, schema_editor):
+    ChatConversation = apps.get_model('chatbot', 'ChatConversation')
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    counts = ChatMessage.objects.filter(conversation=OuterRef('pk')).order_by().values('conversation').annotate(
+        total=Count('pk')
+    ).values('total')
+    ChatConversation.objects.update(message_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatconversation',
+            name='message_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_message_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_conversation_message_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatconversation',
+            name='summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='chatconversation',
+            name='summary_through',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
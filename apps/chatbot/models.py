@@ -9,6 +9,10 @@ class ChatConversation(models.Model):
     session_id = models.CharField(max_length=100, unique=True, default=uuid.uuid4)
     started_at = models.DateTimeField(auto_now_add=True)
     last_message_at = models.DateTimeField(auto_now=True)
+    message_count = models.IntegerField(default=0)  # Maintained by apps.bursaries.counters
+    # Older turns compacted by apps.chatbot.context, through message id summary_through
+    summary = models.TextField(blank=True, default='')
+    summary_through = models.BigIntegerField(null=True, blank=True)
     
     class Meta:
         verbose_name = 'Chat Conversation'
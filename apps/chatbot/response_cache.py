@@ -0,0 +1,224 @@
+# CHATBOT RESPONSE CACHE
+# Reuses Gemini replies for repeated questions. Entries are keyed on the
+# normalized message, the bursaries injected as [Database Context] and a
+# fingerprint of the system prompt (which carries the student's profile).
+# Each referenced bursary has a version key that signals bump on change, so
+# its entries stop matching without having to find and delete them. Replies
+# built from a search also carry a catalog version, bumped when bursaries are
+# added, removed or change status in bulk; other edits to a bursary that was
+# not in the context are picked up when the entry expires.
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from apps.chatbot import coalescing
+from apps.dashboard.profiling import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'chat'
+CATALOG_VERSION_KEY = f'{KEY_PREFIX}:v:catalog'
+
+# Near-duplicate candidates remembered per context bucket
+MAX_SIMILAR_CANDIDATES = 50
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Words a rewording may add, drop or swap without changing the question
+STOP_WORDS = frozenset('''
+    a about all an and any are can could do does for get how i in is it me
+    my of on please tell the there to what when where which who will with
+    would you
+'''.split())
+
+
+class ResponseCacheStats:
+    """Thread-safe hit/miss counters and time saved for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.similar_hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self.latency_saved = 0.0
+
+    def record(self, name, latency_saved=0.0):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+            self.latency_saved += latency_saved
+
+    def as_dict(self):
+        with self._lock:
+            hits = self.hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+                'latency_saved_seconds': round(self.latency_saved, 3),
+            }
+
+
+stats = ResponseCacheStats()
+
+
+def _cache():
+    return caches[getattr(settings, 'CHATBOT_CACHE_ALIAS', 'default')]
+
+
+def normalize_message(message):
+    """Lowercase words only: 'What engineering scholarships are open?' -> 'what engineering scholarships are open'"""
+    return ' '.join(_WORD_RE.findall(message.lower()))
+
+
+def embed(normalized):
+    """
+    Sparse unit vector of word unigrams and bigrams
+    Cheap stand-in for a sentence embedding; good enough to match rewordings
+    that share most of their words.
+    """
+    words = normalized.split()
+    terms = Counter(words)
+    terms.update(f'{a} {b}' for a, b in zip(words, words[1:]))
+    norm = math.sqrt(sum(count * count for count in terms.values())) or 1.0
+    return {term: count / norm for term, count in terms.items()}
+
+
+def content_words(normalized):
+    """Words of a normalized message other than STOP_WORDS"""
+    return sorted(set(normalized.split()) - STOP_WORDS)
+
+
+def similarity(a, b):
+    """Cosine similarity of two vectors from embed()"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+
+def profile_fingerprint(system_prompt):
+    return hashlib.sha1(system_prompt.encode('utf-8')).hexdigest()[:16]
+
+
+def _bursary_version_key(bursary_id):
+    return f'{KEY_PREFIX}:v:bursary:{bursary_id}'
+
+
+def _bucket(bursary_ids, fingerprint):
+    """
+    Everything but the message: profile, context bursaries and their versions
+    bursary_ids is None when the message had no [Database Context]
+    """
+    if bursary_ids is None:
+        return f'{fingerprint}:-'
+    version_keys = [CATALOG_VERSION_KEY] + [_bursary_version_key(pk) for pk in bursary_ids]
+    versions = _cache().get_many(version_keys)
+    parts = [f'{pk}.{versions.get(_bursary_version_key(pk), 0)}' for pk in bursary_ids]
+    return f"{fingerprint}:{versions.get(CATALOG_VERSION_KEY, 0)}:{','.join(parts)}"
+
+
+def _entry_key(bucket, normalized):
+    digest = hashlib.sha1(f'{bucket}|{normalized}'.encode('utf-8')).hexdigest()
+    return f'{KEY_PREFIX}:r:{digest}'
+
+
+def _candidates_key(bucket):
+    digest = hashlib.sha1(bucket.encode('utf-8')).hexdigest()
+    return f'{KEY_PREFIX}:c:{digest}'
+
+
+def invalidate_bursary(bursary_id):
+    """Drop cached replies whose context included this bursary"""
+    _cache().set(_bursary_version_key(bursary_id), time.time_ns(), None)
+    stats.record('invalidations')
+
+
+def invalidate_bursaries(bursary_ids):
+    """invalidate_bursary() for many bursaries at once (bulk updates send no signals)"""
+    version = time.time_ns()
+    _cache().set_many({_bursary_version_key(pk): version for pk in bursary_ids}, None)
+    stats.record('invalidations')
+
+
+def invalidate_catalog():
+    """Drop cached replies built from a search (a bursary was added or removed)"""
+    _cache().set(CATALOG_VERSION_KEY, time.time_ns(), None)
+    stats.record('invalidations')
+
+
+def request_key(message, bursary_ids, system_prompt):
+    """The cache key a reply to this first message is stored under"""
+    return _entry_key(_bucket(bursary_ids, profile_fingerprint(system_prompt)), normalize_message(message))
+
+
+def get_or_generate(message, bursary_ids, system_prompt, generate):
+    """
+    Cached reply for message, calling generate() on a miss
+    With CHATBOT_CACHE_SIMILARITY_THRESHOLD > 0 an exact miss also checks
+    earlier questions asked with the same context and profile and the same
+    content words, and reuses the closest one's reply if it is at least
+    that similar: rewordings match, a different country or subject does
+    not. Concurrent misses for the same key share one generate() call
+    (apps.chatbot.coalescing).
+    generate() must raise on failure so errors are never cached.
+    Returns: reply text
+    """
+    cache = _cache()
+    normalized = normalize_message(message)
+    bucket = _bucket(bursary_ids, profile_fingerprint(system_prompt))
+    key = _entry_key(bucket, normalized)
+
+    entry = cache.get(key)
+    if entry is not None:
+        stats.record('hits', entry['latency'])
+        record_cache_lookup(True)
+        return entry['response']
+
+    threshold = getattr(settings, 'CHATBOT_CACHE_SIMILARITY_THRESHOLD', 0.0)
+    vector = embed(normalized) if threshold > 0 else None
+    words = content_words(normalized)
+    if vector:
+        candidates = cache.get(_candidates_key(bucket)) or []
+        scored = [
+            (similarity(vector, other), other_key)
+            for other_key, other, other_words in candidates
+            if other_words == words
+        ]
+        score, best_key = max(scored, default=(0.0, None))
+        if score >= threshold:
+            entry = cache.get(best_key)
+            if entry is not None:
+                logger.debug('Chatbot cache similar hit (%.2f) for %r', score, normalized)
+                stats.record('similar_hits', entry['latency'])
+                record_cache_lookup(True)
+                return entry['response']
+
+    stats.record('misses')
+    record_cache_lookup(False)
+
+    def generate_and_store():
+        started = time.monotonic()
+        response = generate()
+        timeout = getattr(settings, 'CHATBOT_CACHE_TIMEOUT', 3600)
+        cache.set(key, {'response': response, 'latency': time.monotonic() - started}, timeout)
+
+        if vector:
+            candidates_key = _candidates_key(bucket)
+            candidates = [c for c in cache.get(candidates_key) or [] if c[0] != key]
+            candidates.append((key, vector, words))
+            cache.set(candidates_key, candidates[-MAX_SIMILAR_CANDIDATES:], timeout)
+        return response
+
+    return coalescing.coalesce(key, generate_and_store)
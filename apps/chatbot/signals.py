@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.bursaries import counters
+from apps.bursaries.models import Bursary
+from apps.chatbot import response_cache
+from apps.chatbot.models import ChatConversation, ChatMessage
+
+
+@receiver(post_save, sender=Bursary)
+@receiver(post_delete, sender=Bursary)
+def invalidate_cached_replies(sender, instance, created=False, **kwargs):
+    """Replies that quoted this bursary are stale; new or removed ones change search results"""
+    response_cache.invalidate_bursary(instance.pk)
+    if created or kwargs['signal'] is post_delete:
+        response_cache.invalidate_catalog()
+
+
+counters.register(ChatConversation, 'message_count', ChatMessage, 'conversation')
@@ -0,0 +1,32 @@
+from apps.chatbot.ai_service import ChatbotAIService, ChatbotUnavailable
+from apps.chatbot.context import build_window
+from apps.chatbot.models import ChatMessage
+from apps.jobs.queue import JobError, task
+
+
+# Not retried here: upstream.post() already retries transient failures
+@task('chatbot.answer', priority=10, max_attempts=1)
+def answer(message_id):
+    """
+    Reply to a saved user message and save the reply
+    Returns: {'response', 'session_id'}
+    """
+    message = ChatMessage.objects.select_related('conversation__user').get(pk=message_id)
+    conversation = message.conversation
+    window = build_window(conversation, exclude=message)
+    
+    ai_service = ChatbotAIService(user=conversation.user)
+    try:
+        bot_response = ai_service.get_response(
+            message.message, conversation_history=window.messages, summary=window.summary
+        )
+    except ChatbotUnavailable as e:
+        # Not saved as a bot message: it isn't part of the conversation
+        raise JobError(str(e)) from e
+    
+    ChatMessage.objects.create(
+        conversation=conversation,
+        sender='bot',
+        message=bot_response
+    )
+    return {'response': bot_response, 'session_id': str(conversation.session_id)}
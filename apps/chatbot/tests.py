@@ -1,3 +1,513 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from apps.dashboard.profiling import render_prometheus
+from django.utils import timezone
+from apps.bursaries.models import Bursary
+from apps.chatbot import coalescing, context, response_cache, upstream
+from apps.chatbot.ai_service import ChatbotAIService, ChatbotUnavailable
+from apps.chatbot.models import ChatConversation, ChatMessage
+from apps.jobs import queue
 
-# Create your tests here.
+User = get_user_model()
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Answers generateContent and streamGenerateContent (alt=sse) the way
+    Gemini does. Plain replies are numbered so tests can tell them apart.
+    """
+    chunks = ['Hello', ' there', '!']
+    requests = []
+    fail = False
+    failures = 0  # Fail this many requests, then recover
+    delay = 0  # Seconds before answering
+    break_stream = False  # Garble the stream after its first chunk
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        type(self).requests.append((self.path, json.loads(self.rfile.read(length))))
+        time.sleep(self.delay)
+        if self.fail or self.failures:
+            type(self).failures = max(0, self.failures - 1)
+            self.send_response(503)
+            self.end_headers()
+            return
+        if ':generateContent' in self.path:
+            body = {'candidates': [{'content': {'parts': [{'text': f'Reply {len(self.requests)}'}]}}]}
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(body).encode())
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for text in self.chunks:
+            event = {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}}]}
+            self.wfile.write(f'data: {json.dumps(event)}\r\n\r\n'.encode())
+            self.wfile.flush()
+            if self.break_stream:
+                self.wfile.write(b'data: {"candidates": [\r\n\r\n')
+                return
+
+    def log_message(self, *args):
+        pass
+
+
+class StubGeminiMixin:
+    """Runs StubGeminiHandler on a local port for the test class"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGeminiHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}/v1'
+
+    def setUp(self):
+        super().setUp()
+        StubGeminiHandler.requests = []
+        StubGeminiHandler.fail = False
+        StubGeminiHandler.failures = 0
+        StubGeminiHandler.delay = 0
+        StubGeminiHandler.break_stream = False
+        upstream.reset()
+        # No waiting between retries
+        overrides = override_settings(CHATBOT_RETRY_BACKOFF=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+class StreamingChatTests(StubGeminiMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='student', password='pass12345')
+
+    async def _stream(self, body):
+        response = await self.async_client.post(
+            '/chatbot/stream/', json.dumps(body), content_type='application/json'
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = b''
+        async for chunk in response.streaming_content:
+            content += chunk.encode() if isinstance(chunk, str) else chunk
+        events = []
+        for block in content.decode().strip().split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.split('\n'))
+            events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    async def test_streams_tokens_and_saves_reply(self):
+        await self.async_client.aforce_login(self.user)
+        with override_settings(GOOGLE_API_KEY='test-key', GOOGLE_API_BASE_URL=self.base_url):
+            events = await self._stream({'message': 'Hi'})
+
+        self.assertEqual(
+            [data['text'] for name, data in events if name == 'token'],
+            ['Hello', ' there', '!']
+        )
+        name, data = events[-1]
+        self.assertEqual(name, 'done')
+
+        path, payload = StubGeminiHandler.requests[0]
+        self.assertIn(':streamGenerateContent?', path)
+        self.assertIn('alt=sse', path)
+        self.assertEqual(payload['contents'][-1]['parts'][0]['text'], 'Hi')
+
+        conversation = await ChatConversation.objects.aget(session_id=data['session_id'])
+        saved = [
+            (message.sender, message.message)
+            async for message in ChatMessage.objects.filter(conversation=conversation).order_by('id')
+        ]
+        self.assertEqual(saved, [('user', 'Hi'), ('bot', 'Hello there!')])
+
+    async def test_continues_existing_conversation(self):
+        await self.async_client.aforce_login(self.user)
+        with override_settings(GOOGLE_API_KEY='test-key', GOOGLE_API_BASE_URL=self.base_url):
+            first = await self._stream({'message': 'Hi'})
+            session_id = first[-1][1]['session_id']
+            await self._stream({'message': 'And again', 'session_id': session_id})
+
+        # The second request carries the first exchange as history
+        _, payload = StubGeminiHandler.requests[1]
+        history = [content['parts'][0]['text'] for content in payload['contents'][1:]]
+        self.assertEqual(history[:2], ['Hi', 'Hello there!'])
+        self.assertEqual(history[-1], 'And again')
+        self.assertEqual(await ChatMessage.objects.filter(conversation__session_id=session_id).acount(), 4)
+
+    async def test_retries_before_the_first_token(self):
+        await self.async_client.aforce_login(self.user)
+        StubGeminiHandler.failures = 1
+        with override_settings(GOOGLE_API_KEY='test-key', GOOGLE_API_BASE_URL=self.base_url):
+            events = await self._stream({'message': 'Hi'})
+        self.assertEqual(''.join(data['text'] for name, data in events if name == 'token'), 'Hello there!')
+        self.assertEqual(len(StubGeminiHandler.requests), 2)
+        self.assertEqual(upstream.metrics.retries, 1)
+
+    async def test_broken_stream_is_not_saved(self):
+        await self.async_client.aforce_login(self.user)
+        StubGeminiHandler.break_stream = True
+        with override_settings(GOOGLE_API_KEY='test-key', GOOGLE_API_BASE_URL=self.base_url), \
+                self.assertLogs('apps.chatbot.ai_service', 'WARNING'):
+            events = await self._stream({'message': 'Hi'})
+        self.assertEqual([name for name, _ in events], ['token', 'error', 'done'])
+        saved = [
+            message.sender
+            async for message in ChatMessage.objects.filter(conversation__session_id=events[-1][1]['session_id'])
+        ]
+        # A cut-off reply would be sent back upstream as history on later turns
+        self.assertEqual(saved, ['user'])
+
+    async def test_requires_login(self):
+        response = await self.async_client.post(
+            '/chatbot/stream/', json.dumps({'message': 'Hi'}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 302)
+
+
+class ResponseCacheTests(StubGeminiMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        caches['chatbot'].clear()
+        response_cache.stats.reset()
+        self.user = User.objects.create_user(username='student', password='pass12345')
+        self.bursary = Bursary.objects.create(
+            title='Engineering Scholarship', description='For engineering students', category='merit',
+            status='active', amount=Decimal('1000'), eligible_education_levels='bachelor',
+            eligible_fields='engineering', country='Kenya', provider_name='Provider',
+            application_deadline=timezone.now().date() + timedelta(days=30),
+        )
+        overrides = override_settings(
+            GOOGLE_API_KEY='test-key', GOOGLE_API_BASE_URL=self.base_url,
+            CHATBOT_CACHE_SIMILARITY_THRESHOLD=0.75,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def ask(self, message, history=None):
+        return ChatbotAIService(user=self.user).get_response(message, conversation_history=history)
+
+    def test_repeated_question_is_served_from_cache(self):
+        first = self.ask('What engineering scholarships are open?')
+        second = self.ask('what  engineering scholarships are OPEN')
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(StubGeminiHandler.requests), 1)
+        self.assertIn('[Database Context]', StubGeminiHandler.requests[0][1]['contents'][-1]['parts'][0]['text'])
+        metrics = response_cache.stats.as_dict()
+        self.assertEqual((metrics['hits'], metrics['misses']), (1, 1))
+        self.assertEqual(metrics['hit_ratio'], 0.5)
+        self.assertGreater(metrics['latency_saved_seconds'], 0)
+
+    def test_reworded_question_uses_similar_entry(self):
+        first = self.ask('What engineering scholarships are open?')
+        self.assertEqual(self.ask('Which engineering scholarships are open?'), first)
+        self.assertEqual(response_cache.stats.similar_hits, 1)
+
+        # Unrelated wording with the same context still goes upstream
+        self.ask('How do I apply for engineering scholarships?')
+        self.assertEqual(len(StubGeminiHandler.requests), 2)
+
+    def test_different_place_is_not_a_similar_question(self):
+        self.ask('What documents do I need to apply to a university in Kenya?')
+        self.ask('What documents do I need to apply to a university in Ghana?')
+        self.assertEqual(len(StubGeminiHandler.requests), 2)
+        self.assertEqual(response_cache.stats.similar_hits, 0)
+
+    def test_different_status_is_not_a_similar_question(self):
+        self.ask('Which engineering scholarships are open?')
+        self.ask('Which engineering scholarships are closed?')
+        self.assertEqual(len(StubGeminiHandler.requests), 2)
+        self.assertEqual(response_cache.stats.similar_hits, 0)
+
+    def test_changing_a_referenced_bursary_invalidates(self):
+        self.ask('What engineering scholarships are open?')
+        self.bursary.amount = Decimal('2000')
+        self.bursary.save()
+        self.ask('What engineering scholarships are open?')
+        self.assertEqual(len(StubGeminiHandler.requests), 2)
+
+    def test_follow_up_messages_are_not_cached(self):
+        history = [ChatMessage(sender='user', message='Hi'), ChatMessage(sender='bot', message='Hello')]
+        self.ask('What engineering scholarships are open?', history)
+        self.ask('What engineering scholarships are open?', history)
+        self.assertEqual(len(StubGeminiHandler.requests), 2)
+
+    def test_errors_are_not_cached(self):
+        StubGeminiHandler.fail = True
+        with self.assertRaisesMessage(ChatbotUnavailable, 'error contacting Google API'), \
+                self.assertLogs('apps.chatbot.ai_service', 'WARNING'):
+            self.ask('Any grants?')
+        StubGeminiHandler.fail = False
+        self.assertEqual(self.ask('Any grants?'), f'Reply {len(StubGeminiHandler.requests)}')
+
+
+class ContextWindowTests(StubGeminiMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        context.stats.reset()
+        self.user = User.objects.create_user(username='student', password='pass12345')
+        self.client.force_login(self.user)
+        self.conversation = ChatConversation.objects.create(user=self.user)
+
+    def add(self, sender, text):
+        return ChatMessage.objects.create(conversation=self.conversation, sender=sender, message=text)
+
+    def test_estimate_tokens(self):
+        self.assertEqual(context.estimate_tokens(''), 0)
+        self.assertEqual(context.estimate_tokens('abcd'), 1)
+        self.assertEqual(context.estimate_tokens('abcde'), 2)
+
+    def test_window_keeps_recent_messages_and_summarizes_the_rest(self):
+        old = self.add('user', 'Which nursing bursaries are open? I finish in June.')
+        self.add('bot', 'There are three. ' + 'Details follow. ' * 40)
+        recent = [self.add('user', 'Thanks'), self.add('bot', 'You are welcome')]
+
+        window = context.build_window(self.conversation, budget=30)
+        self.assertEqual(window.messages, recent)
+        self.assertEqual(window.summary, 'Student: Which nursing bursaries are open?\nAssistant: There are three.')
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, window.summary)
+        self.assertEqual(self.conversation.summary_through, recent[0].pk - 1)
+        self.assertEqual(context.stats.summarized_messages, 2)
+
+        # Later turns only fold in what has newly fallen out of the window
+        self.add('user', 'And medicine? ' + 'x' * 200)
+        window = context.build_window(self.conversation, budget=30)
+        self.assertEqual(window.messages, [])
+        self.assertEqual(window.summary.split('\n')[0], 'Student: Which nursing bursaries are open?')
+        self.assertEqual(len(window.summary.split('\n')), 5)
+        self.assertEqual(context.stats.summarized_messages, 5)
+        self.assertLess(old.pk, self.conversation.summary_through)
+
+    def test_summary_is_capped(self):
+        for i in range(20):
+            self.add('user', f'Question number {i} about bursaries for engineering students in Kenya')
+        with override_settings(CHATBOT_SUMMARY_TOKENS=40):
+            window = context.build_window(self.conversation, budget=0)
+        self.assertLessEqual(context.estimate_tokens(window.summary), 40)
+        self.assertTrue(window.summary.endswith('number 19 about bursaries for engineering students in Kenya'))
+
+    def test_message_view_sends_summary_and_counts_bytes(self):
+        for i in range(6):
+            self.add('user', f'Earlier question {i}')
+            self.add('bot', 'A long answer. ' * 100)
+        with override_settings(GOOGLE_API_KEY='test-key', GOOGLE_API_BASE_URL=self.base_url, CHATBOT_CONTEXT_TOKENS=500):
+            response = self.client.post('/chatbot/message/', json.dumps({
+                'message': 'One more thing', 'session_id': str(self.conversation.session_id),
+            }), content_type='application/json')
+        self.assertEqual(response.json()['response'], 'Reply 1')
+
+        _, payload = StubGeminiHandler.requests[0]
+        texts = [content['parts'][0]['text'] for content in payload['contents']]
+        self.assertIn('Summary of the earlier conversation:\nStudent: Earlier question 0', texts[0])
+        # The message being answered is sent once, last
+        self.assertEqual(texts[1:], ['Earlier question 5', 'A long answer. ' * 100, 'One more thing'])
+        metrics = context.stats.as_dict()
+        self.assertEqual(metrics['requests'], 1)
+        self.assertEqual(metrics['bytes_sent'], len(json.dumps(payload).encode()))
+
+    def test_background_reply_is_polled(self):
+        self.add('user', 'Earlier question')
+        self.add('bot', 'Earlier answer')
+        with override_settings(GOOGLE_API_KEY='test-key', GOOGLE_API_BASE_URL=self.base_url, JOBS_BACKGROUND=True):
+            response = self.client.post('/chatbot/message/', json.dumps({
+                'message': 'One more thing', 'session_id': str(self.conversation.session_id),
+            }), content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(StubGeminiHandler.requests, [])
+            queue.run_next()
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(status['result']['response'], 'Reply 1')
+        _, payload = StubGeminiHandler.requests[0]
+        # The queued message is sent once, after the history
+        texts = [content['parts'][0]['text'] for content in payload['contents']]
+        self.assertEqual(texts[1:], ['Earlier question', 'Earlier answer', 'One more thing'])
+        self.assertEqual(self.conversation.messages.last().message, 'Reply 1')
+
+
+class UpstreamClientTests(StubGeminiMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='student', password='pass12345')
+        overrides = override_settings(
+            GOOGLE_API_KEY='test-key', GOOGLE_API_BASE_URL=self.base_url, CHATBOT_RESPONSE_CACHE=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def ask(self, message='Hi'):
+        return ChatbotAIService(user=self.user).get_response(message)
+
+    def test_session_is_shared(self):
+        self.assertIs(upstream.get_session(), upstream.get_session())
+        self.ask()
+        self.ask()
+        self.assertEqual(upstream.metrics.calls, 2)
+
+    def test_transient_errors_are_retried(self):
+        StubGeminiHandler.failures = 2
+        self.assertEqual(self.ask(), 'Reply 3')
+        self.assertEqual(upstream.metrics.as_dict(), {
+            'calls': 3, 'failures': 2, 'retries': 2, 'rejected': 0, 'circuit_open': 0,
+        })
+        self.assertIn('edu_chatbot_upstream_seconds_count 3', render_prometheus())
+
+    @override_settings(CHATBOT_HTTP_RETRIES=0, CHATBOT_CIRCUIT_FAILURES=2, CHATBOT_CIRCUIT_RESET=60)
+    def test_circuit_opens_then_recovers(self):
+        StubGeminiHandler.fail = True
+        for _ in range(2):
+            with self.assertRaises(ChatbotUnavailable), self.assertLogs('apps.chatbot.ai_service', 'WARNING'):
+                self.ask()
+        self.assertEqual(upstream.breaker.state, 'open')
+
+        # Refused without reaching the upstream
+        with self.assertRaisesMessage(ChatbotUnavailable, 'unavailable'):
+            self.ask()
+        self.assertEqual(len(StubGeminiHandler.requests), 2)
+        self.assertEqual(upstream.metrics.rejected, 1)
+
+        StubGeminiHandler.fail = False
+        with override_settings(CHATBOT_CIRCUIT_RESET=0):
+            self.assertEqual(upstream.breaker.state, 'half_open')
+            self.assertEqual(self.ask(), 'Reply 3')
+        self.assertEqual(upstream.breaker.state, 'closed')
+
+    @override_settings(CHATBOT_HTTP_RETRIES=0, CHATBOT_CIRCUIT_FAILURES=1, CHATBOT_CIRCUIT_RESET=0)
+    def test_any_failed_trial_settles_the_circuit(self):
+        session = upstream.get_session()
+        url = f'{self.base_url}/models/test:generateContent'
+        with mock.patch.object(session, 'post', side_effect=requests.ConnectionError):
+            with self.assertRaises(requests.ConnectionError):
+                upstream.post(url, b'{}')
+        self.assertEqual(upstream.breaker.state, 'half_open')
+
+        # A reply cut off mid-body is a failed trial, not a stuck one
+        with mock.patch.object(session, 'post', side_effect=requests.exceptions.ChunkedEncodingError):
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                upstream.post(url, b'{}')
+        self.assertFalse(upstream.breaker.trial_running)
+        self.assertEqual(upstream.metrics.failures, 2)
+
+        # Errors that aren't the upstream's hand the trial to the next call
+        with mock.patch.object(session, 'post', side_effect=KeyError):
+            with self.assertRaises(KeyError):
+                upstream.post(url, b'{}')
+        self.assertFalse(upstream.breaker.trial_running)
+        self.assertEqual(self.ask(), 'Reply 1')
+        self.assertEqual(upstream.breaker.state, 'closed')
+
+    def test_backoff_is_jittered_and_capped(self):
+        with override_settings(CHATBOT_RETRY_BACKOFF=1, CHATBOT_RETRY_BACKOFF_MAX=4):
+            delays = [upstream.backoff(6) for _ in range(50)]
+            self.assertTrue(all(0 <= delay <= 4 for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+            self.assertGreaterEqual(upstream.backoff(0, retry_after='3'), 3)
+
+    def test_failed_turn_is_not_saved_as_a_bot_message(self):
+        StubGeminiHandler.fail = True
+        self.client.force_login(self.user)
+        with self.assertLogs('apps.chatbot.ai_service', 'WARNING') as logs:
+            response = self.client.post('/chatbot/message/', json.dumps({'message': 'Hi'}), content_type='application/json')
+        self.assertNotIn('test-key', logs.output[0])
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('error contacting Google API', response.json()['error'])
+        self.assertNotIn('test-key', response.json()['error'])
+        self.assertEqual(list(ChatMessage.objects.values_list('sender', flat=True)), ['user'])
+
+
+class CoalescingTests(StubGeminiMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        caches['chatbot'].clear()
+        coalescing.stats.reset()
+        overrides = override_settings(GOOGLE_API_KEY='test-key', GOOGLE_API_BASE_URL=self.base_url)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def ask_together(self, count, message='When is the deadline?'):
+        """get_response() from `count` threads at once; no user, so no queries"""
+        StubGeminiHandler.delay = 0.3
+        start = threading.Barrier(count)
+        results = [None] * count
+
+        def ask(index):
+            start.wait()
+            try:
+                results[index] = ChatbotAIService().get_response(message)
+            except ChatbotUnavailable as exc:
+                results[index] = exc
+
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @override_settings(CHATBOT_RESPONSE_CACHE=False)
+    def test_identical_questions_share_one_call(self):
+        results = self.ask_together(5)
+        self.assertEqual(results, ['Reply 1'] * 5)
+        self.assertEqual(len(StubGeminiHandler.requests), 1)
+        metrics = coalescing.stats.as_dict()
+        self.assertEqual((metrics['leaders'], metrics['followers']), (1, 4))
+        self.assertEqual(metrics['shared_ratio'], 0.8)
+
+    def test_cache_misses_are_coalesced(self):
+        self.assertEqual(self.ask_together(4), ['Reply 1'] * 4)
+        self.assertEqual(len(StubGeminiHandler.requests), 1)
+        self.assertEqual(response_cache.stats.misses, 4)
+
+    @override_settings(CHATBOT_RESPONSE_CACHE=False, CHATBOT_HTTP_RETRIES=0)
+    def test_errors_are_shared(self):
+        StubGeminiHandler.fail = True
+        with self.assertLogs('apps.chatbot.ai_service', 'WARNING'):
+            results = self.ask_together(3)
+        self.assertTrue(all(isinstance(result, ChatbotUnavailable) for result in results))
+        self.assertEqual(len(StubGeminiHandler.requests), 1)
+
+    @override_settings(CHATBOT_COALESCE=False, CHATBOT_RESPONSE_CACHE=False)
+    def test_can_be_disabled(self):
+        self.ask_together(3)
+        self.assertEqual(len(StubGeminiHandler.requests), 3)
+
+    @override_settings(CHATBOT_COALESCE_CROSS_PROCESS=True)
+    def test_waits_for_another_process(self):
+        cache = caches['chatbot']
+        cache.set(f'{coalescing.LOCK_PREFIX}:k', 'other-process', 60)
+
+        def finish_elsewhere():
+            time.sleep(0.2)
+            cache.set(f'{coalescing.RESULT_PREFIX}:k', 'Shared reply', 60)
+            cache.delete(f'{coalescing.LOCK_PREFIX}:k')
+
+        threading.Thread(target=finish_elsewhere).start()
+        self.assertEqual(coalescing.coalesce('k', lambda: self.fail('called upstream')), 'Shared reply')
+        self.assertEqual(coalescing.stats.remote_followers, 1)
+
+        # Without anyone holding the lock, the caller leads and publishes
+        self.assertEqual(coalescing.coalesce('j', lambda: 'Own reply'), 'Own reply')
+        self.assertEqual(cache.get(f'{coalescing.RESULT_PREFIX}:j'), 'Own reply')
+        self.assertIsNone(cache.get(f'{coalescing.LOCK_PREFIX}:j'))
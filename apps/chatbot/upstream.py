@@ -0,0 +1,346 @@
+# UPSTREAM HTTP CLIENT
+# Every Gemini call goes through here. Requests share one keep-alive
+# session per process (and one httpx client per event loop for streaming),
+# so turns after the first skip the TCP and TLS handshakes. At most
+# CHATBOT_MAX_CONCURRENCY calls run at once per process. 429 and 5xx replies
+# and connection errors are retried with exponential backoff and full
+# jitter. After CHATBOT_CIRCUIT_FAILURES failed calls in a row the circuit
+# opens, and calls fail at once for CHATBOT_CIRCUIT_RESET seconds; then one
+# trial call decides whether it closes again.
+import asyncio
+import random
+import threading
+import time
+import weakref
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # Only needed for the streaming endpoint
+    httpx = None
+
+# Upper bounds (seconds) of the upstream latency histogram
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# What the async client raises for a failed request
+ASYNC_HTTP_ERRORS = (httpx.HTTPError,) if httpx is not None else ()
+
+
+class UpstreamError(Exception):
+    """The upstream call failed and was not retried further"""
+
+
+class CircuitOpen(UpstreamError):
+    """Calls are being refused because the upstream keeps failing"""
+
+
+class UpstreamBusy(UpstreamError):
+    """No concurrency slot became free in time"""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half open after a pause"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= _setting('CHATBOT_CIRCUIT_RESET', 30):
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go ahead; in half open, only one at a time"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def cancel(self):
+        """An allowed call never reached the upstream"""
+        with self._lock:
+            self.trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= _setting('CHATBOT_CIRCUIT_FAILURES', 5):
+                self.opened_at = time.monotonic()
+
+
+class UpstreamMetrics:
+    """Thread-safe call counts and latency histogram for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.failures = 0
+            self.retries = 0
+            self.rejected = 0
+            self.seconds = 0.0
+            self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, duration, ok):
+        with self._lock:
+            self.calls += 1
+            self.failures += not ok
+            self.seconds += duration
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    self.buckets[index] += 1
+
+    def record(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'failures': self.failures,
+                'retries': self.retries,
+                'rejected': self.rejected,
+                'circuit_open': int(breaker.state != 'closed'),
+            }
+
+    def histogram(self):
+        """(buckets, count, sum) for the Prometheus histogram"""
+        with self._lock:
+            return list(zip(LATENCY_BUCKETS, self.buckets)), self.calls, self.seconds
+
+
+breaker = CircuitBreaker()
+metrics = UpstreamMetrics()
+
+_session = None
+_slots = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """The process-wide keep-alive requests.Session"""
+    global _session
+    with _lock:
+        if _session is None:
+            pool_size = _setting('CHATBOT_MAX_CONCURRENCY', 8)
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=pool_size))
+            session.mount('http://', HTTPAdapter(pool_connections=2, pool_maxsize=pool_size))
+            session.headers['Content-Type'] = 'application/json'
+            _session = session
+        return _session
+
+
+def _get_slots():
+    global _slots
+    with _lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(_setting('CHATBOT_MAX_CONCURRENCY', 8))
+        return _slots
+
+
+# One pooled async HTTP client per event loop, reused across requests
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Shared keep-alive httpx.AsyncClient for the running event loop"""
+    if httpx is None:
+        raise ImproperlyConfigured('The streaming chatbot requires the httpx package.')
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        limit = _setting('CHATBOT_MAX_CONCURRENCY', 8)
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(_setting('CHATBOT_HTTP_TIMEOUT', 30), connect=5.0,
+                                  pool=_setting('CHATBOT_SLOT_TIMEOUT', 10)),
+            limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+            headers={"Content-Type": "application/json"},
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def reset():
+    """Forget the session, slots, circuit state and metrics (tests, settings changes)"""
+    global _session, _slots
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = _slots = None
+    breaker.reset()
+    metrics.reset()
+
+
+def backoff(attempt, retry_after=None):
+    """
+    Seconds to wait before retry number `attempt` (0-based)
+    Full jitter: uniform up to base * 2**attempt, capped; a Retry-After
+    header in seconds is respected as a minimum.
+    """
+    ceiling = min(_setting('CHATBOT_RETRY_BACKOFF_MAX', 8.0), _setting('CHATBOT_RETRY_BACKOFF', 0.5) * 2 ** attempt)
+    delay = random.uniform(0, ceiling)
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), _setting('CHATBOT_RETRY_BACKOFF_MAX', 8.0)))
+        except ValueError:
+            pass  # An HTTP date; the jittered delay will do
+    return delay
+
+
+def _admit():
+    if not breaker.allow():
+        metrics.record('rejected')
+        raise CircuitOpen('The chat service is unavailable, please try again shortly.')
+
+
+def post(url, body):
+    """
+    POST a JSON body, retrying transient failures
+    Raises CircuitOpen, UpstreamBusy, or the last requests exception
+    (HTTPError for an error status).
+    Returns: requests.Response with a 2xx status
+    """
+    _admit()
+    try:
+        return _post(url, body)
+    except (UpstreamError, requests.RequestException):
+        raise  # Already settled with the breaker
+    except BaseException:
+        # Says nothing about the upstream; let another call be the trial
+        breaker.cancel()
+        raise
+
+
+def _post(url, body):
+    slots = _get_slots()
+    if not slots.acquire(timeout=_setting('CHATBOT_SLOT_TIMEOUT', 10)):
+        breaker.cancel()
+        metrics.record('rejected')
+        raise UpstreamBusy('The chat service is busy, please try again shortly.')
+    try:
+        retries = _setting('CHATBOT_HTTP_RETRIES', 2)
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            retry_after = None
+            try:
+                response = get_session().post(url, data=body, timeout=_setting('CHATBOT_HTTP_TIMEOUT', 30))
+                if response.status_code not in RETRY_STATUSES:
+                    # Other 4xx are our mistake, not an upstream outage
+                    metrics.observe(time.perf_counter() - started, response.ok)
+                    breaker.record_success()
+                    response.raise_for_status()
+                    return response
+                retry_after = response.headers.get('Retry-After')
+                response.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as exc:
+                if exc.response is not None and exc.response.status_code not in RETRY_STATUSES:
+                    raise
+                error = exc
+            except requests.RequestException:
+                # E.g. a reply cut off or garbled mid-body: not retried, but still a failure
+                metrics.observe(time.perf_counter() - started, False)
+                breaker.record_failure()
+                raise
+            metrics.observe(time.perf_counter() - started, False)
+            if attempt < retries:
+                metrics.record('retries')
+                time.sleep(backoff(attempt, retry_after))
+        breaker.record_failure()
+        raise error
+    finally:
+        slots.release()
+
+
+async def stream_lines(url, body):
+    """
+    POST a JSON body and yield the response lines as they arrive
+    Failures before the first line are retried like post(); after that the
+    caller has used the lines, so errors propagate.
+    """
+    _admit()
+    try:
+        client = get_async_client()
+        retries = _setting('CHATBOT_HTTP_RETRIES', 2)
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            retry_after = None
+            yielded = False
+            try:
+                async with client.stream('POST', url, content=body) as resp:
+                    if resp.status_code not in RETRY_STATUSES:
+                        if resp.is_error:
+                            metrics.observe(time.perf_counter() - started, False)
+                            breaker.record_success()
+                            resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            yielded = True
+                            yield line
+                        metrics.observe(time.perf_counter() - started, True)
+                        breaker.record_success()
+                        return
+                    retry_after = resp.headers.get('Retry-After')
+                    error = httpx.HTTPStatusError(
+                        f'Server error {resp.status_code} for url {url}', request=resp.request, response=resp,
+                    )
+            except httpx.HTTPStatusError:
+                raise  # A 4xx, recorded as a success above
+            except httpx.HTTPError as exc:
+                # Only connection trouble before the first line is retried;
+                # anything else (e.g. an undecodable body) fails at once
+                if yielded or not isinstance(exc, httpx.TransportError):
+                    metrics.observe(time.perf_counter() - started, False)
+                    breaker.record_failure()
+                    raise
+                error = exc
+            metrics.observe(time.perf_counter() - started, False)
+            if attempt < retries:
+                metrics.record('retries')
+                await asyncio.sleep(backoff(attempt, retry_after))
+        breaker.record_failure()
+        raise error
+    except ASYNC_HTTP_ERRORS:
+        raise  # Already settled with the breaker
+    except BaseException:
+        # E.g. the client went away mid-stream (GeneratorExit); let another
+        # call be the trial
+        breaker.cancel()
+        raise
@@ -6,5 +6,6 @@ app_name = 'chatbot'
 urlpatterns = [
     path('interface/', views.chatbot_interface, name='interface'),
     path('message/', views.chatbot_message, name='message'),
+    path('stream/', views.chatbot_stream, name='stream'),
     path('history/<str:session_id>/', views.get_conversation_history, name='history'),
 ]
\ No newline at end of file
@@ -1,25 +1,79 @@
 
 # Create your views here.
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 import json
+import logging
 import uuid
+from asgiref.sync import sync_to_async
 from apps.chatbot.models import ChatConversation, ChatMessage
-from apps.chatbot.ai_service import ChatbotAIService
+from apps.chatbot.ai_service import ChatbotAIService, ChatbotUnavailable
+from apps.chatbot.context import build_window
+from apps.chatbot.tasks import answer
+from apps.dashboard.activity import record_activity
+from apps.jobs.models import Job
+
+logger = logging.getLogger(__name__)
 
 @login_required
 def chatbot_interface(request):
     """Render chatbot interface (optional full-page view)"""
     return render(request, 'chatbot/interface.html')
 
+def _start_turn(user, session_id, user_message):
+    """
+    Get or create the conversation and save the user's message
+    Returns: (conversation, message)
+    """
+    # Get or create conversation
+    if session_id:
+        try:
+            conversation = ChatConversation.objects.get(session_id=session_id, user=user)
+        except ChatConversation.DoesNotExist:
+            conversation = ChatConversation.objects.create(
+                user=user,
+                session_id=str(uuid.uuid4())
+            )
+    else:
+        conversation = ChatConversation.objects.create(
+            user=user,
+            session_id=str(uuid.uuid4())
+        )
+    
+    # Save user message
+    message = ChatMessage.objects.create(
+        conversation=conversation,
+        sender='user',
+        message=user_message
+    )
+    
+    record_activity(user, 'chat')
+    return conversation, message
+
+def _prepare_stream(user, session_id, user_message):
+    """Database work for a streamed turn, run in a worker thread"""
+    conversation, message = _start_turn(user, session_id, user_message)
+    # Recent messages within the token budget, plus a summary of the rest
+    window = build_window(conversation, exclude=message)
+    ai_service = ChatbotAIService(user=user)
+    payload = ai_service.build_payload(ai_service.build_message(user_message), window.messages, window.summary)
+    return conversation, ai_service, payload
+
+def _sse(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @login_required
 @csrf_exempt
 def chatbot_message(request):
     """
     API endpoint to handle chat messages
     POST: Send message and get AI response
+    With JOBS_BACKGROUND the reply is worked out by a job worker: the
+    response is 202 with URLs to poll (or follow) for it.
     """
     if request.method == 'POST':
         try:
@@ -30,53 +84,90 @@ def chatbot_message(request):
             if not user_message:
                 return JsonResponse({'error': 'Message cannot be empty'}, status=400)
             
-            # Get or create conversation
-            if session_id:
-                try:
-                    conversation = ChatConversation.objects.get(session_id=session_id, user=request.user)
-                except ChatConversation.DoesNotExist:
-                    conversation = ChatConversation.objects.create(
-                        user=request.user,
-                        session_id=str(uuid.uuid4())
-                    )
-            else:
-                conversation = ChatConversation.objects.create(
-                    user=request.user,
-                    session_id=str(uuid.uuid4())
-                )
-            
-            # Save user message
-            ChatMessage.objects.create(
-                conversation=conversation,
-                sender='user',
-                message=user_message
-            )
-            
-            # Get conversation history (last 10 messages)
-            history = conversation.messages.order_by('-timestamp')[:10][::-1]
+            conversation, message = _start_turn(request.user, session_id, user_message)
             
-            # Get AI response
-            ai_service = ChatbotAIService(user=request.user)
-            bot_response = ai_service.get_response(user_message, conversation_history=history)
-            
-            # Save bot response
-            ChatMessage.objects.create(
-                conversation=conversation,
-                sender='bot',
-                message=bot_response
-            )
+            # Get AI response (inline unless JOBS_BACKGROUND)
+            job = answer.enqueue(message.pk, user=request.user)
+            if job.status == Job.FAILED:
+                return JsonResponse({
+                    'error': job.error,
+                    'session_id': conversation.session_id
+                }, status=503)
+            if job.status == Job.SUCCEEDED:
+                return JsonResponse({
+                    'success': True,
+                    'response': job.result['response'],
+                    'session_id': conversation.session_id
+                })
             
             return JsonResponse({
                 'success': True,
-                'response': bot_response,
+                'job': job.pk,
+                'status_url': reverse('jobs:status', args=[job.pk]),
+                'events_url': reverse('jobs:events', args=[job.pk]),
                 'session_id': conversation.session_id
-            })
+            }, status=202)
         
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+@login_required
+@csrf_exempt
+async def chatbot_stream(request):
+    """
+    Streaming variant of chatbot_message (ASGI)
+    POST: Send message; the reply is sent as server-sent events:
+    `token` events with partial text, then `done` (or `error`).
+    The bot message is saved once the stream completes; a reply cut off
+    by an error is not.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    user_message = str(data.get('message', '')).strip()
+    if not user_message:
+        return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+    
+    user = await request.auser()
+    conversation, ai_service, payload = await sync_to_async(_prepare_stream)(
+        user, data.get('session_id'), user_message
+    )
+    
+    async def events():
+        parts = []
+        failed = False
+        try:
+            async for text in ai_service.stream_google_api(payload):
+                parts.append(text)
+                yield _sse('token', {'text': text})
+        except ChatbotUnavailable as e:
+            failed = True
+            yield _sse('error', {'error': str(e)})
+        except Exception:
+            failed = True
+            logger.exception('Chat stream failed')
+            yield _sse('error', {'error': ChatbotAIService.UPSTREAM_ERROR_MESSAGE})
+        
+        # Like chatbot.answer: a failed reply isn't part of the conversation
+        if parts and not failed:
+            await ChatMessage.objects.acreate(
+                conversation=conversation,
+                sender='bot',
+                message=''.join(parts)
+            )
+        yield _sse('done', {'session_id': conversation.session_id})
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
 @login_required
 def get_conversation_history(request, session_id):
     """Get full conversation history"""
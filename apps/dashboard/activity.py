@@ -0,0 +1,186 @@
+# USER ACTIVITY TRACKING
+# Views hand events to an in-process queue; a background thread writes them
+# to UserActivity with bulk_create, so a request never waits on the insert.
+# When the queue is full new events are dropped and counted rather than
+# slowing requests down.
+import atexit
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from apps.dashboard.models import UserActivity
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityStats:
+    """Thread-safe pipeline counters for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.enqueued = 0
+            self.written = 0
+            self.dropped = 0
+            self.failed = 0
+            self.batches = 0
+            self.max_depth = 0
+
+    def record(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def observe_depth(self, depth):
+        with self._lock:
+            self.max_depth = max(self.max_depth, depth)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches,
+                'max_depth': self.max_depth,
+            }
+
+
+class ActivityRecorder:
+    """
+    Bounded queue of pending UserActivity rows
+    A batch is written when `batch_size` events are waiting or
+    `flush_interval` seconds after the first one arrived. With
+    background=False nothing is written until flush() is called.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=2.0, max_queue=10000, background=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self.stats = ActivityStats()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def record(self, user_id, activity_type, description=None):
+        """Queue one event; returns False if it was dropped"""
+        event = UserActivity(
+            user_id=user_id,
+            activity_type=activity_type,
+            description=description,
+            timestamp=timezone.now(),
+        )
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.stats.record('dropped')
+            return False
+        self.stats.record('enqueued')
+        self.stats.observe_depth(self._queue.qsize())
+        if self.background:
+            self._ensure_thread()
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-writer', daemon=True)
+                self._thread.start()
+
+    def _take_batch(self, block):
+        """Up to batch_size events, waiting at most flush_interval for them when block=True"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and batch and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                elif block and not batch:
+                    batch.append(self._queue.get())
+                    deadline = time.monotonic() + self.flush_interval
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        with self._write_lock:
+            try:
+                UserActivity.objects.bulk_create(batch, batch_size=self.batch_size)
+            except Exception:
+                logger.exception('Could not write %d user activity events', len(batch))
+                self.stats.record('failed', len(batch))
+                return 0
+            self.stats.record('written', len(batch))
+            self.stats.record('batches')
+            return len(batch)
+
+    def _run(self):
+        while True:
+            batch = self._take_batch(block=True)
+            close_old_connections()
+            self._write(batch)
+
+    def flush(self):
+        """Write everything queued now, in the calling thread; returns events written"""
+        written = 0
+        while True:
+            batch = self._take_batch(block=False)
+            if not batch:
+                return written
+            written += self._write(batch)
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_activity_recorder():
+    """Return the process-wide recorder configured in settings"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = ActivityRecorder(
+                    batch_size=getattr(settings, 'ACTIVITY_BATCH_SIZE', 500),
+                    flush_interval=getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 2.0),
+                    max_queue=getattr(settings, 'ACTIVITY_MAX_QUEUE', 10000),
+                )
+    return _recorder
+
+
+def record_activity(user, activity_type, description=None):
+    """
+    Track an action by a signed-in user
+    Queued once the surrounding transaction commits, so rolled back actions
+    aren't recorded. A no-op with ACTIVITY_TRACKING = False.
+    """
+    if not getattr(settings, 'ACTIVITY_TRACKING', True) or not user.is_authenticated:
+        return
+    user_id = user.pk
+    transaction.on_commit(lambda: get_activity_recorder().record(user_id, activity_type, description))
+
+
+@atexit.register
+def flush_on_exit():
+    """Don't lose queued events when a worker shuts down cleanly"""
+    if _recorder is not None:
+        try:
+            _recorder.flush()
+        except Exception:
+            logger.exception('Could not flush queued user activity at exit')
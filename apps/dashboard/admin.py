@@ -1,10 +1,19 @@
 from django.contrib import admin
-from apps.dashboard.models import DashboardMetric, UserActivity
+from apps.dashboard.models import ActivityAggregate, DailyMetric, DashboardMetric, UserActivity
 
 
 @admin.register(DashboardMetric)
 class DashboardMetricAdmin(admin.ModelAdmin):
-    list_display = ['metric_type', 'value', 'last_updated']
+    list_display = ['metric_type', 'key', 'value', 'last_updated']
+    list_filter = ['metric_type']
+    readonly_fields = ['last_updated']
+
+
+@admin.register(DailyMetric)
+class DailyMetricAdmin(admin.ModelAdmin):
+    list_display = ['date', 'new_applications', 'submitted_applications', 'new_students',
+                    'new_bursaries', 'active_users', 'complete']
+    date_hierarchy = 'date'
     readonly_fields = ['last_updated']
 
 
@@ -14,3 +23,10 @@ class UserActivityAdmin(admin.ModelAdmin):
     list_filter = ['activity_type', 'timestamp']
     search_fields = ['user__username', 'description']
     readonly_fields = ['timestamp']
+
+
+@admin.register(ActivityAggregate)
+class ActivityAggregateAdmin(admin.ModelAdmin):
+    list_display = ['date', 'activity_type', 'events', 'users']
+    list_filter = ['activity_type']
+    date_hierarchy = 'date'
@@ -1,98 +1,80 @@
-from django.db.models import Count, Q, Avg
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 from apps.bursaries.models import Bursary
-from apps.applications.models import ApplicationStatus
-from apps.accounts.models import User, StudentProfile
+from apps.dashboard.models import DailyMetric
+from apps.dashboard.rollups import get_metrics
 
 class DashboardAnalytics:
-    """Analytics service for admin dashboard"""
+    """
+    Analytics service for admin dashboard
+    Reads the rollups kept by apps.dashboard.rollups, so the cost doesn't
+    grow with the number of users or applications.
+    """
     
     @staticmethod
     def get_overview_stats():
         """Get high-level platform statistics"""
-        total_bursaries = Bursary.objects.filter(status='active').count()
-        total_students = User.objects.filter(user_type='student').count()
-        total_applications = ApplicationStatus.objects.count()
-        
-        # Active bursaries with approaching deadlines (next 30 days)
-        approaching_deadline = Bursary.objects.filter(
-            status='active',
-            application_deadline__lte=timezone.now().date() + timedelta(days=30),
-            application_deadline__gte=timezone.now().date()
-        ).count()
+        metrics = get_metrics('total_bursaries', 'total_students', 'total_applications', 'approaching_deadline')
         
         return {
-            'total_bursaries': total_bursaries,
-            'total_students': total_students,
-            'total_applications': total_applications,
-            'approaching_deadline': approaching_deadline,
+            'total_bursaries': metrics.get('total_bursaries', 0),
+            'total_students': metrics.get('total_students', 0),
+            'total_applications': metrics.get('total_applications', 0),
+            # Active bursaries with approaching deadlines (next 30 days)
+            'approaching_deadline': metrics.get('approaching_deadline', 0),
         }
     
     @staticmethod
     def get_bursary_performance():
-        """Get performance metrics for bursaries"""
-        bursaries = Bursary.objects.filter(status='active').annotate(
-            application_count=Count('applications')
-        ).order_by('-application_count')[:10]
+        """Get performance metrics for bursaries (top 10 by applications)"""
+        counts = get_metrics('bursary_applications').get('bursary_applications', [])
+        bursaries = Bursary.objects.in_bulk([int(key) for key, count in counts])
         
-        return bursaries
+        top = []
+        for key, count in counts:
+            bursary = bursaries.get(int(key))
+            if bursary is not None:
+                bursary.application_count = count
+                top.append(bursary)
+        return top
     
     @staticmethod
     def get_category_distribution():
         """Get bursary distribution by category"""
-        categories = Bursary.objects.filter(status='active').values(
-            'category'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
-        return list(categories)
+        categories = get_metrics('category').get('category', [])
+        return [{'category': category, 'count': count} for category, count in categories]
     
     @staticmethod
     def get_application_trends(days=30):
         """Get application trends over time"""
-        start_date = timezone.now() - timedelta(days=days)
+        start_date = timezone.localdate() - timedelta(days=days)
         
-        applications = ApplicationStatus.objects.filter(
-            created_at__gte=start_date
-        ).extra(
-            select={'date': 'DATE(created_at)'}
-        ).values('date').annotate(
-            count=Count('id')
-        ).order_by('date')
+        applications = DailyMetric.objects.filter(
+            date__gte=start_date,
+            new_applications__gt=0
+        ).values('date', count=F('new_applications')).order_by('date')
         
         return list(applications)
     
     @staticmethod
     def get_student_engagement():
         """Get student engagement metrics"""
+        metrics = get_metrics('complete_profiles', 'total_profiles', 'active_students')
         # Students with complete profiles
-        complete_profiles = StudentProfile.objects.exclude(
-            Q(institution='') | Q(gpa__isnull=True)
-        ).count()
-        
-        total_profiles = StudentProfile.objects.count()
-        
-        # Active students (with applications or bookmarks)
-        active_students = User.objects.filter(
-            Q(applications__isnull=False) | Q(bookmarks__isnull=False)
-        ).distinct().count()
+        complete_profiles = metrics.get('complete_profiles', 0)
+        total_profiles = metrics.get('total_profiles', 0)
         
         return {
             'complete_profiles': complete_profiles,
             'total_profiles': total_profiles,
-            'active_students': active_students,
+            # Active students (with applications or bookmarks)
+            'active_students': metrics.get('active_students', 0),
             'profile_completion_rate': round((complete_profiles / total_profiles * 100), 2) if total_profiles > 0 else 0
         }
     
     @staticmethod
     def get_popular_fields():
         """Get most popular fields of study"""
-        fields = StudentProfile.objects.values(
-            'field_of_study'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:5]
-        
-        return list(fields)
+        fields = get_metrics('field_of_study').get('field_of_study', [])[:5]
+        return [{'field_of_study': field, 'count': count} for field, count in fields]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.dashboard'
+
+    def ready(self):
+        from apps.dashboard import database, signals  # noqa: F401
@@ -0,0 +1,105 @@
+# DATABASE TUNING
+# SQLITE_PRAGMAS are applied to every new SQLite connection: WAL so reads
+# don't wait on the writer, synchronous=NORMAL (durable in WAL mode), a busy
+# timeout instead of immediate "database is locked", a larger page cache and
+# memory-mapped reads. maintain() runs ANALYZE and VACUUM for the
+# optimize_database command; other backends get their own equivalents.
+import re
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_SAFE_VALUE = re.compile(r'^-?\w+$')
+
+# Reported by pragma_report(), in addition to any configured ones
+REPORTED_PRAGMAS = (
+    'journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size',
+    'temp_store', 'page_size', 'page_count', 'freelist_count',
+)
+
+
+def _statements(pragmas):
+    for name, value in pragmas.items():
+        if not name.isidentifier() or not _SAFE_VALUE.match(str(value)):
+            raise ImproperlyConfigured(f'Invalid SQLITE_PRAGMAS entry {name}={value!r}')
+        yield f'PRAGMA {name}={value}'
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """connection_created receiver: tune SQLite connections"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for statement in _statements(pragmas):
+            cursor.execute(statement)
+
+
+connection_created.connect(apply_pragmas, dispatch_uid='sqlite-pragmas')
+
+
+def pragma_report(using='default'):
+    """
+    Current pragma values on a SQLite connection
+    Returns: {name: value}, empty for other backends
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return {}
+    names = dict.fromkeys([*REPORTED_PRAGMAS, *getattr(settings, 'SQLITE_PRAGMAS', {})])
+    report = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            report[name] = row[0] if row else None
+    return report
+
+
+def database_size(using='default'):
+    """Bytes used by the main SQLite file (None for other backends)"""
+    report = pragma_report(using)
+    if not report:
+        return None
+    return report['page_count'] * report['page_size']
+
+
+def maintain(using='default', analyze=True, vacuum=False):
+    """
+    Refresh planner statistics and optionally reclaim free pages
+    SQLite: ANALYZE, VACUUM, then a WAL checkpoint that truncates the log.
+    PostgreSQL: ANALYZE or VACUUM (ANALYZE). Must run outside a transaction.
+    Returns: [(step, seconds)]
+    """
+    connection = connections[using]
+    if connection.in_atomic_block:
+        raise RuntimeError('Database maintenance cannot run inside a transaction')
+    steps = []
+    if connection.vendor == 'sqlite':
+        if analyze:
+            steps.append(('analyze', 'ANALYZE'))
+        if vacuum:
+            steps.append(('vacuum', 'VACUUM'))
+        steps.append(('checkpoint', 'PRAGMA wal_checkpoint(TRUNCATE)'))
+    elif connection.vendor == 'postgresql':
+        if vacuum:
+            steps.append(('vacuum', 'VACUUM (ANALYZE)'))
+        elif analyze:
+            steps.append(('analyze', 'ANALYZE'))
+    else:
+        if analyze:
+            steps.append(('analyze', 'ANALYZE'))
+
+    timings = []
+    with connection.cursor() as cursor:
+        for name, statement in steps:
+            started = time.perf_counter()
+            cursor.execute(statement)
+            if cursor.description:
+                cursor.fetchall()
+            timings.append((name, time.perf_counter() - started))
+    return timings
@@ -0,0 +1,264 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.accounts.models import User
+from apps.bursaries.sorting import SORT_OPTIONS
+from apps.bursaries.view_counter import get_view_counter
+from apps.dashboard import synthetic
+
+SCENARIOS = ['home', 'list', 'detail', 'dashboard', 'exports']
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(timings, queries, seconds=None):
+    ordered = sorted(timings)
+    return {
+        'requests': len(timings),
+        'p50_ms': round(percentile(ordered, 0.50), 2),
+        'p95_ms': round(percentile(ordered, 0.95), 2),
+        'p99_ms': round(percentile(ordered, 0.99), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'queries_mean': round(statistics.fmean(queries), 1),
+        'queries_max': max(queries),
+        'throughput_rps': round(len(timings) / seconds, 1) if seconds else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def settings_profile():
+    """The deployment settings that change the numbers"""
+    loaders = settings.TEMPLATES[0].get('OPTIONS', {}).get('loaders') or []
+    return {
+        'database': connection.vendor,
+        'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'cache': settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1],
+        'sessions': settings.SESSION_ENGINE.rsplit('.', 1)[-1],
+        'template_cache': 'cached.Loader' in str(loaders),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the main pages end to end (through the test client, with '
+        'middleware and templates) on seeded synthetic data and report '
+        'latency percentiles, query counts and throughput. Runs inside a '
+        'transaction that is rolled back unless --keep is given; --threads '
+        'needs committed rows (--keep, then --reuse).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1000,
+                            help='Synthetic students to generate (1000 to 1000000)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per scenario')
+        parser.add_argument('--threads', type=int, default=1, help='Concurrent clients per scenario')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--compare', help='Earlier JSON results to show the change against')
+        parser.add_argument('--keep', action='store_true', help='Commit the synthetic rows instead of rolling back')
+        parser.add_argument('--reuse', action='store_true', help='Benchmark synthetic rows kept by an earlier run')
+
+    def handle(self, *args, **options):
+        if not options['reuse'] and not 1000 <= options['scale'] <= 1000000:
+            raise CommandError('--scale must be between 1000 and 1000000')
+        if options['threads'] < 1:
+            raise CommandError('--threads must be at least 1')
+        if options['threads'] > 1 and not (options['keep'] or options['reuse']):
+            # Other threads use their own connections and can't see uncommitted rows
+            raise CommandError('--threads needs committed rows: use --keep, or --reuse after a --keep run')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as handle:
+                baseline = json.load(handle)
+
+        rollback = not (options['keep'] or options['reuse'])
+        generate_seconds = 0.0
+        with transaction.atomic() if rollback else nullcontext():
+            if options['reuse']:
+                dataset = synthetic.load()
+                if not dataset.students:
+                    raise CommandError('No synthetic rows found; run once with --keep first')
+            else:
+                self.stdout.write(f"Generating scale {options['scale']} (seed {options['seed']})")
+                started = time.perf_counter()
+                with transaction.atomic():
+                    dataset = synthetic.generate(options['scale'], seed=options['seed'], stdout=self.stdout)
+                generate_seconds = time.perf_counter() - started
+
+            rng = random.Random(options['seed'])
+            results = {}
+            # Activity events wait for a commit, so rolled back runs don't write them
+            with override_settings(ALLOWED_HOSTS=['testserver'], QUERY_BUDGET_STRICT=False):
+                for name in options['scenarios']:
+                    requests = getattr(self, f'scenario_{name}')(dataset, rng, options['requests'])
+                    results[name] = self.run_scenario(requests, options['threads'])
+            # Write buffered detail page views before the synthetic rows go
+            get_view_counter().flush()
+            if rollback:
+                transaction.set_rollback(True)
+
+        report = {
+            'commit': git_commit(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'scale': dataset.counts['students'],
+            'seed': options['seed'],
+            'threads': options['threads'],
+            'database': connection.vendor,
+            'profile': settings_profile(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'generate_seconds': round(generate_seconds, 1),
+            'rows': dataset.counts,
+            'scenarios': results,
+        }
+        self.print_report(report, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def run_scenario(self, requests, threads=1):
+        """
+        Time (user id or None, url) pairs, split across `threads` clients
+        Users are logged in before the clock starts; streamed bodies are read
+        in full. Threads other than the main one use their own connections.
+        """
+        shares = [requests[index::threads] for index in range(threads)]
+        prepared = [self.clients_for(share) for share in shares]
+        timings, queries, errors = [], [], []
+        lock = threading.Lock()
+
+        def run(clients, share):
+            own_timings, own_queries = [], []
+            for user_id, url in share:
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = clients[user_id].get(url)
+                    if response.streaming:
+                        for _ in response.streaming_content:
+                            pass
+                    own_timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    errors.append(f'{url} returned {response.status_code}')
+                    return
+                own_queries.append(len(captured))
+            with lock:
+                timings.extend(own_timings)
+                queries.extend(own_queries)
+
+        def run_in_thread(clients, share):
+            try:
+                run(clients, share)
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        if threads == 1:
+            run(prepared[0], shares[0])
+        else:
+            pool = [threading.Thread(target=run_in_thread, args=args) for args in zip(prepared, shares)]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+        seconds = time.perf_counter() - started
+        if errors:
+            raise CommandError(errors[0])
+        return summarize(timings, queries, seconds)
+
+    def clients_for(self, requests):
+        """One client per distinct user (None for anonymous)"""
+        clients = {}
+        for user_id, _ in requests:
+            if user_id not in clients:
+                clients[user_id] = Client()
+                if user_id is not None:
+                    clients[user_id].force_login(User.objects.get(pk=user_id))
+        return clients
+
+    def scenario_home(self, dataset, rng, count):
+        """Signed-in students, so recommendations are computed (then cached per student)"""
+        students = rng.sample(dataset.students, min(count, len(dataset.students)))
+        url = reverse('home')
+        return [(students[i % len(students)], url) for i in range(count)]
+
+    def scenario_list(self, dataset, rng, count):
+        """Search, filters and every sort, anonymous"""
+        url = reverse('bursaries:list')
+        variants = [''] + [f'?sort={key}' for key in SORT_OPTIONS] + [
+            f'?q={word}' for word in synthetic.WORDS[:5]
+        ] + [
+            f'?category={category}' for category in synthetic.CATEGORIES
+        ] + [
+            f'?country={country}&education_level=bachelor' for country in synthetic.COUNTRIES[:3]
+        ] + ['?amount=5000-20000&sort=deadline', '?q=engineering&category=merit']
+        return [(None, url + rng.choice(variants)) for _ in range(count)]
+
+    def scenario_detail(self, dataset, rng, count):
+        student = rng.choice(dataset.students)
+        return [(student, reverse('bursaries:detail', args=[rng.choice(dataset.slugs)])) for _ in range(count)]
+
+    def scenario_dashboard(self, dataset, rng, count):
+        urls = [
+            reverse('dashboard:home'),
+            reverse('dashboard:api_chart_data') + '?type=trends&days=30',
+            reverse('dashboard:api_chart_data') + '?type=categories',
+        ]
+        return [(dataset.staff, urls[i % len(urls)]) for i in range(count)]
+
+    def scenario_exports(self, dataset, rng, count):
+        """Full CSV downloads; fewer of them, they read every row"""
+        urls = [reverse('dashboard:export_bursaries'), reverse('dashboard:export_applications')]
+        return [(dataset.staff, urls[i % len(urls)]) for i in range(max(2, count // 10))]
+
+    def print_report(self, report, baseline=None):
+        profile = ', '.join(f'{key}={value}' for key, value in report.get('profile', {}).items())
+        self.stdout.write(f"\nCommit {report['commit'] or '?'}, {report.get('threads', 1)} thread(s), {profile}")
+        self.stdout.write(f"Rows {report['rows']}")
+        header = f"{'scenario':<10} {'reqs':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'req/s':>8}"
+        if baseline:
+            header += f"   vs {baseline.get('commit') or 'baseline'} p95, req/s"
+        self.stdout.write(header)
+        for name, stats in report['scenarios'].items():
+            line = (
+                f"{name:<10} {stats['requests']:>5} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['p99_ms']:>9.2f} {stats['queries_mean']:>8.1f} {stats.get('throughput_rps') or 0:>8.1f}"
+            )
+            previous = (baseline or {}).get('scenarios', {}).get(name)
+            if previous and previous['p95_ms']:
+                line += f"   {(stats['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100:+.1f}%"
+                if previous.get('throughput_rps') and stats.get('throughput_rps'):
+                    change = (stats['throughput_rps'] - previous['throughput_rps']) / previous['throughput_rps'] * 100
+                    line += f', {change:+.1f}%'
+            self.stdout.write(line)
@@ -0,0 +1,85 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.accounts.models import User
+from apps.dashboard.activity import ActivityRecorder
+from apps.dashboard.models import UserActivity
+
+MARKER = 'benchmark-activity-tracking'
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test activity tracking from concurrent threads: time added per '
+        'event with inline inserts versus the queued batch writer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--events', type=int, default=500, help='Events per thread')
+        parser.add_argument('--max-queue', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(username=MARKER, password=None)
+        try:
+            self.stdout.write(
+                f"{'mode':>8} {'p50 us':>9} {'p99 us':>9} {'events/s':>10} {'written':>8} {'dropped':>8}"
+            )
+
+            def inline(user_id):
+                UserActivity.objects.create(user_id=user_id, activity_type='view_bursary', description=MARKER)
+                return True
+            self.report('inline', inline, user, options)
+
+            recorder = ActivityRecorder(max_queue=options['max_queue'])
+
+            def queued(user_id):
+                return recorder.record(user_id, 'view_bursary', MARKER)
+            self.report('queued', queued, user, options, recorder)
+        finally:
+            user.delete()
+
+    def report(self, mode, record, user, options, recorder=None):
+        UserActivity.objects.filter(user=user).delete()
+        latencies, elapsed = self.run_load(record, user.pk, options['threads'], options['events'])
+        dropped = 0
+        if recorder is not None:
+            # Wait for the writer to catch up before counting rows
+            while recorder.pending():
+                time.sleep(0.05)
+            time.sleep(recorder.flush_interval + 0.5)
+            dropped = recorder.stats.dropped
+
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        written = UserActivity.objects.filter(user=user).count()
+        self.stdout.write(
+            f'{mode:>8} {statistics.median(latencies) * 1e6:>9.1f} {p99 * 1e6:>9.1f} '
+            f'{len(latencies) / elapsed:>10.1f} {written:>8} {dropped:>8}'
+        )
+
+    def run_load(self, record, user_id, thread_count, per_thread):
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            timings = []
+            for _ in range(per_thread):
+                started = time.perf_counter()
+                record(user_id)
+                timings.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(timings)
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, time.perf_counter() - started
@@ -0,0 +1,129 @@
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.bursaries.models import Bookmark, Bursary
+from apps.chatbot.models import ChatConversation, ChatMessage
+from apps.dashboard import database
+
+MARKER = 'benchmark-concurrency'
+READS = ('list', 'detail')
+WRITES = ('bookmark', 'view', 'message')
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the database with concurrent threads mixing page reads '
+        'with bookmark, view count and chat message writes, and report '
+        'latency, throughput and lock errors per operation. Compare runs '
+        'with SQLITE_TUNING=False to see what the pragmas buy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=200, help='Operations per thread')
+        parser.add_argument('--write-ratio', type=float, default=0.3)
+        parser.add_argument('--bursaries', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        report = database.pragma_report()
+        if report:
+            self.stdout.write(', '.join(
+                f'{name}={report[name]}' for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size')
+            ))
+        deadline = timezone.now().date() + timedelta(days=30)
+        bursaries = [
+            Bursary.objects.create(
+                title=f'Benchmark Concurrency {i}', slug=f'{MARKER}-{i}', description='-',
+                category='merit', status='active', amount=Decimal('1000'),
+                eligible_education_levels='bachelor', eligible_fields='any', country='Kenya',
+                provider_name='Benchmark', application_deadline=deadline,
+            )
+            for i in range(options['bursaries'])
+        ]
+        users = [
+            User.objects.create_user(username=f'{MARKER}-{i}', password=None)
+            for i in range(options['threads'])
+        ]
+        try:
+            results, elapsed = self.run_load(bursaries, users, options)
+        finally:
+            Bursary.objects.filter(slug__startswith=f'{MARKER}-').delete()
+            User.objects.filter(username__startswith=f'{MARKER}-').delete()
+
+        self.stdout.write(f"{'operation':>10} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} {'locked':>7}")
+        total = 0
+        for name in READS + WRITES:
+            timings, errors, locked = results[name]
+            total += len(timings)
+            if timings:
+                timings.sort()
+                p50 = timings[len(timings) // 2] * 1000
+                p99 = timings[max(0, int(len(timings) * 0.99) - 1)] * 1000
+            else:
+                p50 = p99 = 0
+            self.stdout.write(f'{name:>10} {len(timings):>7} {p50:>9.2f} {p99:>9.2f} {errors:>7} {locked:>7}')
+        self.stdout.write(self.style.SUCCESS(
+            f"{total / elapsed:.1f} operations/s with {options['threads']} threads"
+        ))
+
+    def run_load(self, bursaries, users, options):
+        results = {name: ([], 0, 0) for name in READS + WRITES}
+        lock = threading.Lock()
+
+        def operation(name, rng, user, conversation):
+            bursary = rng.choice(bursaries)
+            if name == 'list':
+                list(Bursary.objects.filter(status='active').order_by('-created_at', '-id')[:20])
+            elif name == 'detail':
+                Bursary.objects.get(slug=bursary.slug)
+                Bookmark.objects.filter(user=user, bursary=bursary).exists()
+            elif name == 'bookmark':
+                with transaction.atomic():
+                    _, created = Bookmark.objects.get_or_create(user=user, bursary=bursary)
+                    if not created:
+                        Bookmark.objects.filter(user=user, bursary=bursary).delete()
+            elif name == 'view':
+                Bursary.objects.filter(pk=bursary.pk).update(views_count=F('views_count') + 1)
+            else:
+                ChatMessage.objects.create(conversation=conversation, sender='user', message=MARKER)
+
+        def worker(index):
+            rng = random.Random(options['seed'] + index)
+            user = users[index]
+            own = {name: ([], 0, 0) for name in READS + WRITES}
+            try:
+                conversation = ChatConversation.objects.create(user=user, session_id=f'{MARKER}-{user.pk}')
+                for _ in range(options['operations']):
+                    name = rng.choice(WRITES if rng.random() < options['write_ratio'] else READS)
+                    timings, errors, locked = own[name]
+                    started = time.perf_counter()
+                    try:
+                        operation(name, rng, user, conversation)
+                    except OperationalError as exc:
+                        own[name] = (timings, errors + 1, locked + ('locked' in str(exc)))
+                        continue
+                    timings.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            with lock:
+                for name, (timings, errors, locked) in own.items():
+                    total = results[name]
+                    results[name] = (total[0] + timings, total[1] + errors, total[2] + locked)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started
@@ -0,0 +1,84 @@
+import csv
+import gc
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from apps.bursaries.models import Bursary
+from apps.dashboard.exports import BURSARY_HEADER, bursary_rows, streaming_csv_response
+
+
+def buffered_export():
+    """The previous export: whole CSV built in an HttpResponse from model instances"""
+    response = HttpResponse(content_type='text/csv')
+    writer = csv.writer(response)
+    writer.writerow(BURSARY_HEADER)
+    for bursary in Bursary.objects.all():
+        writer.writerow([
+            bursary.title, bursary.get_category_display(), bursary.provider_name,
+            bursary.amount, bursary.currency, bursary.application_deadline,
+            bursary.get_status_display(), bursary.views_count, bursary.applications_count,
+            bursary.created_at.strftime('%Y-%m-%d'),
+        ])
+    return len(response.content)
+
+
+def streamed_export(compress=False):
+    response = streaming_csv_response('bench.csv', BURSARY_HEADER, bursary_rows(), compress=compress)
+    return sum(len(chunk) for chunk in response.streaming_content)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure peak Python memory and time of the bursary CSV export on '
+        'synthetic rows. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--skip-buffered', action='store_true',
+                            help='Only measure the streaming export (the buffered one is slow at 1M rows)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>10} {'mode':>10} {'peak MB':>9} {'seconds':>8} {'bytes':>12}")
+        with transaction.atomic():
+            created = 0
+            for size in sorted(options['sizes']):
+                created = self.generate(created, size)
+                modes = [('streamed', streamed_export), ('gzip', lambda: streamed_export(True))]
+                if not options['skip_buffered']:
+                    modes.insert(0, ('buffered', buffered_export))
+                for name, export in modes:
+                    peak, seconds, size_bytes = self.measure(export)
+                    self.stdout.write(f'{size:>10} {name:>10} {peak:>9.1f} {seconds:>8.2f} {size_bytes:>12}')
+            transaction.set_rollback(True)
+
+    def generate(self, start, size, batch_size=5000):
+        deadline = timezone.now().date() + timedelta(days=60)
+        for offset in range(start, size, batch_size):
+            Bursary.objects.bulk_create([
+                Bursary(
+                    title=f'Export Benchmark Bursary {i}', slug=f'benchmark-export-{i}',
+                    description='-', category='merit', status='active', amount=Decimal('2500.00'),
+                    eligible_education_levels='bachelor', eligible_fields='any', country='Kenya',
+                    provider_name='Benchmark Trust', application_deadline=deadline,
+                )
+                for i in range(offset, min(offset + batch_size, size))
+            ])
+        return max(start, size)
+
+    def measure(self, export):
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        size_bytes = export()
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+        return peak, seconds, size_bytes
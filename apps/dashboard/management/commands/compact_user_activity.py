@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.dashboard.rollups import compact_activity
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold UserActivity events older than the retention window into daily '
+        'ActivityAggregate rows and delete them, one day at a time'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', type=int, default=None,
+            help='Raw events to keep, in days (default: ACTIVITY_RETENTION_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        keep_days = options['keep_days']
+        if keep_days is None:
+            keep_days = getattr(settings, 'ACTIVITY_RETENTION_DAYS', 90)
+        before = timezone.localdate() - timedelta(days=keep_days)
+
+        days, removed = compact_activity(before)
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {removed} events from {days} days before {before}.'
+        ))
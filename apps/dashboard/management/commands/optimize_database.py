@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard import database
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh query planner statistics (ANALYZE) and, with --vacuum, '
+        'rebuild the database file to reclaim free pages. Run nightly; '
+        'VACUUM weekly or after large deletes, since it blocks writers '
+        'while it runs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vacuum', action='store_true', help='Also VACUUM')
+        parser.add_argument('--no-analyze', action='store_true', help='Skip ANALYZE')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        before = database.database_size(options['database'])
+        try:
+            steps = database.maintain(
+                options['database'], analyze=not options['no_analyze'], vacuum=options['vacuum'],
+            )
+        except RuntimeError as exc:
+            raise CommandError(exc)
+        for name, seconds in steps:
+            self.stdout.write(f'{name:<11} {seconds * 1000:>9.1f} ms')
+        after = database.database_size(options['database'])
+        if before is not None:
+            self.stdout.write(f'Database size {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB')
+        self.stdout.write(self.style.SUCCESS(f"Database maintenance done ({', '.join(n for n, _ in steps) or 'nothing to do'})."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.dashboard import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the dashboard rollups. Without options: close out finished days, '
+        "refresh today's counts and the metric snapshot (run hourly). "
+        '--daily only closes out finished days (run after midnight).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--daily', action='store_true', help='Only roll up finished days')
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Recompute every day from scratch, e.g. after importing backdated data',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            days = rollups.run_daily(rebuild=True)
+            self.stdout.write(f'Rebuilt {days} days.')
+        if options['daily']:
+            days = rollups.run_daily()
+            self.stdout.write(self.style.SUCCESS(f'Rolled up {days} finished days.'))
+            return
+
+        result = rollups.run_hourly()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {result['days']} days and {result['metrics']} dashboard metrics."
+        ))
@@ -0,0 +1,81 @@
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from apps.dashboard import profiling
+
+logger = logging.getLogger('apps.dashboard.profiling')
+
+
+class ProfilingMiddleware:
+    """
+    Per-request query count, SQL time, cache lookups and wall time
+    Place it first in MIDDLEWARE so the session and auth queries count too.
+    A view over its QUERY_BUDGETS entry is logged as a warning, or raises
+    QueryBudgetExceeded with QUERY_BUDGET_STRICT (used by the test suite).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not getattr(settings, 'REQUEST_PROFILING', True):
+            return self.get_response(request)
+        profile, token, start = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiling.end(token)
+        self._finish(request, response, profile, start)
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'REQUEST_PROFILING', True):
+            return await self.get_response(request)
+        profile, token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiling.end(token)
+        self._finish(request, response, profile, start)
+        return response
+
+    def _start(self):
+        for connection in connections.all(initialized_only=True):
+            profiling.install(connection)
+        profile, token = profiling.begin()
+        return profile, token, time.perf_counter()
+
+    def _finish(self, request, response, profile, start):
+        # Streaming responses are timed up to the first byte
+        duration = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        budget = profiling.query_budget(view_name)
+        over_budget = budget is not None and profile.queries > budget
+
+        profiling.metrics.observe(view_name, response.status_code, profile, duration, over_budget)
+        fields = {
+            'view': view_name,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': profile.queries,
+            'sql_ms': round(profile.sql_time * 1000, 2),
+            'cache_hits': profile.cache_hits,
+            'cache_misses': profile.cache_misses,
+            'duration_ms': round(duration * 1000, 2),
+        }
+        logger.info(' '.join(f'{key}={value}' for key, value in fields.items()), extra={'profile': fields})
+
+        if over_budget:
+            message = f'{view_name} ran {profile.queries} queries (budget {budget})'
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise profiling.QueryBudgetExceeded(message)
+            logger.warning(message, extra={'profile': fields})
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('new_applications', models.IntegerField(default=0)),
+                ('submitted_applications', models.IntegerField(default=0)),
+                ('new_students', models.IntegerField(default=0)),
+                ('new_bursaries', models.IntegerField(default=0)),
+                ('active_users', models.IntegerField(default=0)),
+                ('complete', models.BooleanField(default=False)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Metric',
+                'verbose_name_plural': 'Daily Metrics',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='dashboardmetric',
+            name='key',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='dashboardmetric',
+            name='metric_type',
+            field=models.CharField(choices=[('total_users', 'Total Users'), ('total_bursaries', 'Total Bursaries'), ('total_applications', 'Total Applications'), ('active_users_today', 'Active Users Today'), ('new_applications_today', 'New Applications Today'), ('total_students', 'Total Students'), ('approaching_deadline', 'Bursaries Closing Within 30 Days'), ('complete_profiles', 'Complete Profiles'), ('total_profiles', 'Total Profiles'), ('active_students', 'Active Students'), ('category', 'Active Bursaries by Category'), ('field_of_study', 'Students by Field of Study'), ('bursary_applications', 'Applications per Top Bursary')], max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['timestamp'], name='dashboard_activity_ts_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dashboardmetric',
+            constraint=models.UniqueConstraint(fields=('metric_type', 'key'), name='dashboard_metric_type_key_uniq'),
+        ),
+    ]
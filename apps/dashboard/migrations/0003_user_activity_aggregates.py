@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_daily_metrics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='useractivity',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='ActivityAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('activity_type', models.CharField(blank=True, max_length=20)),
+                ('events', models.IntegerField(default=0)),
+                ('users', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Activity Aggregate',
+                'verbose_name_plural': 'Activity Aggregates',
+                'ordering': ['-date', 'activity_type'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'activity_type'), name='activity_aggregate_day_type_uniq')],
+            },
+        ),
+    ]
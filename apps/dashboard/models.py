@@ -1,29 +1,69 @@
 from django.db import models
+from django.utils import timezone
 from apps.accounts.models import User
 
 
 class DashboardMetric(models.Model):
-    """Model for storing dashboard metrics and analytics"""
+    """
+    Model for storing dashboard metrics and analytics
+    Filled by the rollup jobs (apps.dashboard.rollups). Breakdown metrics
+    have one row per `key` (a category, field of study or bursary id).
+    """
     METRIC_TYPES = (
         ('total_users', 'Total Users'),
         ('total_bursaries', 'Total Bursaries'),
         ('total_applications', 'Total Applications'),
         ('active_users_today', 'Active Users Today'),
         ('new_applications_today', 'New Applications Today'),
+        ('total_students', 'Total Students'),
+        ('approaching_deadline', 'Bursaries Closing Within 30 Days'),
+        ('complete_profiles', 'Complete Profiles'),
+        ('total_profiles', 'Total Profiles'),
+        ('active_students', 'Active Students'),
+        ('category', 'Active Bursaries by Category'),
+        ('field_of_study', 'Students by Field of Study'),
+        ('bursary_applications', 'Applications per Top Bursary'),
     )
     
-    metric_type = models.CharField(max_length=50, choices=METRIC_TYPES, unique=True)
+    metric_type = models.CharField(max_length=50, choices=METRIC_TYPES)
+    key = models.CharField(max_length=255, blank=True, default='')
     value = models.IntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = 'Dashboard Metric'
         verbose_name_plural = 'Dashboard Metrics'
+        constraints = [
+            models.UniqueConstraint(fields=['metric_type', 'key'], name='dashboard_metric_type_key_uniq'),
+        ]
     
     def __str__(self):
+        if self.key:
+            return f"{self.get_metric_type_display()} ({self.key}): {self.value}"
         return f"{self.get_metric_type_display()}: {self.value}"
 
 
+class DailyMetric(models.Model):
+    """Per-day activity counts, filled incrementally by the rollup jobs"""
+    date = models.DateField(unique=True)
+    new_applications = models.IntegerField(default=0)
+    submitted_applications = models.IntegerField(default=0)
+    new_students = models.IntegerField(default=0)
+    new_bursaries = models.IntegerField(default=0)
+    active_users = models.IntegerField(default=0)
+    # The day was over when it was rolled up; the daily job won't revisit it
+    complete = models.BooleanField(default=False)
+    last_updated = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Daily Metric'
+        verbose_name_plural = 'Daily Metrics'
+        ordering = ['date']
+    
+    def __str__(self):
+        return f"{self.date}: {self.new_applications} applications"
+
+
 class UserActivity(models.Model):
     """Model for tracking user activity"""
     ACTIVITY_TYPES = (
@@ -38,12 +78,38 @@ class UserActivity(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities')
     activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPES)
     description = models.TextField(blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens; rows are written later in batches
+    timestamp = models.DateTimeField(default=timezone.now)
     
     class Meta:
         verbose_name = 'User Activity'
         verbose_name_plural = 'User Activities'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='dashboard_activity_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.get_activity_type_display()}"
+
+
+class ActivityAggregate(models.Model):
+    """
+    Daily UserActivity counts kept after the raw events are compacted
+    activity_type '' holds the totals across all types for the day.
+    """
+    date = models.DateField()
+    activity_type = models.CharField(max_length=20, blank=True)
+    events = models.IntegerField(default=0)
+    users = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Activity Aggregate'
+        verbose_name_plural = 'Activity Aggregates'
+        ordering = ['-date', 'activity_type']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'activity_type'], name='activity_aggregate_day_type_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.activity_type or 'all'}: {self.events}"
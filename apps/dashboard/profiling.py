@@ -0,0 +1,197 @@
+# REQUEST PROFILING
+# ProfilingMiddleware measures every request: SQL queries and their time,
+# cache lookups (recommendations, facets, chatbot replies) and wall time,
+# aggregated per view name. The totals are served in the Prometheus text
+# format at dashboard/metrics/ and each request is logged as one logfmt line.
+# QUERY_BUDGETS in settings caps the queries a view may run.
+import contextvars
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the wall time histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries than its QUERY_BUDGETS entry allows"""
+
+
+class RequestProfile:
+    """Counters for one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def begin():
+    """Start profiling the current request; returns (profile, token for end())"""
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def end(token):
+    _current.reset(token)
+
+
+def record_cache_lookup(hit):
+    """Count a cache hit or miss against the request being profiled, if any"""
+    profile = _current.get()
+    if profile is not None:
+        if hit:
+            profile.cache_hits += 1
+        else:
+            profile.cache_misses += 1
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries += 1
+        profile.sql_time += time.perf_counter() - start
+
+
+def install(connection, **kwargs):
+    """Time queries on this connection (idempotent)"""
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+# Connections opened later, e.g. by sync_to_async threads
+connection_created.connect(install, dispatch_uid='request-profiling')
+
+
+class ViewMetrics:
+    """Thread-safe per-view totals for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+    def observe(self, view_name, status, profile, duration, over_budget=False):
+        with self._lock:
+            entry = self.views.get(view_name)
+            if entry is None:
+                entry = self.views[view_name] = {
+                    'requests': 0, 'errors': 0, 'queries': 0, 'sql_seconds': 0.0,
+                    'cache_hits': 0, 'cache_misses': 0, 'seconds': 0.0,
+                    'over_budget': 0, 'buckets': [0] * len(DURATION_BUCKETS),
+                }
+            entry['requests'] += 1
+            entry['errors'] += status >= 500
+            entry['queries'] += profile.queries
+            entry['sql_seconds'] += profile.sql_time
+            entry['cache_hits'] += profile.cache_hits
+            entry['cache_misses'] += profile.cache_misses
+            entry['seconds'] += duration
+            entry['over_budget'] += over_budget
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    entry['buckets'][index] += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {name: {**entry, 'buckets': list(entry['buckets'])} for name, entry in self.views.items()}
+
+
+metrics = ViewMetrics()
+
+
+def query_budget(view_name):
+    """Allowed queries for a view name, or None when it has no budget"""
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _component_stats():
+    """Process-wide counters kept by the caches and the activity writer"""
+    from apps.bursaries import facets, recommendation_cache, vector_index
+    from apps.chatbot import coalescing, context, response_cache, upstream
+    from apps.dashboard import activity
+    from apps.jobs import queue
+
+    components = {
+        'recommendation_cache': recommendation_cache.stats.as_dict(),
+        'facet_cache': facets.stats.as_dict(),
+        'vector_index': vector_index.stats.as_dict(),
+        'chatbot_response_cache': response_cache.stats.as_dict(),
+        'chatbot_context': context.stats.as_dict(),
+        'chatbot_upstream': upstream.metrics.as_dict(),
+        'chatbot_coalescing': coalescing.stats.as_dict(),
+        'jobs': queue.stats.as_dict(),
+    }
+    if activity._recorder is not None:
+        components['activity'] = activity._recorder.stats.as_dict()
+    return components
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    views = metrics.as_dict()
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+
+    for field, name, help_text in [
+        ('requests', 'edu_view_requests_total', 'Requests handled per view'),
+        ('errors', 'edu_view_errors_total', 'Responses with a 5xx status per view'),
+        ('queries', 'edu_view_queries_total', 'SQL queries run per view'),
+        ('sql_seconds', 'edu_view_sql_seconds_total', 'Time spent in SQL per view'),
+        ('cache_hits', 'edu_view_cache_hits_total', 'Application cache hits per view'),
+        ('cache_misses', 'edu_view_cache_misses_total', 'Application cache misses per view'),
+        ('over_budget', 'edu_view_query_budget_exceeded_total', 'Requests over the view query budget'),
+    ]:
+        family(name, 'counter', help_text, [
+            f'{name}{{view="{_label(view)}"}} {entry[field]}' for view, entry in sorted(views.items())
+        ])
+
+    samples = []
+    for view, entry in sorted(views.items()):
+        label = _label(view)
+        for bound, count in zip(DURATION_BUCKETS, entry['buckets']):
+            samples.append(f'edu_view_duration_seconds_bucket{{view="{label}",le="{bound}"}} {count}')
+        samples.append(f'edu_view_duration_seconds_bucket{{view="{label}",le="+Inf"}} {entry["requests"]}')
+        samples.append(f'edu_view_duration_seconds_sum{{view="{label}"}} {entry["seconds"]:.6f}')
+        samples.append(f'edu_view_duration_seconds_count{{view="{label}"}} {entry["requests"]}')
+    family('edu_view_duration_seconds', 'histogram', 'Wall time per view', samples)
+
+    from apps.chatbot import upstream
+    buckets, count, seconds = upstream.metrics.histogram()
+    samples = [f'edu_chatbot_upstream_seconds_bucket{{le="{bound}"}} {n}' for bound, n in buckets]
+    samples += [
+        f'edu_chatbot_upstream_seconds_bucket{{le="+Inf"}} {count}',
+        f'edu_chatbot_upstream_seconds_sum {seconds:.6f}',
+        f'edu_chatbot_upstream_seconds_count {count}',
+    ]
+    family('edu_chatbot_upstream_seconds', 'histogram', 'Latency of each Gemini HTTP attempt', samples)
+
+    for component, values in _component_stats().items():
+        for field, value in values.items():
+            name = f'edu_{component}_{field}'
+            family(name, 'gauge', f'{component} {field.replace("_", " ")}', [f'{name} {value}'])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,248 @@
+# DASHBOARD ROLLUPS
+# Pre-aggregates what DashboardAnalytics shows so dashboard requests read a
+# handful of small rows instead of counting the raw tables. Run
+# `manage.py rollup_dashboard_metrics` hourly and
+# `manage.py rollup_dashboard_metrics --daily` after midnight, and
+# `manage.py compact_user_activity` daily to fold old raw events into
+# ActivityAggregate.
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from apps.accounts.models import User, StudentProfile
+from apps.applications.models import ApplicationStatus
+from apps.bursaries.models import Bursary
+from apps.dashboard.models import ActivityAggregate, DailyMetric, DashboardMetric, UserActivity
+
+DAILY_FIELDS = ['new_applications', 'submitted_applications', 'new_students', 'new_bursaries', 'active_users']
+
+# Days rolled up per batch of grouped queries when catching up
+BACKFILL_WINDOW = 90
+
+TOP_FIELDS = 20
+TOP_BURSARIES = 10
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _counts_by_day(queryset, field, start, end, distinct=None):
+    """{date: count} of rows whose `field` falls on start..end (local dates)"""
+    rows = queryset.filter(**{
+        f'{field}__gte': local_midnight(start),
+        f'{field}__lt': local_midnight(end + timedelta(days=1)),
+    }).order_by().annotate(day=TruncDate(field)).values('day').annotate(
+        total=Count(distinct, distinct=True) if distinct else Count('id')
+    )
+    return {row['day']: row['total'] for row in rows}
+
+
+def rollup_days(start, end):
+    """
+    Recompute the DailyMetric rows for start..end, one grouped query per source
+    Returns: number of days written
+    """
+    if start > end:
+        return 0
+    series = {
+        'new_applications': _counts_by_day(ApplicationStatus.objects, 'created_at', start, end),
+        'submitted_applications': _counts_by_day(ApplicationStatus.objects, 'submitted_at', start, end),
+        'new_students': _counts_by_day(User.objects.filter(user_type='student'), 'date_joined', start, end),
+        'new_bursaries': _counts_by_day(Bursary.objects, 'created_at', start, end),
+        'active_users': _counts_by_day(UserActivity.objects, 'timestamp', start, end, distinct='user'),
+    }
+    # Days whose raw events were compacted
+    series['active_users'].update(ActivityAggregate.objects.filter(
+        activity_type='', date__gte=start, date__lte=end
+    ).values_list('date', 'users'))
+    today = timezone.localdate()
+    rows = []
+    day = start
+    while day <= end:
+        rows.append(DailyMetric(
+            date=day,
+            complete=day < today,
+            **{name: counts.get(day, 0) for name, counts in series.items()}
+        ))
+        day += timedelta(days=1)
+    DailyMetric.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=DAILY_FIELDS + ['complete', 'last_updated'],
+    )
+    return len(rows)
+
+
+def _first_day():
+    """Earliest local date with any activity, or None for an empty database"""
+    firsts = [
+        ApplicationStatus.objects.aggregate(first=Min('created_at'))['first'],
+        User.objects.filter(user_type='student').aggregate(first=Min('date_joined'))['first'],
+        Bursary.objects.aggregate(first=Min('created_at'))['first'],
+        UserActivity.objects.aggregate(first=Min('timestamp'))['first'],
+        ActivityAggregate.objects.aggregate(first=Min('date'))['first'],
+    ]
+    days = [
+        timezone.localdate(value) if isinstance(value, datetime) else value
+        for value in firsts if value is not None
+    ]
+    return min(days) if days else None
+
+
+def run_daily(rebuild=False):
+    """
+    Roll up every finished day not yet marked complete
+    Complete days are never recomputed; rows that appear later with an old
+    timestamp are only picked up by rebuild=True.
+    Returns: number of days written
+    """
+    if rebuild:
+        DailyMetric.objects.all().delete()
+    last_complete = DailyMetric.objects.filter(complete=True).aggregate(last=Max('date'))['last']
+    start = last_complete + timedelta(days=1) if last_complete else _first_day()
+    end = timezone.localdate() - timedelta(days=1)
+    if start is None:
+        return 0
+
+    written = 0
+    while start <= end:
+        window_end = min(start + timedelta(days=BACKFILL_WINDOW - 1), end)
+        written += rollup_days(start, window_end)
+        start = window_end + timedelta(days=1)
+    return written
+
+
+def refresh_snapshot():
+    """Recompute the current-state DashboardMetric rows"""
+    today = timezone.localdate()
+    todays = DailyMetric.objects.filter(date=today).first()
+    profiles = StudentProfile.objects.aggregate(
+        total=Count('id'),
+        complete=Count('id', filter=~(Q(institution='') | Q(gpa__isnull=True))),
+    )
+    students = User.objects.aggregate(
+        total=Count('id'),
+        students=Count('id', filter=Q(user_type='student')),
+    )
+    active_bursaries = Bursary.objects.filter(status='active')
+
+    values = {
+        ('total_users', ''): students['total'],
+        ('total_students', ''): students['students'],
+        ('total_bursaries', ''): active_bursaries.count(),
+        ('total_applications', ''): ApplicationStatus.objects.count(),
+        ('approaching_deadline', ''): active_bursaries.filter(
+            application_deadline__gte=today,
+            application_deadline__lte=today + timedelta(days=30),
+        ).count(),
+        ('active_users_today', ''): todays.active_users if todays else 0,
+        ('new_applications_today', ''): todays.new_applications if todays else 0,
+        ('complete_profiles', ''): profiles['complete'],
+        ('total_profiles', ''): profiles['total'],
+        # Students with applications or bookmarks
+        ('active_students', ''): User.objects.filter(
+            Q(applications__isnull=False) | Q(bookmarks__isnull=False)
+        ).distinct().count(),
+    }
+    for category, count in active_bursaries.order_by().values_list('category').annotate(n=Count('id')):
+        values[('category', category)] = count
+    fields = StudentProfile.objects.order_by().values_list('field_of_study').annotate(n=Count('id'))
+    for field, count in fields.exclude(field_of_study='').order_by('-n')[:TOP_FIELDS]:
+        values[('field_of_study', field[:255])] = count
+    top_bursaries = active_bursaries.filter(applications_count__gt=0).order_by(
+        '-applications_count', 'id'
+    ).values_list('id', 'applications_count')[:TOP_BURSARIES]
+    for bursary_id, count in top_bursaries:
+        values[('bursary_applications', str(bursary_id))] = count
+
+    rows = [
+        DashboardMetric(metric_type=metric_type, key=key, value=value)
+        for (metric_type, key), value in values.items()
+    ]
+    with transaction.atomic():
+        # Drop breakdown keys that no longer appear (e.g. a bursary left the top 10)
+        DashboardMetric.objects.filter(
+            metric_type__in=['category', 'field_of_study', 'bursary_applications']
+        ).delete()
+        DashboardMetric.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['metric_type', 'key'],
+            update_fields=['value', 'last_updated'],
+        )
+    return len(rows)
+
+
+def run_hourly():
+    """
+    Close out finished days, refresh today's row and the snapshot
+    Returns: dict with the number of days and metrics written
+    """
+    days = run_daily()
+    today = timezone.localdate()
+    days += rollup_days(today, today)
+    return {'days': days, 'metrics': refresh_snapshot()}
+
+
+def get_metrics(*metric_types):
+    """
+    Stored metrics as {metric_type: value} for scalars and
+    {metric_type: [(key, value), ...]} (largest first) for breakdowns
+    Builds the snapshot on first use so a fresh install isn't all zeros.
+    """
+    rows = list(DashboardMetric.objects.filter(metric_type__in=metric_types).values_list('metric_type', 'key', 'value'))
+    if not rows and not DashboardMetric.objects.exists():
+        refresh_snapshot()
+        return get_metrics(*metric_types)
+
+    metrics = {}
+    for metric_type, key, value in sorted(rows, key=lambda row: -row[2]):
+        if key:
+            metrics.setdefault(metric_type, []).append((key, value))
+        else:
+            metrics[metric_type] = value
+    return metrics
+
+
+def compact_activity(before):
+    """
+    Fold raw UserActivity rows dated before `before` (a local date) into
+    ActivityAggregate and delete them, one day per transaction
+    Returns: (days compacted, events removed)
+    """
+    days = removed = 0
+    while True:
+        first = UserActivity.objects.filter(
+            timestamp__lt=local_midnight(before)
+        ).aggregate(first=Min('timestamp'))['first']
+        if first is None:
+            return days, removed
+
+        day = timezone.localdate(first)
+        events = UserActivity.objects.filter(
+            timestamp__gte=local_midnight(day),
+            timestamp__lt=local_midnight(day + timedelta(days=1)),
+        )
+        with transaction.atomic():
+            totals = {'': events.aggregate(events=Count('id'), users=Count('user', distinct=True))}
+            for row in events.order_by().values('activity_type').annotate(
+                events=Count('id'), users=Count('user', distinct=True)
+            ):
+                totals[row['activity_type']] = row
+
+            for activity_type, counts in totals.items():
+                # Events backdated into an already compacted day are added on;
+                # their users may then be counted twice
+                aggregate, created = ActivityAggregate.objects.get_or_create(
+                    date=day, activity_type=activity_type,
+                    defaults={'events': counts['events'], 'users': counts['users']},
+                )
+                if not created:
+                    ActivityAggregate.objects.filter(pk=aggregate.pk).update(
+                        events=F('events') + counts['events'], users=F('users') + counts['users']
+                    )
+            removed += events.delete()[0]
+        days += 1
@@ -0,0 +1,8 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+from apps.dashboard.activity import record_activity
+
+
+@receiver(user_logged_in)
+def track_login(sender, request, user, **kwargs):
+    record_activity(user, 'login')
@@ -0,0 +1,196 @@
+# SYNTHETIC DATA
+# Seeded generator for benchmarks: students with profiles, bursaries,
+# applications, bookmarks and chat history in realistic proportions. The
+# same seed and scale always produce the same rows. Rows are bulk inserted,
+# so the derived data the signals would normally maintain (counters,
+# eligibility and search indexes, rollups) is rebuilt afterwards.
+import random
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from apps.accounts.models import StudentProfile, User
+from apps.applications.models import ApplicationStatus
+from apps.bursaries import counters
+from apps.bursaries.models import Bookmark, Bursary, BursaryEligibility
+from apps.bursaries.search import get_search_backend
+from apps.bursaries.similarity import build_similarity
+from apps.chatbot.models import ChatConversation, ChatMessage
+from apps.dashboard import rollups
+
+PREFIX = 'synthetic'
+PASSWORD = 'benchmark'
+
+LEVELS = [choice for choice, _ in StudentProfile.EDUCATION_LEVEL_CHOICES]
+CATEGORIES = [choice for choice, _ in Bursary.CATEGORY_CHOICES]
+APPLICATION_STATUSES = [choice for choice, _ in ApplicationStatus.STATUS_CHOICES]
+FIELDS = [
+    'engineering', 'medicine', 'nursing', 'law', 'education', 'agriculture', 'computer science',
+    'mathematics', 'business', 'accounting', 'architecture', 'music', 'economics', 'journalism',
+]
+COUNTRIES = ['Kenya', 'Uganda', 'Tanzania', 'Ghana', 'Nigeria', 'Rwanda', 'South Africa', 'Ethiopia']
+WORDS = [
+    'women', 'rural', 'orphans', 'disability', 'leadership', 'research', 'climate', 'energy',
+    'health', 'community', 'innovation', 'technology', 'finance', 'teaching', 'excellence',
+]
+PROVIDERS = ['Foundation', 'Trust', 'Ministry', 'Bank', 'University', 'County Government']
+QUESTIONS = [
+    'Which bursaries can I apply for?', 'What documents do I need?', 'When is the deadline?',
+    'Are there bursaries for engineering students?', 'How do I write a cover letter?',
+]
+
+
+@dataclass
+class Dataset:
+    """Ids of the generated rows, for picking benchmark inputs"""
+    students: list = field(default_factory=list)
+    staff: int = None
+    bursaries: list = field(default_factory=list)
+    slugs: list = field(default_factory=list)
+    counts: dict = field(default_factory=dict)
+
+
+def bursary_count(scale):
+    """One bursary per 20 students, between 50 and 50,000"""
+    return min(max(scale // 20, 50), 50000)
+
+
+def generate(scale, seed=42, batch_size=5000, stdout=None):
+    """
+    Insert `scale` students and everything that hangs off them
+    Returns: Dataset
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    today = now.date()
+    password = make_password(PASSWORD)
+    dataset = Dataset()
+
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    # Bursaries
+    total = bursary_count(scale)
+    for offset in range(0, total, batch_size):
+        created = Bursary.objects.bulk_create([
+            Bursary(
+                title=f"{' '.join(rng.sample(WORDS, 2)).title()} {rng.choice(FIELDS).title()} Bursary {i}",
+                slug=f'{PREFIX}-bursary-{i}',
+                description=' '.join(rng.choices(WORDS + FIELDS, k=30)),
+                category=rng.choice(CATEGORIES),
+                status=rng.choices(['active', 'closed', 'pending'], weights=[8, 1, 1])[0],
+                amount=Decimal(rng.randint(5, 500) * 100),
+                eligible_education_levels=', '.join(rng.sample(LEVELS, 2)),
+                eligible_fields=', '.join(rng.sample(FIELDS, 3)),
+                min_gpa=rng.choice([None, Decimal('2.50'), Decimal('3.00'), Decimal('3.50')]),
+                country=rng.choice(COUNTRIES),
+                provider_name=f'{rng.choice(WORDS).title()} {rng.choice(PROVIDERS)}',
+                application_deadline=today + timedelta(days=rng.randint(-30, 180)),
+                views_count=int(rng.paretovariate(1.2) * 10),
+            )
+            for i in range(offset, min(offset + batch_size, total))
+        ], batch_size=batch_size)
+        dataset.bursaries.extend(bursary.pk for bursary in created)
+        dataset.slugs.extend(bursary.slug for bursary in created)
+    log(f'  {total} bursaries')
+
+    staff = User.objects.create(
+        username=f'{PREFIX}-staff', password=password, user_type='admin', is_staff=True,
+    )
+    dataset.staff = staff.pk
+
+    # Students, profiles and their activity, one batch at a time
+    applications = bookmarks = conversations = messages = 0
+    for offset in range(0, scale, batch_size):
+        users = User.objects.bulk_create([
+            User(
+                username=f'{PREFIX}-student-{i}', email=f'student{i}@example.com', password=password,
+                first_name='Student', last_name=str(i), user_type='student',
+                date_joined=now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86399)),
+            )
+            for i in range(offset, min(offset + batch_size, scale))
+        ], batch_size=batch_size)
+        StudentProfile.objects.bulk_create([
+            StudentProfile(
+                user=user, education_level=rng.choice(LEVELS), field_of_study=rng.choice(FIELDS),
+                institution=rng.choice(['University of Nairobi', 'Makerere University', '']),
+                gpa=rng.choice([None, Decimal('2.80'), Decimal('3.20'), Decimal('3.60'), Decimal('3.90')]),
+                country=rng.choice(COUNTRIES), city='City',
+                financial_need=rng.choice(['high', 'medium', 'low']),
+            )
+            for user in users
+        ], batch_size=batch_size)
+
+        rows, marks, chats = [], [], []
+        for user in users:
+            for bursary_id in rng.sample(dataset.bursaries, rng.randint(0, 5)):
+                rows.append(ApplicationStatus(
+                    user=user, bursary_id=bursary_id, cover_letter='-',
+                    status=rng.choice(APPLICATION_STATUSES),
+                ))
+            for bursary_id in rng.sample(dataset.bursaries, rng.randint(0, 3)):
+                marks.append(Bookmark(user=user, bursary_id=bursary_id))
+            if rng.random() < 0.2:
+                chats.append(ChatConversation(user=user, session_id=f'{PREFIX}-{user.pk}'))
+        ApplicationStatus.objects.bulk_create(rows, batch_size=batch_size)
+        Bookmark.objects.bulk_create(marks, batch_size=batch_size)
+        ChatConversation.objects.bulk_create(chats, batch_size=batch_size)
+        chat_messages = []
+        for conversation in chats:
+            for turn in range(rng.randint(1, 4)):
+                chat_messages.append(ChatMessage(conversation=conversation, sender='user', message=rng.choice(QUESTIONS)))
+                chat_messages.append(ChatMessage(conversation=conversation, sender='bot', message='Here is what I found.'))
+        ChatMessage.objects.bulk_create(chat_messages, batch_size=batch_size)
+
+        dataset.students.extend(user.pk for user in users)
+        applications += len(rows)
+        bookmarks += len(marks)
+        conversations += len(chats)
+        messages += len(chat_messages)
+        log(f'  {len(dataset.students)}/{scale} students')
+
+    dataset.counts = {
+        'students': scale, 'bursaries': total, 'applications': applications,
+        'bookmarks': bookmarks, 'conversations': conversations, 'messages': messages,
+    }
+    rebuild_derived(stdout=stdout)
+    return dataset
+
+
+def load():
+    """
+    Dataset for synthetic rows a previous generate() committed
+    Returns: Dataset (empty when there are none)
+    """
+    dataset = Dataset()
+    students = User.objects.filter(username__startswith=f'{PREFIX}-student-')
+    dataset.students = list(students.order_by('pk').values_list('pk', flat=True))
+    dataset.staff = User.objects.filter(username=f'{PREFIX}-staff').values_list('pk', flat=True).first()
+    bursaries = Bursary.objects.filter(slug__startswith=f'{PREFIX}-bursary-').order_by('pk')
+    for pk, slug in bursaries.values_list('pk', 'slug'):
+        dataset.bursaries.append(pk)
+        dataset.slugs.append(slug)
+    dataset.counts = {
+        'students': len(dataset.students),
+        'bursaries': len(dataset.bursaries),
+        'applications': ApplicationStatus.objects.filter(user__in=students).count(),
+        'bookmarks': Bookmark.objects.filter(user__in=students).count(),
+        'conversations': ChatConversation.objects.filter(user__in=students).count(),
+        'messages': ChatMessage.objects.filter(conversation__user__in=students).count(),
+    }
+    return dataset
+
+
+def rebuild_derived(stdout=None):
+    """Recompute what signals keep current for single-row writes"""
+    for counter in counters.COUNTERS:
+        counter.reconcile()
+    BursaryEligibility.rebuild(Bursary.objects.filter(slug__startswith=f'{PREFIX}-'))
+    get_search_backend().rebuild()
+    build_similarity(full=True)
+    rollups.run_daily(rebuild=True)
+    rollups.run_hourly()
+    if stdout is not None:
+        stdout.write('  counters, indexes, similarity and rollups rebuilt')
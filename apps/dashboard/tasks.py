@@ -0,0 +1,41 @@
+from datetime import timedelta
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from apps.dashboard import rollups
+from apps.dashboard.exports import EXPORT_DIR, delete_old_exports, save_export
+from apps.jobs.queue import task
+
+
+@task('dashboard.export_csv', max_attempts=2)
+def export_csv(kind, filename, filters, compress=False):
+    """
+    Write a CSV export to storage (the dashboard export views with ?background=1)
+    `filters` holds the status and ISO from/to dates.
+    Returns: {'filename', 'download_url'}
+    """
+    filters = {
+        'status': filters.get('status'),
+        'date_from': parse_date(filters['date_from']) if filters.get('date_from') else None,
+        'date_to': parse_date(filters['date_to']) if filters.get('date_to') else None,
+    }
+    name = save_export(kind, filename, filters, compress)
+    token, stored_name = name[len(EXPORT_DIR) + 1:].split('/', 1)
+    return {
+        'filename': stored_name,
+        'download_url': reverse('dashboard:download_export', args=[token, stored_name]),
+    }
+
+
+@task('dashboard.purge_exports', priority=-10, every=24 * 3600)
+def purge_exports():
+    """Delete background exports older than JOBS_KEEP_DAYS, like their jobs (jobs.purge)"""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'JOBS_KEEP_DAYS', 7))
+    return {'deleted': delete_old_exports(cutoff)}
+
+
+@task('dashboard.rollup', priority=-5, every=3600)
+def rollup():
+    """What `manage.py rollup_dashboard_metrics` does hourly"""
+    return rollups.run_hourly()
@@ -1,3 +1,434 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from unittest import mock
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import StudentProfile, User
+from apps.applications.models import ApplicationStatus
+from apps.bursaries.models import Bookmark, Bursary
+from apps.bursaries.view_counter import MemoryViewCounter
+from apps.chatbot.models import ChatConversation, ChatMessage
+from apps.jobs.models import Job
+from apps.dashboard import database, profiling, rollups, synthetic
+from apps.dashboard.activity import ActivityRecorder
+from apps.dashboard.analytics import DashboardAnalytics
+from apps.dashboard.models import ActivityAggregate, DailyMetric, UserActivity
+from apps.dashboard.tasks import purge_exports
+
+
+def make_bursary(title, **kwargs):
+    defaults = dict(
+        description='-', category='merit', status='active', amount=Decimal('1000'),
+        eligible_education_levels='bachelor', eligible_fields='any', country='Kenya',
+        provider_name='Provider', application_deadline=timezone.now().date() + timedelta(days=30),
+    )
+    defaults.update(kwargs)
+    return Bursary.objects.create(title=title, **defaults)
+
+
+class CsvExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='x', is_staff=True)
+        cls.active = make_bursary('Active Award')
+        cls.closed = make_bursary('Closed Award', status='closed', category='need')
+        student = User.objects.create_user(
+            username='student', password='x', first_name='Ada', last_name='Obi', email='ada@example.com'
+        )
+        ApplicationStatus.objects.create(user=student, bursary=cls.active, cover_letter='-', status='submitted')
+        ApplicationStatus.objects.create(user=student, bursary=cls.closed, cover_letter='-')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def read_csv(self, response):
+        self.assertFalse(hasattr(response, 'content'))
+        body = b''.join(response.streaming_content)
+        if response['Content-Type'] == 'application/gzip':
+            body = gzip.decompress(body)
+        return list(csv.reader(io.StringIO(body.decode('utf-8'))))
+
+    def test_bursary_export_streams_all_rows(self):
+        rows = self.read_csv(self.client.get(reverse('dashboard:export_bursaries')))
+        self.assertEqual(rows[0][0], 'Title')
+        self.assertEqual([row[0] for row in rows[1:]], ['Active Award', 'Closed Award'])
+        self.assertEqual(rows[2][1], 'Need-Based')
+        self.assertEqual(rows[2][6], 'Closed')
+
+    def test_bursary_export_status_filter(self):
+        rows = self.read_csv(self.client.get(reverse('dashboard:export_bursaries'), {'status': 'closed'}))
+        self.assertEqual([row[0] for row in rows[1:]], ['Closed Award'])
+
+    def test_background_export_is_saved_for_download(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            response = self.client.get(reverse('dashboard:export_bursaries'), {'status': 'closed', 'background': '1'})
+            self.assertEqual(response.status_code, 200)
+            rows = self.read_csv(self.client.get(response.json()['download_url']))
+            self.assertEqual([row[0] for row in rows[1:]], ['Closed Award'])
+            self.client.logout()
+            self.assertEqual(self.client.get(response.json()['download_url']).status_code, 302)
+
+    def test_old_exports_are_deleted(self):
+        url = reverse('dashboard:export_bursaries')
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, JOBS_KEEP_DAYS=7):
+            old = self.client.get(url, {'background': '1'}).json()['download_url']
+            new = self.client.get(url, {'background': '1'}).json()['download_url']
+            token = old.rstrip('/').split('/')[-2]
+            eight_days_ago = time.time() - 8 * 24 * 3600
+            for path in Path(media, 'exports', token).iterdir():
+                os.utime(path, (eight_days_ago, eight_days_ago))
+
+            self.assertEqual(purge_exports(), {'deleted': 1})
+            self.assertFalse(Path(media, 'exports', token).exists())
+            self.assertEqual(self.client.get(old).status_code, 404)
+            self.assertEqual(self.client.get(new).status_code, 200)
+
+    def test_date_filters(self):
+        today = timezone.localdate()
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        url = reverse('dashboard:export_applications')
+        self.assertEqual(len(self.read_csv(self.client.get(url, {'from': today.isoformat()}))), 3)
+        self.assertEqual(len(self.read_csv(self.client.get(url, {'from': tomorrow}))), 1)
+
+    def test_application_export_rows(self):
+        rows = self.read_csv(self.client.get(reverse('dashboard:export_applications'), {'status': 'submitted'}))
+        self.assertEqual(rows[1][:4], ['Ada Obi', 'ada@example.com', 'Active Award', 'Submitted'])
+
+    def test_gzip_export(self):
+        response = self.client.get(reverse('dashboard:export_bursaries'), {'gzip': '1'})
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+        self.assertEqual(len(self.read_csv(response)), 3)
+
+    def test_invalid_filters_rejected(self):
+        url = reverse('dashboard:export_bursaries')
+        self.assertEqual(self.client.get(url, {'from': '2024-13-45'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'to': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'status': 'bogus'}).status_code, 400)
+
+
+class DashboardRollupTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.merit = make_bursary('Merit Award')
+        self.need = make_bursary('Need Award', category='need')
+        make_bursary('Old Award', status='closed')
+        self.students = []
+        for index, (field, gpa) in enumerate([('law', Decimal('3.5')), ('law', None), ('medicine', Decimal('3.0'))]):
+            user = User.objects.create_user(username=f'student{index}', password='x')
+            StudentProfile.objects.create(
+                user=user, education_level='bachelor', field_of_study=field,
+                institution='University', gpa=gpa, country='Kenya', city='City',
+            )
+            self.students.append(user)
+        self.apply(self.students[0], self.merit, days_ago=3)
+        self.apply(self.students[1], self.merit, days_ago=3)
+        self.apply(self.students[0], self.need)
+        Bookmark.objects.create(user=self.students[2], bursary=self.need)
+
+    def apply(self, user, bursary, days_ago=0):
+        application = ApplicationStatus.objects.create(user=user, bursary=bursary, cover_letter='-')
+        if days_ago:
+            ApplicationStatus.objects.filter(pk=application.pk).update(
+                created_at=timezone.now() - timedelta(days=days_ago)
+            )
+        return application
+
+    def test_analytics_read_rollups(self):
+        rollups.run_hourly()
+        analytics = DashboardAnalytics()
+
+        self.assertEqual(analytics.get_overview_stats(), {
+            'total_bursaries': 2, 'total_students': 3, 'total_applications': 3, 'approaching_deadline': 2,
+        })
+        self.assertEqual(analytics.get_student_engagement(), {
+            'complete_profiles': 2, 'total_profiles': 3, 'active_students': 3, 'profile_completion_rate': 66.67,
+        })
+        self.assertCountEqual(analytics.get_category_distribution(), [
+            {'category': 'merit', 'count': 1}, {'category': 'need', 'count': 1},
+        ])
+        self.assertEqual(analytics.get_popular_fields(), [
+            {'field_of_study': 'law', 'count': 2}, {'field_of_study': 'medicine', 'count': 1},
+        ])
+        top = analytics.get_bursary_performance()
+        self.assertEqual([(b.title, b.application_count) for b in top], [('Merit Award', 2), ('Need Award', 1)])
+
+        # Reading the dashboard never touches the raw tables
+        with self.assertNumQueries(6):
+            analytics.get_overview_stats()
+            analytics.get_student_engagement()
+            analytics.get_category_distribution()
+            analytics.get_popular_fields()
+            analytics.get_bursary_performance()
+
+    def test_application_trends_from_daily_rollup(self):
+        rollups.run_hourly()
+        with self.assertNumQueries(1):
+            trends = DashboardAnalytics.get_application_trends(days=30)
+        self.assertEqual(trends, [
+            {'date': self.today - timedelta(days=3), 'count': 2},
+            {'date': self.today, 'count': 1},
+        ])
+
+    def test_daily_job_only_processes_new_days(self):
+        rollups.run_hourly()
+        self.assertTrue(DailyMetric.objects.get(date=self.today - timedelta(days=3)).complete)
+        self.assertFalse(DailyMetric.objects.get(date=self.today).complete)
+        self.assertEqual(rollups.run_daily(), 0)
+
+        # Backdated rows on a finished day wait for a rebuild
+        self.apply(self.students[2], self.merit, days_ago=3)
+        rollups.run_daily()
+        self.assertEqual(DailyMetric.objects.get(date=self.today - timedelta(days=3)).new_applications, 2)
+        rollups.run_daily(rebuild=True)
+        self.assertEqual(DailyMetric.objects.get(date=self.today - timedelta(days=3)).new_applications, 3)
+
+    def test_snapshot_built_on_first_read(self):
+        self.assertEqual(DashboardAnalytics.get_overview_stats()['total_applications'], 3)
+
+
+class ActivityTrackingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='x')
+
+    def test_events_written_in_one_batch(self):
+        recorder = ActivityRecorder(background=False)
+        for _ in range(3):
+            recorder.record(self.user.pk, 'view_bursary')
+        self.assertEqual(UserActivity.objects.count(), 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(recorder.flush(), 3)
+        self.assertEqual(UserActivity.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(recorder.stats.as_dict()['batches'], 1)
+
+    def test_full_queue_drops_events(self):
+        recorder = ActivityRecorder(max_queue=2, background=False)
+        results = [recorder.record(self.user.pk, 'chat') for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual((recorder.stats.enqueued, recorder.stats.dropped), (2, 1))
+
+    def test_views_queue_events_after_commit(self):
+        bursary = make_bursary('Tracked Award')
+        recorder = ActivityRecorder(background=False)
+        self.client.force_login(self.user)
+        with mock.patch('apps.dashboard.activity._recorder', recorder):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.get(reverse('bursaries:toggle_bookmark', args=[bursary.slug]))
+            recorder.flush()
+        self.assertEqual(
+            list(UserActivity.objects.values_list('activity_type', 'description')),
+            [('bookmark', 'Tracked Award')]
+        )
+
+    def test_compaction_keeps_daily_counts(self):
+        other = User.objects.create_user(username='other', password='x')
+        old = timezone.now() - timedelta(days=100)
+        UserActivity.objects.bulk_create([
+            UserActivity(user=self.user, activity_type='login', timestamp=old),
+            UserActivity(user=self.user, activity_type='view_bursary', timestamp=old),
+            UserActivity(user=other, activity_type='view_bursary', timestamp=old),
+            UserActivity(user=other, activity_type='chat'),
+        ])
+
+        days, removed = rollups.compact_activity(timezone.localdate() - timedelta(days=90))
+        self.assertEqual((days, removed), (1, 3))
+        self.assertEqual(UserActivity.objects.count(), 1)
+        day = timezone.localdate(old)
+        self.assertEqual(
+            sorted(ActivityAggregate.objects.filter(date=day).values_list('activity_type', 'events', 'users')),
+            [('', 3, 2), ('login', 1, 1), ('view_bursary', 2, 2)]
+        )
+
+        # Rebuilt rollups still see the compacted day's active users
+        rollups.run_daily(rebuild=True)
+        self.assertEqual(DailyMetric.objects.get(date=day).active_users, 2)
+
+
+class ActivityWriterThreadTests(TransactionTestCase):
+    def test_background_thread_drains_queue(self):
+        user = User.objects.create_user(username='student', password='x')
+        recorder = ActivityRecorder(batch_size=10, flush_interval=0.05)
+        for _ in range(25):
+            recorder.record(user.pk, 'view_bursary')
+
+        deadline = time.monotonic() + 5
+        while recorder.stats.written < 25 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(UserActivity.objects.count(), 25)
+        self.assertGreaterEqual(recorder.stats.batches, 3)
+
+
+class RequestProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='x', is_staff=True)
+        cls.student = User.objects.create_user(username='student', password='x', user_type='student')
+        StudentProfile.objects.create(
+            user=cls.student, education_level='bachelor', field_of_study='law',
+            institution='University', gpa=Decimal('3.5'), country='Kenya', city='City',
+        )
+        cls.bursaries = [make_bursary(f'Award {index}', eligible_fields='law') for index in range(12)]
+        for bursary in cls.bursaries[:3]:
+            ApplicationStatus.objects.create(user=cls.student, bursary=bursary, cover_letter='-')
+            Bookmark.objects.create(user=cls.student, bursary=bursary)
+        conversation = ChatConversation.objects.create(user=cls.student, session_id='budget-session')
+        for index in range(5):
+            ChatMessage.objects.create(conversation=conversation, sender='user', message=f'Question {index}')
+        cls.job = Job.objects.create(name='jobs.purge', user=cls.student)
+
+    def setUp(self):
+        profiling.metrics.reset()
+        # Keep detail page views out of the process-wide buffer flushed at exit
+        counter = mock.patch('apps.bursaries.view_counter._view_counter', MemoryViewCounter(flush_interval=3600))
+        counter.start()
+        self.addCleanup(counter.stop)
+        for alias in ('default', 'recommendations', 'fragments'):
+            caches[alias].clear()
+
+    def budget_requests(self):
+        """One request per QUERY_BUDGETS entry: (view name, signed-in user, url)"""
+        return [
+            ('home', self.student, reverse('home')),
+            ('bursaries:list', self.student, reverse('bursaries:list') + '?category=merit&sort=amount'),
+            ('bursaries:list_api', self.student, reverse('bursaries:list_api')),
+            ('bursaries:detail', self.student, reverse('bursaries:detail', args=[self.bursaries[0].slug])),
+            ('dashboard:home', self.staff, reverse('dashboard:home')),
+            ('chatbot:history', self.student, reverse('chatbot:history', args=['budget-session'])),
+            ('jobs:status', self.student, reverse('jobs:status', args=[self.job.pk])),
+        ]
+
+    def test_views_stay_within_query_budgets(self):
+        rollups.run_hourly()  # the dashboard reads rollups kept fresh by cron
+        requests = self.budget_requests()
+        self.assertEqual({name for name, _, _ in requests}, set(settings.QUERY_BUDGETS))
+        for view_name, user, url in requests:
+            self.client.force_login(user)
+            # Cold caches; QUERY_BUDGET_STRICT turns an overrun into an error
+            with self.subTest(view=view_name), override_settings(QUERY_BUDGET_STRICT=True):
+                self.assertLess(self.client.get(url).status_code, 400)
+                self.assertEqual(profiling.metrics.as_dict()[view_name]['over_budget'], 0)
+
+    def test_over_budget_raises_when_strict(self):
+        url = reverse('bursaries:list')
+        with override_settings(QUERY_BUDGETS={'bursaries:list': 0}, QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(profiling.QueryBudgetExceeded):
+                self.client.get(url)
+        with override_settings(QUERY_BUDGETS={'bursaries:list': 0}, QUERY_BUDGET_STRICT=False):
+            with self.assertLogs('apps.dashboard.profiling', 'WARNING'):
+                self.client.get(url)
+        self.assertEqual(profiling.metrics.as_dict()['bursaries:list']['over_budget'], 2)
+
+    def test_records_queries_cache_lookups_and_logs(self):
+        self.client.force_login(self.student)
+        with self.assertLogs('apps.dashboard.profiling', 'INFO') as logs:
+            self.client.get(reverse('home'))
+            self.client.get(reverse('home'))
+        entry = profiling.metrics.as_dict()['home']
+        self.assertEqual(entry['requests'], 2)
+        self.assertEqual((entry['cache_hits'], entry['cache_misses']), (1, 1))
+        self.assertGreater(entry['queries'], 0)
+        self.assertIn('view=home method=GET status=200 queries=', logs.output[0])
+        self.assertEqual(logs.records[0].profile['view'], 'home')
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('home'))
+        url = reverse('dashboard:metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE edu_view_requests_total counter', body)
+        self.assertIn('edu_view_requests_total{view="home"} 1', body)
+        self.assertIn('edu_view_duration_seconds_bucket{view="home",le="+Inf"} 1', body)
+        self.assertIn('edu_recommendation_cache_hits', body)
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class BenchmarkTests(TestCase):
+    def test_generator_is_seeded(self):
+        first = synthetic.generate(1000, seed=7, batch_size=400)
+        self.assertEqual(first.counts['students'], 1000)
+        self.assertEqual(first.counts['bursaries'], synthetic.bursary_count(1000))
+        # Derived data is rebuilt after the bulk inserts
+        bursary = Bursary.objects.filter(applications__isnull=False).first()
+        self.assertEqual(bursary.applications_count, bursary.applications.count())
+        self.assertTrue(DailyMetric.objects.exists())
+
+        titles = list(Bursary.objects.order_by('pk').values_list('title', flat=True)[:5])
+        Bursary.objects.all().delete()
+        User.objects.all().delete()
+        second = synthetic.generate(1000, seed=7, batch_size=400)
+        self.assertEqual(second.counts, first.counts)
+        self.assertEqual(list(Bursary.objects.order_by('pk').values_list('title', flat=True)[:5]), titles)
+
+    def test_command_writes_json_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/results.json'
+            call_command(
+                'benchmark', scale=1000, requests=3, scenarios=['list', 'detail'], output=path, stdout=io.StringIO(),
+            )
+            with open(path) as handle:
+                report = json.load(handle)
+        self.assertEqual(set(report['scenarios']), {'list', 'detail'})
+        self.assertEqual(set(report['scenarios']['detail']), {
+            'requests', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'queries_mean', 'queries_max', 'throughput_rps',
+        })
+        self.assertIn('sessions', report['profile'])
+        # Synthetic rows are rolled back
+        self.assertFalse(Bursary.objects.exists())
+
+    def test_load_finds_generated_rows(self):
+        generated = synthetic.generate(1000, seed=3)
+        loaded = synthetic.load()
+        self.assertEqual(loaded.counts, generated.counts)
+        self.assertEqual(loaded.students, generated.students)
+        self.assertEqual(loaded.staff, generated.staff)
+
+    def test_threads_need_committed_rows(self):
+        with self.assertRaisesMessage(CommandError, '--threads needs committed rows'):
+            call_command('benchmark', threads=4, stdout=io.StringIO())
+
+
+class DatabaseTuningTests(TransactionTestCase):
+    def test_pragmas_applied_to_new_connections(self):
+        connection.close()
+        report = database.pragma_report()
+        self.assertEqual(report['synchronous'], 1)  # NORMAL
+        self.assertEqual(report['cache_size'], settings.SQLITE_PRAGMAS['cache_size'])
+        self.assertEqual(report['busy_timeout'], settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(report['temp_store'], 2)  # MEMORY
+
+    def test_rejects_unsafe_pragmas(self):
+        with self.assertRaises(ImproperlyConfigured):
+            list(database._statements({'cache_size': '1; DROP TABLE bursaries_bursary'}))
+
+    def test_optimize_command(self):
+        out = io.StringIO()
+        call_command('optimize_database', vacuum=True, stdout=out)
+        self.assertIn('analyze', out.getvalue())
+        self.assertIn('vacuum', out.getvalue())
+
+    def test_maintenance_refuses_to_run_in_a_transaction(self):
+        with transaction.atomic(), self.assertRaisesMessage(CommandError, 'inside a transaction'):
+            call_command('optimize_database', stdout=io.StringIO())
@@ -12,5 +12,7 @@ urlpatterns = [
     path('users/', views.manage_users, name='manage_users'),
     path('export/bursaries/', views.export_bursaries_csv, name='export_bursaries'),
     path('export/applications/', views.export_applications_csv, name='export_applications'),
+    path('export/files/<str:token>/<str:filename>', views.download_export, name='download_export'),
     path('api/chart-data/', views.api_chart_data, name='api_chart_data'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
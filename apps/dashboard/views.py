@@ -4,13 +4,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
-from django.core.paginator import Paginator
-import csv
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
 from datetime import datetime
 
+from apps.dashboard import profiling
 from apps.dashboard.analytics import DashboardAnalytics
+from apps.dashboard.exports import (
+    APPLICATION_HEADER, BURSARY_HEADER, EXPORT_DIR, application_rows, bursary_rows, streaming_csv_response
+)
+from apps.dashboard.tasks import export_csv
+from apps.jobs.models import Job
 from apps.bursaries.models import Bursary
+from apps.bursaries.pagination import KeysetPaginator
 from apps.accounts.models import User
 from apps.applications.models import ApplicationStatus
 
@@ -61,12 +71,9 @@ def manage_bursaries(request):
     if status_filter != 'all':
         bursaries = bursaries.filter(status=status_filter)
     
-    bursaries = bursaries.order_by('-created_at')
-    
-    # Pagination
-    paginator = Paginator(bursaries, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: flat cost for deep pages
+    paginator = KeysetPaginator(bursaries, ('-created_at', '-id'), 20)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -105,12 +112,9 @@ def manage_users(request):
     if user_type != 'all':
         users = users.filter(user_type=user_type)
     
-    users = users.order_by('-date_joined')
-    
-    # Pagination
-    paginator = Paginator(users, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: flat cost for deep pages
+    paginator = KeysetPaginator(users, ('-date_joined', '-id'), 25)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -119,60 +123,92 @@ def manage_users(request):
     
     return render(request, 'dashboard/manage_users.html', context)
 
+def _export_filters(request, status_choices):
+    """
+    Read status / from / to export filters from the query string
+    Returns: (filters dict, error message or None)
+    """
+    status = request.GET.get('status') or None
+    if status and status not in dict(status_choices):
+        return None, f'Unknown status "{status}".'
+
+    filters = {'status': status}
+    for param, key in (('from', 'date_from'), ('to', 'date_to')):
+        value = request.GET.get(param)
+        try:
+            filters[key] = parse_date(value) if value else None
+        except ValueError:
+            filters[key] = None
+        if value and filters[key] is None:
+            return None, f'Invalid "{param}" date, use YYYY-MM-DD.'
+    return filters, None
+
+def _background_export(request, kind, filename, filters):
+    """
+    Queue an export job
+    Returns: 202 JSON with the job's status URL, or the download URL
+    when the export already ran (JOBS_BACKGROUND off)
+    """
+    job = export_csv.enqueue(
+        kind, filename,
+        {key: value.isoformat() if hasattr(value, 'isoformat') else value for key, value in filters.items()},
+        compress=request.GET.get('gzip') == '1',
+        user=request.user,
+    )
+    if job.status == Job.SUCCEEDED:
+        return JsonResponse({'success': True, **job.result})
+    if job.status == Job.FAILED:
+        return JsonResponse({'error': job.error}, status=500)
+    return JsonResponse({
+        'success': True,
+        'job': job.pk,
+        'status_url': reverse('jobs:status', args=[job.pk]),
+        'events_url': reverse('jobs:events', args=[job.pk]),
+    }, status=202)
+
 @staff_member_required
 def export_bursaries_csv(request):
-    """Export bursaries to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="bursaries_{datetime.now().strftime("%Y%m%d")}.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Title', 'Category', 'Provider', 'Amount', 'Currency', 
-        'Deadline', 'Status', 'Views', 'Applications', 'Created'
-    ])
-    
-    bursaries = Bursary.objects.all()
-    
-    for bursary in bursaries:
-        writer.writerow([
-            bursary.title,
-            bursary.get_category_display(),
-            bursary.provider_name,
-            bursary.amount,
-            bursary.currency,
-            bursary.application_deadline,
-            bursary.get_status_display(),
-            bursary.views_count,
-            bursary.applications_count,
-            bursary.created_at.strftime('%Y-%m-%d')
-        ])
-    
-    return response
+    """Export bursaries to CSV (streamed; ?status=, ?from=, ?to=, ?gzip=1, ?background=1)"""
+    filters, error = _export_filters(request, Bursary.STATUS_CHOICES)
+    if error:
+        return HttpResponseBadRequest(error)
+    
+    filename = f'bursaries_{datetime.now().strftime("%Y%m%d")}.csv'
+    if request.GET.get('background') == '1':
+        return _background_export(request, 'bursaries', filename, filters)
+    
+    return streaming_csv_response(
+        filename,
+        BURSARY_HEADER,
+        bursary_rows(**filters),
+        compress=request.GET.get('gzip') == '1',
+    )
 
 @staff_member_required
 def export_applications_csv(request):
-    """Export applications to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="applications_{datetime.now().strftime("%Y%m%d")}.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Student', 'Email', 'Bursary', 'Status', 'Applied Date', 'Updated'
-    ])
-    
-    applications = ApplicationStatus.objects.select_related('user', 'bursary').all()
-    
-    for app in applications:
-        writer.writerow([
-            app.user.get_full_name() or app.user.username,
-            app.user.email,
-            app.bursary.title,
-            app.get_status_display(),
-            app.submitted_at.strftime('%Y-%m-%d %H:%M') if app.submitted_at else 'Not submitted',
-            app.updated_at.strftime('%Y-%m-%d %H:%M')
-        ])
-    
-    return response
+    """Export applications to CSV (streamed; ?status=, ?from=, ?to=, ?gzip=1, ?background=1)"""
+    filters, error = _export_filters(request, ApplicationStatus.STATUS_CHOICES)
+    if error:
+        return HttpResponseBadRequest(error)
+    
+    filename = f'applications_{datetime.now().strftime("%Y%m%d")}.csv'
+    if request.GET.get('background') == '1':
+        return _background_export(request, 'applications', filename, filters)
+    
+    return streaming_csv_response(
+        filename,
+        APPLICATION_HEADER,
+        application_rows(**filters),
+        compress=request.GET.get('gzip') == '1',
+    )
+
+@staff_member_required
+def download_export(request, token, filename):
+    """A file written by a background export"""
+    name = f'{EXPORT_DIR}/{token}/{filename}'
+    if '/' in filename or '..' in name or not default_storage.exists(name):
+        raise Http404('Export not found')
+    return FileResponse(default_storage.open(name), as_attachment=True, filename=filename)
 
 @staff_member_required
 def api_chart_data(request):
@@ -193,4 +229,17 @@ def api_chart_data(request):
     
     return JsonResponse({'data': data})
 
-
+def metrics_view(request):
+    """
+    Request profiling metrics in the Prometheus text format
+    Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; staff can open it
+    in a browser.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if token and constant_time_compare(header, f'Bearer {token}'):
+        authorized = True
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(profiling.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,21 @@
+from django.contrib import admin
+from django.utils import timezone
+from apps.jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'priority', 'attempts', 'run_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'unique_key', 'error']
+    readonly_fields = ['created_at', 'finished_at', 'locked_by', 'locked_until', 'result', 'error']
+    actions = ['retry']
+
+    @admin.action(description='Run the selected jobs again')
+    def retry(self, request, queryset):
+        # Skip jobs whose unique key is already pending again
+        pending_keys = Job.objects.filter(status__in=Job.PENDING, unique_key__isnull=False).values('unique_key')
+        updated = queryset.filter(status=Job.FAILED).exclude(unique_key__in=pending_keys).update(
+            status=Job.QUEUED, run_at=timezone.now(), attempts=0, error='', finished_at=None
+        )
+        self.message_user(request, f'{updated} jobs queued again.')
@@ -0,0 +1,28 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.jobs.queue import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background jobs from the database queue on a pool of threads, and '
+        'queue periodic tasks. Run several for more processes (one per core for '
+        'CPU-bound tasks). SIGINT/SIGTERM finish the jobs in progress, then exit.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, help='Worker threads (default JOBS_WORKER_THREADS)')
+        parser.add_argument('--poll', type=float, help='Seconds between checks when idle (default JOBS_POLL_INTERVAL)')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+        parser.add_argument('--no-schedule', action='store_true', help="Don't queue periodic tasks")
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'], poll_interval=options['poll'],
+                        schedule=not options['no_schedule'])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+        self.stdout.write(f'Worker {worker.id} running {worker.threads} threads.')
+        worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS('Worker stopped.'))
@@ -0,0 +1,71 @@
+from django.db import models
+from django.utils import timezone
+from apps.accounts.models import User
+
+
+class Job(models.Model):
+    """A unit of background work, run by `manage.py runworker` (see apps.jobs.queue)"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+    PENDING = (QUEUED, RUNNING)
+
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(default=0)  # Higher runs first
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # At most one pending job per key, e.g. one recommendation refresh per user
+    unique_key = models.CharField(max_length=200, null=True, blank=True)
+    # Who may poll the job; None for system jobs
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    # Worker holding the job, until locked_until; after that another may take it over
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Claiming: next due job by priority
+            models.Index(fields=['status', '-priority', 'run_at', 'id'], name='job_claim_idx'),
+            models.Index(fields=['status', 'finished_at'], name='job_finished_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unique_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='job_unique_pending_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def as_dict(self):
+        """What the status endpoints report"""
+        return {
+            'id': self.pk,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': self.result,
+            'error': self.error,
+        }
@@ -0,0 +1,346 @@
+# JOB QUEUE
+# Background work kept in the database (Job), so no broker is needed. Tasks
+# are functions registered with @task in an app's tasks.py and called with
+# JSON-serializable arguments. `manage.py runworker` runs due jobs, highest
+# priority first, on a pool of threads; start more workers for more
+# processes. A worker claims a job with a conditional UPDATE, so any number
+# of them can share the table, and holds it for JOBS_LEASE_SECONDS: a job
+# whose worker died is taken over when the lease runs out. Failed jobs are
+# retried with exponential backoff up to the task's max_attempts, except
+# for JobError, which fails the job at once. Tasks with `every` are queued
+# periodically by the workers. With JOBS_BACKGROUND off, enqueue() runs the
+# job at once in the calling process instead (development and tests).
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, OperationalError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from apps.jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+GENERIC_ERROR = 'The task failed. Please try again later.'
+
+# Seconds between the workers' checks for periodic tasks that are due
+SCHEDULE_INTERVAL = 10
+
+
+class JobError(Exception):
+    """Fails the job without retrying; str() is stored as its error and shown to the user"""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class JobStats:
+    """Thread-safe job outcome counts for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.enqueued = 0
+            self.inline = 0
+            self.succeeded = 0
+            self.failed = 0
+            self.retried = 0
+
+    def record(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'enqueued': self.enqueued,
+                'inline': self.inline,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'retried': self.retried,
+            }
+
+
+stats = JobStats()
+
+
+class Task:
+    """A registered task; call it directly, or enqueue() it to run in a worker"""
+
+    def __init__(self, fn, name, priority=0, max_attempts=3, every=None):
+        self.fn = fn
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.every = every
+        self.__doc__ = fn.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.fn(*args, **kwargs)
+
+    def enqueue(self, *args, user=None, priority=None, run_at=None, delay=None, unique_key=None, **kwargs):
+        return enqueue(
+            self.name, args, kwargs, user=user, priority=priority,
+            run_at=run_at, delay=delay, unique_key=unique_key,
+        )
+
+
+_registry = {}
+
+
+def task(name, priority=0, max_attempts=3, every=None):
+    """
+    Register a function as a task
+    `every` (seconds) also queues it periodically while workers run.
+    """
+    def register(fn):
+        _registry[name] = Task(fn, name, priority, max_attempts, every)
+        return _registry[name]
+    return register
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f'No task named "{name}"') from None
+
+
+def background():
+    return _setting('JOBS_BACKGROUND', False)
+
+
+def enqueue(name, args=(), kwargs=None, user=None, priority=None, run_at=None, delay=None, unique_key=None):
+    """
+    Queue a job, or with JOBS_BACKGROUND off run it now
+    With unique_key, a pending job with the same key is returned instead of
+    queueing another. Jobs run now ignore run_at and delay, and aren't saved.
+    Returns: Job
+    """
+    task = get_task(name)
+    job = Job(
+        name=name,
+        # Through JSON either way, so tasks see the same arguments inline and in a worker
+        args=json.loads(json.dumps(list(args))),
+        kwargs=json.loads(json.dumps(kwargs or {})),
+        user=user,
+        priority=task.priority if priority is None else priority,
+        max_attempts=task.max_attempts,
+        unique_key=unique_key,
+    )
+    if not background():
+        stats.record('inline')
+        job.attempts = 1
+        result, error, _ = _call(job)
+        job.status, job.result, job.error = (Job.FAILED, None, error) if error else (Job.SUCCEEDED, result, '')
+        job.finished_at = timezone.now()
+        stats.record('failed' if error else 'succeeded')
+        return job
+
+    if delay:
+        run_at = timezone.now() + timedelta(seconds=delay)
+    if run_at:
+        job.run_at = run_at
+    return _insert(job)
+
+
+def _insert(job):
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        existing = Job.objects.filter(unique_key=job.unique_key, status__in=Job.PENDING).first()
+        if job.unique_key is None or existing is None:
+            raise
+        return existing
+    stats.record('enqueued')
+    return job
+
+
+def _call(job):
+    """
+    Run a job's task
+    Returns: (result, error message or None, whether to retry)
+    """
+    try:
+        result = get_task(job.name).fn(*job.args, **job.kwargs)
+        json.dumps(result)
+        return result, None, False
+    except JobError as exc:
+        return None, str(exc) or GENERIC_ERROR, False
+    except Exception:
+        # Details only in the log: the error is shown to whoever polls the job
+        logger.exception('Job %s #%s failed (attempt %s)', job.name, job.pk, job.attempts)
+        return None, GENERIC_ERROR, True
+
+
+def backoff(attempt):
+    """Seconds before retry number `attempt` (1-based), jittered"""
+    delay = min(_setting('JOBS_RETRY_BACKOFF_MAX', 3600), _setting('JOBS_RETRY_BACKOFF', 5) * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _due(now):
+    """Queued jobs that are due, and running ones whose worker's lease ran out"""
+    return Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+
+
+def claim(worker_id):
+    """
+    Take the next due job, highest priority first
+    Returns: Job, or None when nothing is due
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=_setting('JOBS_LEASE_SECONDS', 600))
+    candidates = Job.objects.filter(_due(now)).order_by('-priority', 'run_at', 'id').values_list('pk', flat=True)
+    for pk in candidates[:5]:
+        # Only one worker's update matches; the others try the next candidate
+        if Job.objects.filter(_due(now), pk=pk).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_until=lease, attempts=F('attempts') + 1,
+        ):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def _record(queryset, **fields):
+    """update() that rides out brief lock contention; a lost outcome would run the job again"""
+    for attempt in range(5):
+        try:
+            return queryset.update(**fields)
+        except OperationalError:
+            if attempt == 4:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def process(job, worker_id):
+    """Run a claimed job and record the outcome, unless another worker took it over meanwhile"""
+    if job.attempts > job.max_attempts:
+        # Its earlier workers died while running it
+        result, error, retry = None, GENERIC_ERROR, False
+    else:
+        result, error, retry = _call(job)
+    now = timezone.now()
+    owned = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=worker_id)
+    if error is None:
+        job.status, updated = Job.SUCCEEDED, _record(
+            owned, status=Job.SUCCEEDED, result=result, error='', finished_at=now, locked_until=None,
+        )
+    elif retry and job.attempts < job.max_attempts:
+        job.status, updated = Job.QUEUED, _record(
+            owned, status=Job.QUEUED, error=error, locked_until=None,
+            run_at=now + timedelta(seconds=backoff(job.attempts)),
+        )
+    else:
+        job.status, updated = Job.FAILED, _record(
+            owned, status=Job.FAILED, error=error, finished_at=now, locked_until=None,
+        )
+    if not updated:
+        logger.warning('Job %s #%s outlived its lease; its outcome was dropped', job.name, job.pk)
+        return job
+    stats.record({Job.SUCCEEDED: 'succeeded', Job.QUEUED: 'retried', Job.FAILED: 'failed'}[job.status])
+    return job
+
+
+def run_next(worker_id='inline'):
+    """
+    Claim and run one due job in the calling thread
+    Returns: the Job, or None when nothing is due
+    """
+    job = claim(worker_id)
+    if job is not None:
+        process(job, worker_id)
+    return job
+
+
+def schedule_periodic():
+    """
+    Queue the next run of each periodic task without a pending one
+    The next run is `every` seconds after the last one finished.
+    Returns: number of jobs queued
+    """
+    periodic = {f'periodic:{t.name}': t for t in _registry.values() if t.every}
+    pending = set(Job.objects.filter(unique_key__in=periodic, status__in=Job.PENDING).values_list('unique_key', flat=True))
+    queued = 0
+    for key, task in periodic.items():
+        if key in pending:
+            continue
+        last = Job.objects.filter(name=task.name, unique_key=key).order_by('-finished_at').values_list(
+            'finished_at', flat=True
+        ).first()
+        run_at = last + timedelta(seconds=task.every) if last else timezone.now()
+        _insert(Job(name=task.name, priority=task.priority, max_attempts=task.max_attempts,
+                    unique_key=key, run_at=run_at))
+        queued += 1
+    return queued
+
+
+class Worker:
+    """Runs due jobs on a pool of threads until stop() is called"""
+
+    def __init__(self, threads=None, poll_interval=None, schedule=True):
+        self.threads = threads or _setting('JOBS_WORKER_THREADS', 4)
+        self.poll_interval = poll_interval or _setting('JOBS_POLL_INTERVAL', 1.0)
+        self.schedule = schedule
+        self.id = f'{socket.gethostname()}:{os.getpid()}'
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """Finish the jobs in progress, then return from run()"""
+        self._stopping.set()
+
+    def run(self, burst=False):
+        """Work until stop(); with burst, return once no job is due"""
+        pool = [
+            threading.Thread(target=self._work, args=(f'{self.id}/{index}', burst), name=f'jobs-{index}', daemon=True)
+            for index in range(self.threads)
+        ]
+        if self.schedule:
+            self._schedule()
+        for thread in pool:
+            thread.start()
+        scheduled_at = time.monotonic()
+        try:
+            while any(thread.is_alive() for thread in pool):
+                if self.schedule and time.monotonic() - scheduled_at >= SCHEDULE_INTERVAL:
+                    self._schedule()
+                    scheduled_at = time.monotonic()
+                self._stopping.wait(self.poll_interval)
+        finally:
+            self.stop()
+            for thread in pool:
+                thread.join()
+            connection.close()
+
+    def _schedule(self):
+        try:
+            schedule_periodic()
+        except DatabaseError:
+            logger.exception('Scheduling periodic jobs failed')
+
+    def _work(self, worker_id, burst):
+        try:
+            while not self._stopping.is_set():
+                close_old_connections()
+                try:
+                    job = run_next(worker_id)
+                except DatabaseError as exc:
+                    # E.g. lock contention; a job left running is taken over when its lease ends
+                    logger.warning('Job worker %s: database error: %s', worker_id, exc)
+                    self._stopping.wait(self.poll_interval)
+                    continue
+                if job is None:
+                    if burst:
+                        return
+                    self._stopping.wait(self.poll_interval)
+        finally:
+            connection.close()
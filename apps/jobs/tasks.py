@@ -0,0 +1,13 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from apps.jobs.models import Job
+from apps.jobs.queue import task
+
+
+@task('jobs.purge', priority=-10, every=24 * 3600)
+def purge():
+    """Delete finished jobs older than JOBS_KEEP_DAYS"""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'JOBS_KEEP_DAYS', 7))
+    deleted, _ = Job.objects.filter(status__in=[Job.SUCCEEDED, Job.FAILED], finished_at__lt=cutoff).delete()
+    return {'deleted': deleted}
@@ -0,0 +1,171 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.jobs import queue
+from apps.jobs.models import Job
+from apps.jobs.queue import JobError, task
+
+calls = []
+
+
+@task('tests.add')
+def add(a, b):
+    calls.append(('add', a, b))
+    return a + b
+
+
+@task('tests.flaky', max_attempts=2)
+def flaky():
+    calls.append(('flaky',))
+    raise RuntimeError('secret connection string')
+
+
+@task('tests.refuse')
+def refuse():
+    raise JobError('Nothing to export.')
+
+
+@task('tests.tick', every=60)
+def tick():
+    return 'tick'
+
+
+@override_settings(JOBS_BACKGROUND=True, JOBS_RETRY_BACKOFF=10)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        queue.stats.reset()
+
+    def test_enqueued_job_runs_in_a_worker(self):
+        job = add.enqueue(2, 3)
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(calls, [])
+
+        self.assertEqual(queue.run_next().pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts), (Job.SUCCEEDED, 5, 1))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(queue.run_next())
+
+    def test_priority_then_age_order(self):
+        low = add.enqueue(1, 1, priority=-1)
+        first = add.enqueue(2, 2)
+        second = add.enqueue(3, 3)
+        high = add.enqueue(4, 4, priority=5)
+        order = [queue.run_next().pk for _ in range(4)]
+        self.assertEqual(order, [high.pk, first.pk, second.pk, low.pk])
+
+    def test_scheduled_job_waits_until_due(self):
+        job = add.enqueue(1, 2, delay=60)
+        self.assertIsNone(queue.run_next())
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(queue.run_next().pk, job.pk)
+
+    def test_failures_are_retried_with_backoff_then_fail(self):
+        job = flaky.enqueue()
+        with self.assertLogs('apps.jobs.queue', 'ERROR'):
+            queue.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=4))
+        # Details stay in the log
+        self.assertEqual(job.error, queue.GENERIC_ERROR)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('apps.jobs.queue', 'ERROR'):
+            queue.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(queue.stats.as_dict()['retried'], 1)
+
+    def test_job_error_fails_at_once_with_its_message(self):
+        job = refuse.enqueue()
+        queue.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (Job.FAILED, 1, 'Nothing to export.'))
+
+    def test_unique_key_keeps_one_pending_job(self):
+        job = add.enqueue(1, 1, unique_key='sum')
+        self.assertEqual(add.enqueue(2, 2, unique_key='sum').pk, job.pk)
+        queue.run_next()
+        self.assertNotEqual(add.enqueue(2, 2, unique_key='sum').pk, job.pk)
+
+    def test_expired_lease_is_taken_over(self):
+        job = add.enqueue(1, 1)
+        self.assertEqual(queue.claim('dead-worker').pk, job.pk)
+        self.assertIsNone(queue.claim('other'))
+
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        queue.run_next('other')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.SUCCEEDED, 2, 'other'))
+
+    def test_periodic_tasks_are_queued_once(self):
+        self.assertGreaterEqual(queue.schedule_periodic(), 1)
+        pending = Job.objects.filter(name='tests.tick', status=Job.QUEUED)
+        self.assertEqual(pending.count(), 1)
+        queue.schedule_periodic()
+        self.assertEqual(pending.count(), 1)
+
+        Job.objects.exclude(name='tests.tick').delete()
+        queue.run_next()
+        finished = Job.objects.get(name='tests.tick')
+        queue.schedule_periodic()
+        following = Job.objects.get(name='tests.tick', status=Job.QUEUED)
+        self.assertEqual(following.run_at, finished.finished_at + timedelta(seconds=60))
+
+    @override_settings(JOBS_BACKGROUND=False)
+    def test_runs_inline_without_background_jobs(self):
+        job = add.enqueue(2, 5)
+        self.assertIsNone(job.pk)
+        self.assertEqual((job.status, job.result), (Job.SUCCEEDED, 7))
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(refuse.enqueue().error, 'Nothing to export.')
+
+
+@override_settings(JOBS_BACKGROUND=True, JOBS_POLL_INTERVAL=0.01)
+class JobStatusViewTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='x')
+        self.job = add.enqueue(1, 2, user=self.owner)
+
+    def test_owner_polls_status(self):
+        self.client.force_login(self.owner)
+        url = reverse('jobs:status', args=[self.job.pk])
+        self.assertEqual(self.client.get(url).json()['status'], Job.QUEUED)
+        queue.run_next()
+        self.assertEqual(self.client.get(url).json()['result'], 3)
+
+    def test_other_users_get_404(self):
+        self.client.force_login(User.objects.create_user(username='other', password='x'))
+        self.assertEqual(self.client.get(reverse('jobs:status', args=[self.job.pk])).status_code, 404)
+
+    def test_events_stream_until_finished(self):
+        queue.run_next()
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('jobs:events', args=[self.job.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('event: status', body)
+        self.assertIn('"status": "succeeded"', body)
+        self.assertTrue(body.rstrip().startswith('event: status') and 'event: done' in body)
+
+
+@override_settings(JOBS_BACKGROUND=True)
+class WorkerPoolTests(TransactionTestCase):
+    def test_threads_share_the_queue_without_running_a_job_twice(self):
+        calls.clear()
+        jobs = [add.enqueue(i, i) for i in range(20)]
+        # The in-memory test database reports contention between threads as errors
+        with mock.patch.object(queue, 'logger'):
+            queue.Worker(threads=4, poll_interval=0.01, schedule=False).run(burst=True)
+        self.assertEqual(
+            set(Job.objects.filter(pk__in=[job.pk for job in jobs]).values_list('status', flat=True)),
+            {Job.SUCCEEDED},
+        )
+        self.assertEqual(len(calls), 20)
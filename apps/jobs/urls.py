@@ -0,0 +1,9 @@
+from django.urls import path
+from apps.jobs import views
+
+app_name = 'jobs'
+
+urlpatterns = [
+    path('<int:job_id>/', views.job_status, name='status'),
+    path('<int:job_id>/events/', views.job_events, name='events'),
+]
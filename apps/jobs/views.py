@@ -0,0 +1,51 @@
+import json
+import time
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from apps.jobs.models import Job
+
+
+def _get_job(request, job_id):
+    """The job, if it belongs to the user (staff see every job)"""
+    job = Job.objects.filter(pk=job_id).first()
+    if job is None or not (job.user_id == request.user.pk or request.user.is_staff):
+        raise Http404('Job not found')
+    return job
+
+
+@login_required
+def job_status(request, job_id):
+    """Poll a job: status, result and error"""
+    return JsonResponse(_get_job(request, job_id).as_dict())
+
+
+@login_required
+def job_events(request, job_id):
+    """
+    Follow a job as server-sent events
+    A `status` event on each change, then `done` once the job has finished
+    (or after JOBS_EVENTS_TIMEOUT seconds; reconnect to keep following).
+    Holds a worker thread while open, so prefer polling under WSGI.
+    """
+    job = _get_job(request, job_id)
+    interval = getattr(settings, 'JOBS_POLL_INTERVAL', 1.0)
+    deadline = time.monotonic() + getattr(settings, 'JOBS_EVENTS_TIMEOUT', 60)
+
+    def events():
+        last = None
+        while True:
+            state = job.as_dict()
+            if state != last:
+                yield f"event: status\ndata: {json.dumps(state)}\n\n"
+                last = state
+            if job.finished or time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
+            job.refresh_from_db()
+        yield f"event: done\ndata: {json.dumps({'id': job.pk, 'status': job.status})}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
@@ -34,9 +34,11 @@ INSTALLED_APPS = [
     'apps.applications',
     'apps.chatbot',
     'apps.dashboard',
+    'apps.jobs',
 ]
 
 MIDDLEWARE = [
+    'apps.dashboard.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -53,8 +55,16 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ] if config('TEMPLATE_CACHE', default=True, cast=bool) else [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -67,26 +77,56 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
-# # Database
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': config('DB_NAME', default='bursary_db'),
-#         'USER': config('DB_USER', default='postgres'),
-#         'PASSWORD': config('DB_PASSWORD', default='password'),
-#         'HOST': config('DB_HOST', default='localhost'),
-#         'PORT': config('DB_PORT', default='5432'),
-#     }
-# }
-
-# For development, you can use SQLite:
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database: PostgreSQL with DB_ENGINE=postgresql, otherwise SQLite
+# Connections are kept for DB_CONN_MAX_AGE seconds instead of being opened
+# per request, and checked before reuse.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='bursary_db'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default='password'),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'connect_timeout': 5},
+        }
     }
-}
+else:
+    # Single-node deployments: IMMEDIATE transactions take the write lock
+    # up front, so they wait on the busy timeout instead of failing on a
+    # lock upgrade. SQLITE_PRAGMAS below does the rest.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+            },
+        }
+    }
+
+# Pragmas run on every new SQLite connection (apps.dashboard.database).
+# WAL lets readers run alongside the writer and synchronous=NORMAL is
+# durable in WAL mode. cache_size is negative KiB. SQLITE_TUNING=False
+# keeps SQLite's defaults, e.g. to benchmark against them.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int) * 1000,
+    'cache_size': -config('SQLITE_CACHE_KB', default=65536, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=268435456, cast=int),
+    'temp_store': 'MEMORY',
+} if config('SQLITE_TUNING', default=True, cast=bool) else {}
 
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
@@ -141,6 +181,7 @@ LOGOUT_REDIRECT_URL = 'home'
 # fall back to python-decouple's config default.
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY') 
 CHATBOT_MODEL = os.getenv('CHATBOT_MODEL') 
+GOOGLE_API_BASE_URL = os.getenv('GOOGLE_API_BASE_URL', 'https://generativelanguage.googleapis.com/v1')
 
 # # Security Settings (Production)
 if not DEBUG:
@@ -160,13 +201,167 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880
 # Pagination
 ITEMS_PER_PAGE = 12
 
-# Cache (optional - for production)
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-#         'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
-#     }
-# }
+# Bursary view counting: 'memory' buffers per process and flushes itself;
+# 'cache' buffers in the shared cache and needs `manage.py flush_view_counts`
+# to run periodically (e.g. from cron)
+VIEW_COUNTER_BACKEND = config('VIEW_COUNTER_BACKEND', default='memory')
+VIEW_COUNTER_FLUSH_INTERVAL = 10  # seconds
+VIEW_COUNTER_MAX_PENDING = 500
+
+# User activity tracking: events are queued in memory and written by a
+# background thread in batches; when the queue is full new events are dropped
+ACTIVITY_TRACKING = config('ACTIVITY_TRACKING', default=True, cast=bool)
+ACTIVITY_BATCH_SIZE = 500
+ACTIVITY_FLUSH_INTERVAL = 2  # seconds
+ACTIVITY_MAX_QUEUE = 10000
+# Raw events older than this are folded into daily aggregates by
+# `manage.py compact_user_activity`
+ACTIVITY_RETENTION_DAYS = config('ACTIVITY_RETENTION_DAYS', default=90, cast=int)
+
+# Request profiling (apps.dashboard.profiling). Metrics are served at
+# dashboard/metrics/ to staff or to "Authorization: Bearer <METRICS_TOKEN>"
+REQUEST_PROFILING = config('REQUEST_PROFILING', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Most queries a view may run, by URL name. Over budget is a logged warning,
+# or an error with QUERY_BUDGET_STRICT, which config.test_settings turns on
+# so any test that pushes a view over its budget fails
+QUERY_BUDGETS = {
+    # Signed-in user, cold application caches, session served from the cache
+    'home': 6,
+    'bursaries:list': 3,
+    'bursaries:list_api': 2,
+    'bursaries:detail': 4,
+    'dashboard:home': 7,
+    'chatbot:history': 3,
+    'jobs:status': 3,
+}
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+
+# Full-text search backend for bursaries. Picked from the database engine
+# (SQLite FTS5 / PostgreSQL tsvector) unless set to a dotted class path, e.g.
+# 'apps.bursaries.search.SimpleSearchBackend'
+BURSARY_SEARCH_BACKEND = config('BURSARY_SEARCH_BACKEND', default='') or None
+
+# Caches: per-process local memory, or one Redis-compatible server shared by
+# every worker when REDIS_URL is set (needs the redis package)
+REDIS_URL = config('REDIS_URL', default='')
+
+
+def cache_settings(name, max_entries=None):
+    if REDIS_URL:
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': name,
+        }
+    options = {'MAX_ENTRIES': max_entries} if max_entries else {}
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': name,
+        'OPTIONS': options,
+    }
+
+
+CACHES = {
+    'default': cache_settings('default'),
+    # Per-student recommendations; locmem evicts least recently used entries
+    'recommendations': cache_settings('recommendations', max_entries=5000),
+    # Chatbot replies to repeated questions
+    'chatbot': cache_settings('chatbot', max_entries=5000),
+}
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+
+# Rendered template fragments (apps.bursaries.fragment_cache): 'locmem',
+# 'file' or 'redis' (any Redis-compatible server; needs the redis package).
+# Use file or redis when several worker processes should share fragments.
+FRAGMENT_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'fragments'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache' / 'fragments')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', REDIS_URL or 'redis://127.0.0.1:6379/2'),
+}
+FRAGMENT_CACHE_BACKEND = config('FRAGMENT_CACHE_BACKEND', default='redis' if REDIS_URL else 'locmem')
+CACHES['fragments'] = {
+    'BACKEND': FRAGMENT_CACHE_BACKENDS[FRAGMENT_CACHE_BACKEND][0],
+    'LOCATION': config('FRAGMENT_CACHE_LOCATION', default=FRAGMENT_CACHE_BACKENDS[FRAGMENT_CACHE_BACKEND][1]),
+    'KEY_PREFIX': 'fragments',
+}
+FRAGMENT_CACHE_ALIAS = 'fragments'
+FRAGMENT_CACHE_TIMEOUT = 600  # seconds
+
+# Bursary list filter counts, cached per filter combination
+FACET_CACHE_ALIAS = 'default'
+FACET_CACHE_TIMEOUT = 300  # seconds
+
+RECOMMENDATION_CACHE_ALIAS = 'recommendations'
+RECOMMENDATION_CACHE_TIMEOUT = 900  # seconds
+
+# Where the "similar students applied" score comes from: 'offline' reads the
+# table built by `manage.py build_bursary_similarity`, 'live' queries
+# ApplicationStatus on every request
+RECOMMENDATION_PATTERN_SOURCE = config('RECOMMENDATION_PATTERN_SOURCE', default='offline')
+
+# Chatbot response cache (first message of a conversation only)
+CHATBOT_RESPONSE_CACHE = config('CHATBOT_RESPONSE_CACHE', default=True, cast=bool)
+CHATBOT_CACHE_ALIAS = 'chatbot'
+CHATBOT_CACHE_TIMEOUT = 3600  # seconds
+# Reuse the reply to an earlier, differently worded question with the same
+# content words when the word overlap (cosine, 0-1) reaches this; 0 (the
+# default) disables near-duplicate matching
+CHATBOT_CACHE_SIMILARITY_THRESHOLD = config('CHATBOT_CACHE_SIMILARITY_THRESHOLD', default=0.0, cast=float)
+
+# Conversation context sent upstream each turn (apps.chatbot.context), in
+# estimated tokens: recent messages up to CHATBOT_CONTEXT_TOKENS including
+# the summary of older ones, which is capped at CHATBOT_SUMMARY_TOKENS
+CHATBOT_CONTEXT_TOKENS = config('CHATBOT_CONTEXT_TOKENS', default=1500, cast=int)
+CHATBOT_SUMMARY_TOKENS = config('CHATBOT_SUMMARY_TOKENS', default=300, cast=int)
+
+# Gemini HTTP client (apps.chatbot.upstream): concurrent calls per process,
+# seconds to wait for a free slot, retries on 429/5xx with backoff from
+# CHATBOT_RETRY_BACKOFF doubling up to CHATBOT_RETRY_BACKOFF_MAX, and the
+# circuit breaker (failures in a row to open, seconds before a trial call)
+CHATBOT_MAX_CONCURRENCY = config('CHATBOT_MAX_CONCURRENCY', default=8, cast=int)
+CHATBOT_SLOT_TIMEOUT = config('CHATBOT_SLOT_TIMEOUT', default=10, cast=float)
+CHATBOT_HTTP_TIMEOUT = config('CHATBOT_HTTP_TIMEOUT', default=30, cast=float)
+CHATBOT_HTTP_RETRIES = config('CHATBOT_HTTP_RETRIES', default=2, cast=int)
+CHATBOT_RETRY_BACKOFF = config('CHATBOT_RETRY_BACKOFF', default=0.5, cast=float)
+CHATBOT_RETRY_BACKOFF_MAX = config('CHATBOT_RETRY_BACKOFF_MAX', default=8, cast=float)
+CHATBOT_CIRCUIT_FAILURES = config('CHATBOT_CIRCUIT_FAILURES', default=5, cast=int)
+CHATBOT_CIRCUIT_RESET = config('CHATBOT_CIRCUIT_RESET', default=30, cast=float)
+
+# Identical first questions in flight at once share one upstream call
+# (apps.chatbot.coalescing). Waiters give up and call upstream themselves
+# after CHATBOT_COALESCE_TIMEOUT seconds. CROSS_PROCESS also coalesces
+# between workers through the chatbot cache; it needs REDIS_URL.
+CHATBOT_COALESCE = config('CHATBOT_COALESCE', default=True, cast=bool)
+CHATBOT_COALESCE_TIMEOUT = config('CHATBOT_COALESCE_TIMEOUT', default=60, cast=float)
+CHATBOT_COALESCE_CROSS_PROCESS = config('CHATBOT_COALESCE_CROSS_PROCESS', default=bool(REDIS_URL), cast=bool)
+
+# Chatbot retrieval from a local vector index of active bursaries
+# (apps.bursaries.vector_index; needs numpy). Build it once with
+# `manage.py build_vector_index`; saves and the admin's approve and close
+# actions keep it current after that. Until then, or with VECTOR_INDEX_DIR
+# empty, the chatbot uses full-text search.
+# Past 20000 bursaries searches only score the NPROBE nearest clusters.
+VECTOR_INDEX_DIR = config('VECTOR_INDEX_DIR', default=str(BASE_DIR / 'var' / 'vector_index'))
+VECTOR_INDEX_NPROBE = config('VECTOR_INDEX_NPROBE', default=16, cast=int)
+VECTOR_INDEX_MIN_SCORE = config('VECTOR_INDEX_MIN_SCORE', default=0.1, cast=float)
+
+# Background jobs (apps.jobs), kept in the database. With JOBS_BACKGROUND on,
+# chat replies, background exports and recommendation refreshes are queued
+# for `manage.py runworker`, and the views return a job to poll. Off, the
+# same work runs inline in the request, as without a worker. Jobs must
+# finish within JOBS_LEASE_SECONDS or another worker takes them over.
+# Finished jobs and background export files are deleted after JOBS_KEEP_DAYS.
+JOBS_BACKGROUND = config('JOBS_BACKGROUND', default=False, cast=bool)
+JOBS_WORKER_THREADS = config('JOBS_WORKER_THREADS', default=4, cast=int)
+JOBS_POLL_INTERVAL = config('JOBS_POLL_INTERVAL', default=1.0, cast=float)
+JOBS_LEASE_SECONDS = config('JOBS_LEASE_SECONDS', default=600, cast=int)
+JOBS_RETRY_BACKOFF = config('JOBS_RETRY_BACKOFF', default=5, cast=float)
+JOBS_RETRY_BACKOFF_MAX = config('JOBS_RETRY_BACKOFF_MAX', default=3600, cast=float)
+JOBS_EVENTS_TIMEOUT = config('JOBS_EVENTS_TIMEOUT', default=60, cast=float)
+JOBS_KEEP_DAYS = config('JOBS_KEEP_DAYS', default=7, cast=int)
 
 # Logging
 # LOGGING = {
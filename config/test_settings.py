@@ -0,0 +1,12 @@
+# TEST SETTINGS
+# The project settings with test-only values on top. Use them for every
+# test run: `python manage.py test --settings=config.test_settings`, or
+# DJANGO_SETTINGS_MODULE=config.test_settings for other runners.
+from config.settings import *  # noqa: F401,F403
+
+# Any test that pushes a view over its query budget fails
+QUERY_BUDGET_STRICT = True
+
+# Tests that need a vector index build their own in a temporary directory;
+# the rest must not read or update a developer's index
+VECTOR_INDEX_DIR = ''
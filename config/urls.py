@@ -18,6 +18,8 @@ urlpatterns = [
     path('chatbot/', include('apps.chatbot.urls')),
     
     path('dashboard/', include('apps.dashboard.urls')),
+
+    path('jobs/', include('apps.jobs.urls')),
 ]
 
 if settings.DEBUG: